@@ -1 +1,11 @@
 """Backend package for Bulk Audio Normalizer."""
+from importlib import import_module
+
+__all__ = ['FileResult', 'process_batch', 'aprocess_batch']
+
+
+def __getattr__(name):
+    # backend.batch imports every stage module (and NumPy), so load it on first use
+    if name in __all__:
+        return getattr(import_module('.batch', __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,6 @@
+"""Allow running the headless CLI with `python -m backend`."""
+import sys
+
+from .cli import main
+
+sys.exit(main())
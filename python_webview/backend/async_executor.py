@@ -0,0 +1,216 @@
+"""
+asyncio executor for FFmpeg pipelines.
+
+Runs the same pipeline generators as normalize_file() (see
+audio_processor.run_steps), but on an event loop: FFmpeg children are
+started with asyncio.create_subprocess_exec and their stderr is read
+asynchronously, so one thread can supervise hundreds of concurrent
+processes instead of parking one OS thread in communicate() per child.
+
+- Concurrency is bounded by an asyncio.Semaphore (see run_limited)
+- Steps get the same watchdog deadlines as under run_steps (see watchdog)
+- Cancelling a task kills its FFmpeg process tree via ProcessManager;
+  ProcessManager.kill_all() from another thread reaches these children too
+- In-process steps (NumPy analysis, in-process renders) run in the
+  loop's default thread pool so they never block the loop
+- EventBridge hands events from the loop (or any thread) to a single
+  dispatcher thread, so UI callbacks never run on the event loop
+"""
+import time
+import queue
+import codecs
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from .process_manager import process_manager
+from .watchdog import watchdog
+from .audio_processor import FFmpegRun, ParallelRuns, Steps, normalize_steps
+
+logger = logging.getLogger(__name__)
+
+
+_STDERR_CHUNK = 65536
+
+
+async def _read_stderr(stream: asyncio.StreamReader, line_callback: Optional[Callable]) -> str:
+    # Read in chunks rather than readline(): FFmpeg's stats use '\r' and
+    # would overrun the reader's line limit on long files
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    chunks = []
+    pending = ''
+    while True:
+        data = await stream.read(_STDERR_CHUNK)
+        if not data:
+            break
+        text = decoder.decode(data)
+        chunks.append(text)
+        if line_callback:
+            lines = (pending + text).replace('\r', '\n').split('\n')
+            pending = lines.pop()
+            for line in lines:
+                line_callback(line)
+    if line_callback and pending:
+        line_callback(pending)
+    return ''.join(chunks)
+
+
+async def run_ffmpeg(cmd: List[str], job_id: Optional[str], timeout: Optional[float] = None,
+                     line_callback: Optional[Callable] = None) -> Tuple[int, str]:
+    """
+    Run an FFmpeg command on the event loop.
+
+    Args:
+        cmd: Command and arguments
+        job_id: Job ID for process tracking
+        timeout: Optional timeout in seconds
+        line_callback: Optional callback(line) for each stderr line as it arrives
+
+    Returns:
+        (return code, stderr text)
+
+    Raises:
+        asyncio.TimeoutError: If the timeout passed (the process tree is killed)
+        asyncio.CancelledError: If the task was cancelled (the process tree is killed)
+    """
+    proc = await process_manager.aspawn(cmd, job_id=job_id, stdout=asyncio.subprocess.DEVNULL)
+    try:
+        stderr_text = await asyncio.wait_for(_read_stderr(proc.stderr, line_callback), timeout)
+        await proc.wait()
+    except BaseException:
+        # Timeout or cancellation: psutil's kill waits for the tree, so keep it off the loop
+        await asyncio.get_running_loop().run_in_executor(None, process_manager.kill_process_tree, proc)
+        raise
+    finally:
+        process_manager.untrack(proc, job_id)
+    return proc.returncode, stderr_text
+
+
+async def drive(steps: Steps, job_id: Optional[str], line_callback: Optional[Callable] = None):
+    """
+    Async counterpart of audio_processor.run_steps().
+
+    Args:
+        steps: Generator yielding FFmpegRun/ParallelRuns/BlockingCall steps
+        job_id: Job ID for process tracking
+        line_callback: Optional callback(line) for FFmpeg stderr lines
+
+    Returns:
+        The generator's return value
+    """
+    loop = asyncio.get_running_loop()
+
+    async def run_step(step: FFmpegRun):
+        timeout = watchdog.timeout_for(step)
+        started = time.monotonic()
+        try:
+            reply = await run_ffmpeg(step.cmd, job_id, timeout, line_callback)
+        except asyncio.TimeoutError:
+            raise watchdog.stalled(step.stage, job_id, timeout, step.audio_sec) from None
+        watchdog.observe(step.stage, step.audio_sec, time.monotonic() - started)
+        return reply
+
+    try:
+        step = next(steps)
+        while True:
+            try:
+                if isinstance(step, FFmpegRun):
+                    reply = await run_step(step)
+                elif isinstance(step, ParallelRuns):
+                    replies = await asyncio.gather(*(run_step(run) for run in step.runs),
+                                                   return_exceptions=True)
+                    errors = [r for r in replies if isinstance(r, BaseException)]
+                    if errors:
+                        raise errors[0]
+                    reply = replies
+                else:
+                    reply = await loop.run_in_executor(None, step.func)
+            except Exception as e:
+                step = steps.throw(e)
+            else:
+                step = steps.send(reply)
+    except StopIteration as stop:
+        return stop.value
+    finally:
+        steps.close()
+
+
+async def anormalize_file(input_path: str, output_path: str, settings: dict, job_id: str,
+                          progress_callback: Callable, log_callback: Callable):
+    """
+    asyncio variant of normalize_file() (same arguments and result).
+
+    With verboseLogs on, FFmpeg's stderr is streamed to the log callback
+    line by line while the process runs.
+    """
+    line_callback = None
+    if settings.get('verboseLogs', False):
+        def line_callback(line):
+            if line:
+                log_callback(job_id, 'ffmpeg', line)
+    return await drive(normalize_steps(input_path, output_path, settings, job_id,
+                                       progress_callback, log_callback), job_id, line_callback)
+
+
+async def run_limited(jobs: Iterable[Callable[[], Awaitable]], concurrency: int) -> List:
+    """
+    Await job factories with at most `concurrency` of them running at once.
+
+    Args:
+        jobs: Callables returning awaitables (called only when a slot is free)
+        concurrency: Maximum number of jobs in flight
+
+    Returns:
+        Results in job order
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(job):
+        async with semaphore:
+            return await job()
+
+    return await asyncio.gather(*(run_one(job) for job in jobs))
+
+
+class EventBridge:
+    """
+    Thread-safe emit(event, data) that forwards to a callback on a
+    dispatcher thread, in order.
+
+    Usage:
+        with EventBridge(emit_to_main_window) as emit:
+            run_batch(..., emit=emit)
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, emit: Callable):
+        self._emit = emit
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._dispatch, name='event-bridge', daemon=True)
+        self._thread.start()
+
+    def __call__(self, event: str, data: dict) -> None:
+        self._queue.put((event, data))
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._CLOSE:
+                return
+            try:
+                self._emit(*item)
+            except Exception as e:
+                logger.error(f"Event callback failed for {item[0]}: {e}")
+
+    def close(self) -> None:
+        """Deliver everything queued so far, then stop the dispatcher thread."""
+        self._queue.put(self._CLOSE)
+        self._thread.join()
+
+    def __enter__(self) -> 'EventBridge':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -3,20 +3,39 @@ Audio processing module for normalization, trimming, and analysis.
 
 Implements the same FFmpeg-based processing as the Electron version
 but with Python subprocess management.
+
+The per-file pipeline is written without I/O of its own: normalize_steps()
+is a generator that yields FFmpegRun and BlockingCall steps and receives
+their results. run_steps() drives it with blocking subprocesses (this is
+what normalize_file() does); async_executor drives the same generator
+from an asyncio event loop.
 """
 import os
 import re
 import json
-import struct
+import time
 import logging
+import subprocess
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Tuple, List, Callable
+from typing import Any, Generator, NamedTuple, Optional, Dict, Tuple, List, Callable
 
 from .process_manager import process_manager
+from .failures import FFmpegError, FFmpegStalled
+from .watchdog import watchdog
 from .ffmpeg_paths import get_ffmpeg_path, get_ffprobe_path
+from .ffmpeg_caps import has_filter
+from .wav_header import WavHeader, read_wav_header
+from . import loudness
+from . import decode_once
+from . import segments
 
 logger = logging.getLogger(__name__)
 
+# Loudness range handed to loudnorm (and the ceiling for constant-gain LUFS)
+LOUDNORM_LRA = 11
+
 
 def parse_ffmpeg_time(time_str: str) -> float:
     """Parse FFmpeg time format HH:MM:SS.xx to seconds."""
@@ -27,7 +46,27 @@ def parse_ffmpeg_time(time_str: str) -> float:
     return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
 
 
-def get_duration_seconds(file_path: str, job_id: Optional[str] = None) -> float:
+def to_float(value) -> Optional[float]:
+    """Convert an FFmpeg-reported number (often a string) to float, or None."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ffmpeg_threads(settings: Dict) -> int:
+    """
+    ffmpegThreads as a thread count (0 = let FFmpeg decide).
+    
+    "auto" is resolved per batch (see tuner); anything still unresolved
+    here leaves the choice to FFmpeg.
+    """
+    threads = settings.get('ffmpegThreads', 0)
+    return threads if isinstance(threads, int) and threads > 0 else 0
+
+
+def get_duration_seconds(file_path: str, job_id: Optional[str] = None,
+                         header: Optional[WavHeader] = None) -> float:
     """
     Get audio duration in seconds.
     Fast path: parse WAV header. Fallback: use ffprobe.
@@ -35,40 +74,16 @@ def get_duration_seconds(file_path: str, job_id: Optional[str] = None) -> float:
     Args:
         file_path: Path to audio file
         job_id: Optional job ID for tracking
+        header: Already-parsed WAV header, to avoid reading it again
         
     Returns:
         Duration in seconds
     """
     # Fast path: parse WAV header
-    try:
-        with open(file_path, 'rb') as f:
-            data = f.read(512 * 1024)  # Read up to 512KB
-            
-        if len(data) >= 44 and data[0:4] == b'RIFF' and data[8:12] == b'WAVE':
-            pos = 12
-            byte_rate = 0
-            data_size = 0
-            
-            while pos + 8 <= len(data):
-                chunk_id = data[pos:pos+4]
-                chunk_size = struct.unpack('<I', data[pos+4:pos+8])[0]
-                next_pos = pos + 8 + chunk_size + (chunk_size % 2)
-                
-                if chunk_id == b'fmt ':
-                    if pos + 8 + 16 <= len(data):
-                        byte_rate = struct.unpack('<I', data[pos+16:pos+20])[0]
-                elif chunk_id == b'data':
-                    data_size = chunk_size
-                    break
-                    
-                pos = next_pos
-                
-            if byte_rate > 0 and data_size > 0:
-                duration = data_size / byte_rate
-                if duration > 0:
-                    return duration
-    except Exception as e:
-        logger.debug(f"WAV header parse failed: {e}")
+    if header is None:
+        header = read_wav_header(file_path)
+    if header and header.duration > 0:
+        return header.duration
         
     # Fallback: use ffprobe
     try:
@@ -87,6 +102,23 @@ def get_duration_seconds(file_path: str, job_id: Optional[str] = None) -> float:
         return 0.0
 
 
+def format_info_from_header(header: Optional[WavHeader]) -> Optional[Dict]:
+    """
+    Describe a parsed WAV header in the dict form used by choose_output_codec.
+    
+    audioFormat is the effective format, so WAVE_FORMAT_EXTENSIBLE files
+    report 1 (PCM) or 3 (float) from their sub-format.
+    """
+    if not header:
+        return None
+    return {
+        'audioFormat': header.audio_format,
+        'bitsPerSample': header.bits_per_sample,
+        'channels': header.channels,
+        'sampleRate': header.sample_rate
+    }
+
+
 def get_wav_format_info(file_path: str) -> Optional[Dict]:
     """
     Read WAV header to get bit depth and format.
@@ -95,34 +127,9 @@ def get_wav_format_info(file_path: str) -> Optional[Dict]:
         file_path: Path to WAV file
         
     Returns:
-        Dict with audioFormat and bitsPerSample, or None
+        Dict with audioFormat, bitsPerSample, channels and sampleRate, or None
     """
-    try:
-        with open(file_path, 'rb') as f:
-            data = f.read(128)
-            
-        if len(data) < 44 or data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
-            return None
-            
-        pos = 12
-        while pos + 8 <= len(data):
-            chunk_id = data[pos:pos+4]
-            chunk_size = struct.unpack('<I', data[pos+4:pos+8])[0]
-            
-            if chunk_id == b'fmt ':
-                audio_format = struct.unpack('<H', data[pos+8:pos+10])[0]
-                bits_per_sample = struct.unpack('<H', data[pos+22:pos+24])[0]
-                return {
-                    'audioFormat': audio_format,
-                    'bitsPerSample': bits_per_sample
-                }
-                
-            pos = pos + 8 + chunk_size + (chunk_size % 2)
-            
-        return None
-    except Exception as e:
-        logger.debug(f"Failed to read WAV format: {e}")
-        return None
+    return format_info_from_header(read_wav_header(file_path))
 
 
 def choose_output_codec(target_bit_depth, input_fmt: Optional[Dict]) -> str:
@@ -171,11 +178,248 @@ def choose_output_codec(target_bit_depth, input_fmt: Optional[Dict]) -> str:
     return 'pcm_s24le'
 
 
+def choose_lufs_render(params: Optional[Dict], target_lufs: float, target_tp: float,
+                       target_lra: float = LOUDNORM_LRA) -> Tuple[str, Optional[float]]:
+    """
+    Decide whether a constant gain can hit the LUFS target.
+
+    Mirrors loudnorm's own linear-mode test: the measured loudness range
+    must fit the target LRA and the true peak after applying the gain must
+    stay under the target. Linear gain renders with `volume` at the source
+    rate; only the dynamic path needs loudnorm (and its 192 kHz upsampling).
+
+    Args:
+        params: First-pass loudnorm measurements, or None if not analyzed
+        target_lufs: Target integrated loudness (LUFS)
+        target_tp: Target true peak (dBTP)
+        target_lra: Target loudness range (LU)
+
+    Returns:
+        ('linear', gain_db) or ('dynamic', gain_db or None)
+    """
+    if not params:
+        return 'dynamic', None
+    measured_i = to_float(params.get('measured_I'))
+    measured_tp = to_float(params.get('measured_TP'))
+    measured_lra = to_float(params.get('measured_LRA'))
+    if measured_i is None or measured_tp is None or measured_lra is None:
+        return 'dynamic', None
+    # loudnorm reports silence as -70 LUFS or below; no gain is meaningful
+    if measured_i <= -70:
+        return 'dynamic', None
+
+    gain_db = float(target_lufs) - measured_i
+    if measured_lra <= target_lra and measured_tp + gain_db <= float(target_tp):
+        return 'linear', gain_db
+    return 'dynamic', gain_db
+
+
+def trim_config(settings: Dict) -> Tuple[float, float, bool, bool]:
+    """
+    Effective silence-detection settings.
+
+    Returns:
+        (threshold_db, min_dur_sec, use_hpf, conservative)
+    """
+    threshold_db = settings.get('trimThresholdDb', -50)
+    min_dur_sec = max(0.01, settings.get('trimMinDurationMs', 200) / 1000)
+    conservative = settings.get('trimConservative', False)
+    use_hpf = settings.get('trimHPF', False)
+    
+    if conservative:
+        threshold_db = min(threshold_db, -60)
+        min_dur_sec = max(min_dur_sec, 0.3)
+    return threshold_db, min_dur_sec, use_hpf, conservative
+
+
+def voice_region_from_silences(silence_intervals: List[List[float]], duration_sec: float) -> Optional[Dict]:
+    """
+    Turn detected silences into the span from first to last non-silent audio.
+    
+    Args:
+        silence_intervals: [start, end] pairs in seconds, in any order
+        duration_sec: File duration
+        
+    Returns:
+        Dict with 'start' and 'end' times, or None if the file is all silence
+    """
+    # Merge overlapping intervals
+    merged = []
+    for start, end in sorted(silence_intervals):
+        if not merged or start > merged[-1][1]:
+            merged.append([start, end])
+        else:
+            merged[-1][1] = max(merged[-1][1], end)
+            
+    # Get non-silent intervals
+    non_silent = []
+    prev = 0
+    for start, end in merged:
+        if start > prev:
+            non_silent.append([prev, start])
+        prev = max(prev, end)
+    if prev < duration_sec:
+        non_silent.append([prev, duration_sec])
+        
+    if not non_silent:
+        return None
+        
+    return {'start': non_silent[0][0], 'end': non_silent[-1][1]}
+
+
+def padded_trim(region: Dict, duration_sec: float, settings: Dict) -> Tuple[float, float]:
+    """Trim span for a detected voice region, widened by the trim padding."""
+    pad_sec = settings.get('trimPadMs', 800) / 1000
+    return max(0, region['start'] - pad_sec), min(duration_sec, region['end'] + pad_sec)
+
+
+def peak_gain_db(measured_max_volume: Optional[float], settings: Dict) -> float:
+    """
+    Gain that brings a measured peak to the peak target.
+    
+    Honors peakOnlyBoost and limits the gain to +/-30 dB; 0 if nothing
+    was measured.
+    """
+    gain_db = 0
+    if measured_max_volume is not None:
+        ideal_gain = settings.get('peakTargetDb', -2) - measured_max_volume
+        only_boost = settings.get('peakOnlyBoost', True)
+        gain_db = max(0, ideal_gain) if only_boost else ideal_gain
+        gain_db = max(-30, min(30, gain_db))
+    return gain_db
+
+
+class FFmpegRun(NamedTuple):
+    """
+    Pipeline step: run an FFmpeg command; the driver sends back (returncode, stderr text).
+
+    Without an explicit timeout, a step naming its stage and the seconds
+    of audio it processes gets a watchdog deadline (see watchdog); the
+    driver then throws FFmpegStalled into the pipeline if it passes.
+    """
+    cmd: List[str]
+    timeout: Optional[float] = None
+    stage: Optional[str] = None
+    audio_sec: Optional[float] = None
+
+
+class ParallelRuns(NamedTuple):
+    """
+    Pipeline step: run several FFmpegRun steps at once (see segments); the
+    driver sends back their (returncode, stderr text) replies in order.
+
+    Every run is awaited; the first error any of them raised (e.g.
+    FFmpegStalled) is then thrown into the pipeline.
+    """
+    runs: List[FFmpegRun]
+
+
+class BlockingCall(NamedTuple):
+    """Pipeline step: call func() (in-process work); the driver sends back its result."""
+    func: Callable[[], Any]
+
+
+Steps = Generator[Any, Any, Any]
+
+
+def run_ffmpeg(cmd: List[str], job_id: Optional[str], timeout: Optional[float] = None) -> Tuple[int, str]:
+    """
+    Run an FFmpeg command to completion.
+    
+    Args:
+        cmd: Command and arguments
+        job_id: Job ID for process tracking
+        timeout: Optional timeout in seconds
+        
+    Returns:
+        (return code, stderr text)
+        
+    Raises:
+        subprocess.TimeoutExpired: If the timeout passed (the process tree is killed)
+    """
+    proc = process_manager.spawn(cmd, job_id=job_id, stdout=subprocess.DEVNULL)
+    try:
+        _, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process_manager.kill_process_tree(proc)
+        raise
+    finally:
+        process_manager.untrack(proc, job_id)
+    return proc.returncode, stderr.decode('utf-8', errors='ignore')
+
+
+def _run_step(step: FFmpegRun, job_id: Optional[str]) -> Tuple[int, str]:
+    """Run one FFmpegRun step under its watchdog deadline."""
+    timeout = watchdog.timeout_for(step)
+    started = time.monotonic()
+    try:
+        reply = run_ffmpeg(step.cmd, job_id, timeout)
+    except subprocess.TimeoutExpired:
+        raise watchdog.stalled(step.stage, job_id, timeout, step.audio_sec) from None
+    watchdog.observe(step.stage, step.audio_sec, time.monotonic() - started)
+    return reply
+
+
+def run_steps(steps: Steps, job_id: Optional[str]):
+    """
+    Drive a pipeline generator with blocking subprocesses.
+    
+    Errors raised by a step are thrown back into the generator at the
+    point it yielded, so pipelines handle them like ordinary exceptions.
+    
+    Args:
+        steps: Generator yielding FFmpegRun/ParallelRuns/BlockingCall steps
+        job_id: Job ID for process tracking
+        
+    Returns:
+        The generator's return value
+    """
+    try:
+        step = next(steps)
+        while True:
+            try:
+                if isinstance(step, FFmpegRun):
+                    reply = _run_step(step, job_id)
+                elif isinstance(step, ParallelRuns):
+                    with ThreadPoolExecutor(max_workers=len(step.runs)) as pool:
+                        futures = [pool.submit(_run_step, run, job_id) for run in step.runs]
+                    errors = [f.exception() for f in futures if f.exception() is not None]
+                    if errors:
+                        raise errors[0]
+                    reply = [f.result() for f in futures]
+                else:
+                    reply = step.func()
+            except Exception as e:
+                step = steps.throw(e)
+            else:
+                step = steps.send(reply)
+    except StopIteration as stop:
+        return stop.value
+
+
 def detect_voice_region(input_path: str, duration_sec: float, settings: Dict,
                        job_id: str, log_callback: Callable) -> Optional[Dict]:
     """
     Detect voice region using FFmpeg silencedetect.
     
+    Args:
+        input_path: Input file path
+        duration_sec: File duration
+        settings: Processing settings
+        job_id: Job ID
+        log_callback: Logging callback
+        
+    Returns:
+        Dict with 'start' and 'end' times, or None
+    """
+    return run_steps(voice_region_steps(input_path, duration_sec, settings, job_id, log_callback), job_id)
+
+
+def voice_region_steps(input_path: str, duration_sec: float, settings: Dict,
+                       job_id: str, log_callback: Callable) -> Steps:
+    """
+    Pipeline form of detect_voice_region() (see run_steps).
+    
     Args:
         input_path: Input file path
         duration_sec: File duration
@@ -189,16 +433,12 @@ def detect_voice_region(input_path: str, duration_sec: float, settings: Dict,
     if process_manager.is_canceled():
         return None
         
-    threshold_db = settings.get('trimThresholdDb', -50)
-    min_dur_sec = max(0.01, settings.get('trimMinDurationMs', 200) / 1000)
-    conservative = settings.get('trimConservative', False)
-    use_hpf = settings.get('trimHPF', False)
-    
-    if conservative:
-        threshold_db = min(threshold_db, -60)
-        min_dur_sec = max(min_dur_sec, 0.3)
+    threshold_db, min_dur_sec, use_hpf, conservative = trim_config(settings)
         
     filters = []
+    if use_hpf and not has_filter('highpass'):
+        log_callback(job_id, 'trim', "HPF skipped: this FFmpeg build has no highpass filter")
+        use_hpf = False
     if use_hpf:
         filters.append('highpass=f=80')
     filters.append(f'silencedetect=n={threshold_db}dB:d={min_dur_sec}')
@@ -207,16 +447,25 @@ def detect_voice_region(input_path: str, duration_sec: float, settings: Dict,
     
     try:
         ffmpeg = get_ffmpeg_path()
-        proc = process_manager.spawn(
+        spans = segments.plan_segments(0.0, duration_sec, settings)
+        if spans:
+            log_callback(job_id, 'trim', f"Segment-parallel detection: {len(spans)} segments")
+            replies = yield ParallelRuns([
+                FFmpegRun([ffmpeg, '-hide_banner', '-nostats', '-v', 'info'] + segments.seek_args(start, end) +
+                          ['-i', input_path, '-af', ','.join(filters), '-f', 'null', '-'],
+                          stage='detect', audio_sec=end - start)
+                for start, end in spans
+            ])
+            silence_intervals = segments.merge_silences([text for _, text in replies], spans)
+            return voice_region_from_silences(silence_intervals, duration_sec)
+            
+        _, stderr_text = yield FFmpegRun(
             [ffmpeg, '-hide_banner', '-nostats', '-v', 'info',
              '-i', input_path, '-af', ','.join(filters),
              '-f', 'null', '-'],
-            job_id=job_id
+            stage='detect', audio_sec=duration_sec
         )
         
-        _, stderr = proc.communicate(timeout=120)
-        stderr_text = stderr.decode('utf-8', errors='ignore')
-        
         # Parse silence_start and silence_end
         silence_intervals = []
         start_pattern = re.compile(r'silence_start: ([0-9.]+)')
@@ -233,40 +482,18 @@ def detect_voice_region(input_path: str, duration_sec: float, settings: Dict,
         if len(starts) > len(ends):
             silence_intervals.append([starts[-1], duration_sec])
             
-        # Merge overlapping intervals
-        silence_intervals.sort()
-        merged = []
-        for start, end in silence_intervals:
-            if not merged or start > merged[-1][1]:
-                merged.append([start, end])
-            else:
-                merged[-1][1] = max(merged[-1][1], end)
-                
-        # Get non-silent intervals
-        non_silent = []
-        prev = 0
-        for start, end in merged:
-            if start > prev:
-                non_silent.append([prev, start])
-            prev = max(prev, end)
-        if prev < duration_sec:
-            non_silent.append([prev, duration_sec])
-            
-        if not non_silent:
-            return None
-            
-        voice_start = non_silent[0][0]
-        voice_end = non_silent[-1][1]
-        
-        return {'start': voice_start, 'end': voice_end}
+        return voice_region_from_silences(silence_intervals, duration_sec)
         
+    except FFmpegStalled:
+        # A wedged input goes to the retry path rather than on untrimmed
+        raise
     except Exception as e:
         logger.error(f"Voice detection failed: {e}")
         return None
 
 
 def normalize_file(input_path: str, output_path: str, settings: Dict,
-                  job_id: str, progress_callback: Callable, log_callback: Callable) -> None:
+                  job_id: str, progress_callback: Callable, log_callback: Callable) -> Optional[Dict]:
     """
     Normalize an audio file with trimming and normalization.
     
@@ -277,24 +504,68 @@ def normalize_file(input_path: str, output_path: str, settings: Dict,
         job_id: Job ID
         progress_callback: Progress callback(job_id, phase, status, pct)
         log_callback: Log callback(job_id, phase, message)
+        
+    Returns:
+        Dict describing what was measured and applied (durationSec, codec,
+        trimStart, trimEnd, measuredMaxVolume, measuredI, measuredTP,
+        measuredLRA, gainDb, lufsRender, timings), or None if canceled
+    """
+    return run_steps(normalize_steps(input_path, output_path, settings, job_id,
+                                     progress_callback, log_callback), job_id)
+
+
+def normalize_steps(input_path: str, output_path: str, settings: Dict,
+                    job_id: str, progress_callback: Callable, log_callback: Callable) -> Steps:
+    """
+    Pipeline form of normalize_file() (see run_steps).
+    
+    Args:
+        input_path: Input file path
+        output_path: Output file path
+        settings: Processing settings
+        job_id: Job ID
+        progress_callback: Progress callback(job_id, phase, status, pct)
+        log_callback: Log callback(job_id, phase, message)
+        
+    Returns:
+        Dict describing what was measured and applied (durationSec, codec,
+        trimStart, trimEnd, measuredMaxVolume, measuredI, measuredTP,
+        measuredLRA, gainDb, lufsRender, timings), or None if canceled
     """
     if process_manager.is_canceled():
-        return
+        return None
         
+    stage_start = time.monotonic()
+    timings = {}
+    
     # Get file info
-    duration_sec = get_duration_seconds(input_path, job_id)
-    input_fmt = get_wav_format_info(input_path)
+    header = read_wav_header(input_path)
+    if header and header.duration > 0:
+        duration_sec = header.duration
+    else:
+        duration_sec = yield BlockingCall(partial(get_duration_seconds, input_path, job_id, header))
+    input_fmt = format_info_from_header(header)
     out_codec = choose_output_codec(settings.get('targetBitDepth', 16), input_fmt)
     
     norm_mode = settings.get('normMode', 'peak')
+    
+    # Compressed/exotic payloads: decode once and work on the samples in Python
+    if settings.get('decodeOnce', True) and decode_once.HAVE_NUMPY and decode_once.needs_decoding(header):
+        return (yield BlockingCall(partial(
+            decode_once.normalize_decoded, input_path, output_path, settings, job_id,
+            progress_callback, log_callback, header, duration_sec, out_codec)))
+        
     target_lufs = settings.get('lufsTarget', -16)
     target_tp = settings.get('tpMargin', -1.0)
     limiter = settings.get('limiterLimit', 0.97)
     peak_target_db = settings.get('peakTargetDb', -2)
-    threads = settings.get('ffmpegThreads', 0)
+    threads = ffmpeg_threads(settings)
     fast_normalize = settings.get('fastNormalize', False)
     verbose = settings.get('verboseLogs', False)
     
+    if norm_mode == 'lufs' and not has_filter('loudnorm'):
+        raise RuntimeError("LUFS mode needs FFmpeg's loudnorm filter, which this FFmpeg build lacks")
+        
     # Trimming detection
     progress_callback(job_id, 'detect', 'start', 0)
     seek_start = 0
@@ -302,12 +573,12 @@ def normalize_file(input_path: str, output_path: str, settings: Dict,
     
     if settings.get('autoTrim', False):
         min_file_ms = settings.get('trimMinFileMs', 800)
-        if duration_sec * 1000 >= min_file_ms:
-            region = detect_voice_region(input_path, duration_sec, settings, job_id, log_callback)
+        if not has_filter('silencedetect'):
+            log_callback(job_id, 'trim', "No trimming applied: this FFmpeg build has no silencedetect filter")
+        elif duration_sec * 1000 >= min_file_ms:
+            region = yield from voice_region_steps(input_path, duration_sec, settings, job_id, log_callback)
             if region:
-                pad_sec = settings.get('trimPadMs', 800) / 1000
-                seek_start = max(0, region['start'] - pad_sec)
-                seek_end = min(duration_sec, region['end'] + pad_sec)
+                seek_start, seek_end = padded_trim(region, duration_sec, settings)
                 log_callback(job_id, 'trim', f"Trim applied: start={seek_start:.3f}s end={seek_end:.3f}s")
             else:
                 log_callback(job_id, 'trim', "No trimming applied: could not detect non-silent region")
@@ -315,9 +586,46 @@ def normalize_file(input_path: str, output_path: str, settings: Dict,
             log_callback(job_id, 'trim', f"No trimming applied: file shorter than minimum {min_file_ms}ms")
             
     progress_callback(job_id, 'detect', 'done', 100)
+    timings['detect'] = time.monotonic() - stage_start
+    stage_start = time.monotonic()
     
     if process_manager.is_canceled():
-        return
+        return None
+        
+    # Short PCM/float files: measure and render in-process, no FFmpeg at all
+    if norm_mode == 'lufs' and settings.get('inProcessLufs', True) and \
+            loudness.can_render_in_process(header, out_codec, seek_end - seek_start):
+        progress_callback(job_id, 'analyze', 'start', 0)
+        measured = yield BlockingCall(partial(
+            loudness.render_lufs,
+            input_path, output_path, header, out_codec, target_lufs, target_tp, limiter,
+            LOUDNORM_LRA, seek_start, seek_end if seek_end < duration_sec else None
+        ))
+        if measured and measured['rendered']:
+            timings['analyze'] = time.monotonic() - stage_start
+            progress_callback(job_id, 'analyze', 'done', 100)
+            progress_callback(job_id, 'render', 'start', 0)
+            progress_callback(job_id, 'render', 'done', 100)
+            log_callback(job_id, 'render',
+                         f"LUFS in-process: gain {measured['gain_db']:+.2f} dB (measured I={measured['measured_I']:.2f} "
+                         f"LRA={measured['measured_LRA']:.2f} TP={measured['measured_TP']:.2f}), "
+                         f"limiter active on {measured['limited'] * 100:.1f}% of frames")
+            log_callback(job_id, 'render', f"Completed: {output_path}")
+            return {
+                'durationSec': duration_sec,
+                'codec': out_codec,
+                'trimStart': seek_start,
+                'trimEnd': seek_end,
+                'measuredMaxVolume': None,
+                'measuredI': measured['measured_I'],
+                'measuredTP': measured['measured_TP'],
+                'measuredLRA': measured['measured_LRA'],
+                'gainDb': measured['gain_db'],
+                'lufsRender': 'in-process',
+                'timings': timings
+            }
+        reason = "loudness range needs dynamic loudnorm" if measured else "could not measure in-process"
+        log_callback(job_id, 'analyze', f"Using FFmpeg: {reason}")
         
     # Analysis pass
     progress_callback(job_id, 'analyze', 'start', 0)
@@ -328,24 +636,65 @@ def normalize_file(input_path: str, output_path: str, settings: Dict,
         
     params = None
     measured_max_volume = None
+    # Long recordings: analyze time segments in parallel and merge (see segments)
+    spans = segments.plan_segments(seek_start, seek_end, settings)
+    if spans and norm_mode == 'lufs' and not has_filter('ebur128'):
+        log_callback(job_id, 'analyze', "Segment-parallel analysis skipped: this FFmpeg build has no ebur128 filter")
+        spans = None
     
-    if norm_mode == 'lufs' and not fast_normalize:
+    if spans and (norm_mode == 'peak' or not fast_normalize):
+        ffmpeg = get_ffmpeg_path()
+        thread_args = ['-threads', str(threads)] if threads > 0 else []
+        log_callback(job_id, 'analyze', f"Segment-parallel analysis: {len(spans)} segments of "
+                                        f"{spans[0][1] - spans[0][0]:.0f}s")
+        if norm_mode == 'lufs':
+            read_starts = [segments.lookback_start(span, seek_start) for span in spans]
+            runs = [FFmpegRun([ffmpeg, '-hide_banner', '-nostats', '-v', 'info'] +
+                              segments.seek_args(read_start, end) + ['-i', input_path] + thread_args +
+                              ['-af', 'ebur128=peak=true', '-f', 'null', '-'],
+                              stage='analyze', audio_sec=end - read_start)
+                    for read_start, (_, end) in zip(read_starts, spans)]
+        else:
+            runs = [FFmpegRun([ffmpeg, '-hide_banner', '-v', 'info'] + segments.seek_args(start, end) +
+                              ['-i', input_path] + thread_args + ['-af', 'volumedetect', '-f', 'null', '-'],
+                              stage='analyze', audio_sec=end - start)
+                    for start, end in spans]
+        replies = yield ParallelRuns(runs)
+        if process_manager.is_canceled():
+            return None
+        for returncode, stderr_text in replies:
+            if returncode != 0:
+                raise FFmpegError('Segment analysis', returncode, stderr_text)
+        texts = [text for _, text in replies]
+        if norm_mode == 'lufs':
+            params = segments.merge_loudness(texts, spans, read_starts, seek_start)
+            if params is None:
+                log_callback(job_id, 'analyze', "Segment analysis produced no measurements; using single-pass loudnorm")
+        else:
+            measured_max_volume = segments.merge_max_volume(texts)
+            
+    elif norm_mode == 'lufs' and not fast_normalize:
         # Two-pass loudnorm analysis
-        filter_parts = [f'loudnorm=I={target_lufs}:TP={target_tp}:LRA=11:print_format=json']
+        filter_parts = [f'loudnorm=I={target_lufs}:TP={target_tp}:LRA={LOUDNORM_LRA}:print_format=json']
         
         ffmpeg = get_ffmpeg_path()
-        verbosity = ['-v', 'info'] if verbose else ['-hide_banner', '-v', 'error']
+        # loudnorm prints its JSON at info level, so never go below that here
+        verbosity = ['-hide_banner', '-nostats', '-v', 'info']
         thread_args = ['-threads', str(threads)] if threads > 0 else []
         
         cmd = [ffmpeg] + verbosity + seek_args + ['-i', input_path] + thread_args + \
               ['-af', ','.join(filter_parts), '-f', 'null', '-']
               
-        proc = process_manager.spawn(cmd, job_id=job_id)
-        _, stderr = proc.communicate()
-        stderr_text = stderr.decode('utf-8', errors='ignore')
+        returncode, stderr_text = yield FFmpegRun(cmd, stage='analyze', audio_sec=seek_end - seek_start)
+        if process_manager.is_canceled():
+            return None
+        if returncode != 0:
+            raise FFmpegError('Loudness analysis', returncode, stderr_text)
         
         # Parse JSON output
         json_match = re.findall(r'\{[\s\S]*?\}', stderr_text)
+        if not json_match:
+            log_callback(job_id, 'analyze', "Loudness analysis produced no measurements; using single-pass loudnorm")
         if json_match:
             try:
                 parsed = json.loads(json_match[-1])
@@ -368,9 +717,11 @@ def normalize_file(input_path: str, output_path: str, settings: Dict,
               ['-i', input_path] + thread_args + \
               ['-af', 'volumedetect', '-f', 'null', '-']
               
-        proc = process_manager.spawn(cmd, job_id=job_id)
-        _, stderr = proc.communicate()
-        stderr_text = stderr.decode('utf-8', errors='ignore')
+        returncode, stderr_text = yield FFmpegRun(cmd, stage='analyze', audio_sec=seek_end - seek_start)
+        if process_manager.is_canceled():
+            return None
+        if returncode != 0:
+            raise FFmpegError('Peak analysis', returncode, stderr_text)
         
         # Parse max_volume
         match = re.search(r'max_volume:\s*(-?[0-9.]+)\s*dB', stderr_text)
@@ -378,34 +729,53 @@ def normalize_file(input_path: str, output_path: str, settings: Dict,
             measured_max_volume = float(match.group(1))
             
     progress_callback(job_id, 'analyze', 'done', 100)
+    timings['analyze'] = time.monotonic() - stage_start
+    stage_start = time.monotonic()
     
     if process_manager.is_canceled():
-        return
+        return None
         
     # Render pass
     progress_callback(job_id, 'render', 'start', 0)
     
     filter_parts = []
+    rate_args = []
+    gain_db = None
+    lufs_render = None
     
     if norm_mode == 'lufs':
-        if params:
-            filter_parts.append(
-                f"loudnorm=I={target_lufs}:TP={target_tp}:LRA=11:"
-                f"measured_I={params['measured_I']}:measured_LRA={params['measured_LRA']}:"
-                f"measured_TP={params['measured_TP']}:measured_thresh={params['measured_thresh']}:"
-                f"offset={params['offset']}:linear=true:print_format=summary"
-            )
+        lufs_render, gain_db = choose_lufs_render(params, target_lufs, target_tp)
+        if lufs_render == 'linear':
+            # Constant gain: no resampling, output keeps the source rate
+            filter_parts.append(f'volume={gain_db:.2f}dB')
+            log_callback(job_id, 'render',
+                         f"LUFS linear gain: {gain_db:+.2f} dB (measured I={params['measured_I']} "
+                         f"LRA={params['measured_LRA']} TP={params['measured_TP']})")
         else:
-            filter_parts.append(f'loudnorm=I={target_lufs}:TP={target_tp}:LRA=11:print_format=summary')
-        filter_parts.append(f'alimiter=limit={limiter}:level_in=1.0:level_out=1.0')
+            if params:
+                filter_parts.append(
+                    f"loudnorm=I={target_lufs}:TP={target_tp}:LRA={LOUDNORM_LRA}:"
+                    f"measured_I={params['measured_I']}:measured_LRA={params['measured_LRA']}:"
+                    f"measured_TP={params['measured_TP']}:measured_thresh={params['measured_thresh']}:"
+                    f"offset={params['offset']}:linear=true:print_format=summary"
+                )
+            else:
+                filter_parts.append(f'loudnorm=I={target_lufs}:TP={target_tp}:LRA={LOUDNORM_LRA}:print_format=summary')
+            # loudnorm upsamples to 192 kHz internally; resample back to the source rate
+            source_rate = input_fmt.get('sampleRate') if input_fmt else None
+            if source_rate:
+                rate_args = ['-ar', str(source_rate)]
+            reason = "no first-pass measurements" if params is None else \
+                f"true peak or LRA too high for a constant gain (measured LRA={params['measured_LRA']} TP={params['measured_TP']})"
+            log_callback(job_id, 'render',
+                         f"LUFS dynamic loudnorm: {reason}; output rate {source_rate or 'unchanged'}")
+        if has_filter('alimiter'):
+            filter_parts.append(f'alimiter=limit={limiter}:level_in=1.0:level_out=1.0')
+        else:
+            log_callback(job_id, 'render', "Limiter skipped: this FFmpeg build has no alimiter filter")
     else:
         # Peak mode
-        gain_db = 0
-        if measured_max_volume is not None:
-            ideal_gain = peak_target_db - measured_max_volume
-            only_boost = settings.get('peakOnlyBoost', True)
-            gain_db = max(0, ideal_gain) if only_boost else ideal_gain
-            gain_db = max(-30, min(30, gain_db))
+        gain_db = peak_gain_db(measured_max_volume, settings)
             
         log_callback(job_id, 'analyze', f"Peak mode: measuredMax={measured_max_volume if measured_max_volume is not None else 'n/a'} dB, target={peak_target_db} dB, gain={gain_db:.2f} dB, onlyBoost={settings.get('peakOnlyBoost', True)}")
         filter_parts.append(f'volume={gain_db:.2f}dB')
@@ -415,10 +785,35 @@ def normalize_file(input_path: str, output_path: str, settings: Dict,
     thread_args = ['-threads', str(threads)] if threads > 0 else []
     
     cmd = [ffmpeg] + verbosity + seek_args + ['-y', '-i', input_path] + thread_args + \
-          ['-af', ','.join(filter_parts), '-acodec', out_codec, '-map_metadata', '-1', output_path]
+          ['-af', ','.join(filter_parts)] + rate_args + \
+          ['-acodec', out_codec, '-map_metadata', '-1', output_path]
           
-    proc = process_manager.spawn(cmd, job_id=job_id)
-    _, stderr = proc.communicate()
+    try:
+        returncode, stderr_text = yield FFmpegRun(cmd, stage='render', audio_sec=seek_end - seek_start)
+        if returncode != 0 and not process_manager.is_canceled():
+            raise FFmpegError('Render', returncode, stderr_text)
+    except (FFmpegError, FFmpegStalled):
+        # Don't leave a truncated file behind for verification to count
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    if process_manager.is_canceled():
+        return None
     
     progress_callback(job_id, 'render', 'done', 100)
+    timings['render'] = time.monotonic() - stage_start
     log_callback(job_id, 'render', f"Completed: {output_path}")
+    
+    return {
+        'durationSec': duration_sec,
+        'codec': out_codec,
+        'trimStart': seek_start,
+        'trimEnd': seek_end,
+        'measuredMaxVolume': measured_max_volume,
+        'measuredI': to_float(params['measured_I']) if params else None,
+        'measuredTP': to_float(params['measured_TP']) if params else None,
+        'measuredLRA': to_float(params['measured_LRA']) if params else None,
+        'gainDb': gain_db,
+        'lufsRender': lufs_render,
+        'timings': timings
+    }
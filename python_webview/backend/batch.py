@@ -0,0 +1,1015 @@
+"""
+Batch engine shared by the desktop UI, the command-line interface and
+library callers.
+
+Scans an input tree for WAV files, runs normalize_file over each of them
+and reports everything through a single event callback, so the same loop
+can feed pywebview (via evaluate_js) or a headless JSON-lines stream.
+process_batch()/aprocess_batch() expose the same per-file unit as an
+iterator of FileResult objects for use from other Python code.
+
+With a concurrency setting above 1, run_batch() processes files on an
+asyncio event loop (see async_executor), which supervises every FFmpeg
+child from one thread and delivers events through an EventBridge.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .audio_processor import normalize_file
+from .async_executor import anormalize_file, EventBridge
+from .multi_file import plan_groups, normalize_group
+from .scheduler import scan_durations, schedule_units
+from .tuner import needs_tuning, resolve_auto
+from .ffmpeg_caps import get_capabilities
+from .process_manager import process_manager
+from .watchdog import watchdog
+from .checksums import ManifestWriter, drop_manifest_entries, resolve_algorithms
+from .staging import OutputStager, DEFAULT_SCRATCH_LIMIT_MB, DEFAULT_COPY_THREADS
+from .prefetch import Prefetcher, DEFAULT_COPY_MAX_MB
+from .sharding import shard_key
+from .sync import plan_sync, prune_orphans, read_index, SyncIndex
+from .verify import verify_outputs, VERIFY_OK, VERIFY_MISSING, VERIFY_MISMATCH
+from .failures import (classify_failure, failure_report, RetryQueue, FAILURE_ERROR,
+                       DEFAULT_MAX_RETRIES, DEFAULT_RETRY_BACKOFF_SEC)
+
+logger = logging.getLogger(__name__)
+
+WAV_EXTENSIONS = ('.wav', '.wave')
+
+
+def scan_files(input_path: str) -> List[str]:
+    """
+    Recursively scan a directory for WAV files.
+
+    Args:
+        input_path: Input directory
+
+    Returns:
+        List of WAV file paths (empty if the directory does not exist)
+    """
+    if not input_path or not os.path.isdir(input_path):
+        return []
+
+    wav_files = []
+
+    def walk_dir(dirpath):
+        try:
+            for entry in os.scandir(dirpath):
+                if entry.is_dir(follow_symlinks=False):
+                    walk_dir(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(WAV_EXTENSIONS):
+                    wav_files.append(entry.path)
+        except PermissionError:
+            pass
+
+    walk_dir(input_path)
+    return wav_files
+
+
+def file_table(files: List[str], input_root: str) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Assign each file a compact integer ID.
+
+    Basenames are not unique across session folders (take1.wav), so
+    per-file events and process tracking use the file's index instead.
+
+    Returns:
+        (file path -> ID, relative path per ID)
+    """
+    ids = {file_path: index for index, file_path in enumerate(files)}
+    return ids, [os.path.relpath(file_path, input_root) for file_path in files]
+
+
+def is_output_empty(output_path: str) -> bool:
+    """Check if an output directory is empty (hidden files are ignored)."""
+    if not output_path or not os.path.exists(output_path):
+        return True
+
+    try:
+        items = [f for f in os.listdir(output_path) if not f.startswith('.')]
+        return len(items) == 0
+    except Exception:
+        return False
+
+
+def output_path_for(file_path: str, input_root: str, output_root: str) -> str:
+    """Map an input file to its output path, preserving the relative layout."""
+    rel_path = os.path.relpath(file_path, input_root)
+    return os.path.join(output_root, rel_path)
+
+
+@dataclass
+class FileResult:
+    """Outcome of normalizing one file."""
+    input_path: str
+    output_path: str
+    rel_path: str
+    error: Optional[str] = None
+    failure: Optional[str] = None         # error class, see failures.classify_failure
+    canceled: bool = False
+    duration_sec: Optional[float] = None
+    codec: Optional[str] = None
+    trim_start: Optional[float] = None
+    trim_end: Optional[float] = None
+    measured_peak_db: Optional[float] = None
+    measured_lufs: Optional[float] = None
+    measured_true_peak: Optional[float] = None
+    measured_lra: Optional[float] = None
+    gain_db: Optional[float] = None
+    lufs_render: Optional[str] = None     # 'in-process', 'linear' or 'dynamic' in LUFS mode
+    timings: Dict[str, float] = field(default_factory=dict)
+    elapsed_sec: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """True if the file was rendered without error or cancellation."""
+        return self.error is None and not self.canceled
+
+    def to_dict(self) -> Dict:
+        """Plain dict form (JSON serializable)."""
+        data = asdict(self)
+        data['ok'] = self.ok
+        return data
+
+
+def _ignore_progress(job_id, phase, status, pct):
+    pass
+
+
+def _ignore_log(job_id, phase, message):
+    pass
+
+
+def _apply_info(result: FileResult, info: Dict) -> None:
+    """Copy a normalize_file result dict onto a FileResult."""
+    result.duration_sec = info.get('durationSec')
+    result.codec = info.get('codec')
+    result.trim_start = info.get('trimStart')
+    result.trim_end = info.get('trimEnd')
+    result.measured_peak_db = info.get('measuredMaxVolume')
+    result.measured_lufs = info.get('measuredI')
+    result.measured_true_peak = info.get('measuredTP')
+    result.measured_lra = info.get('measuredLRA')
+    result.gain_db = info.get('gainDb')
+    result.lufs_render = info.get('lufsRender')
+    result.timings = info.get('timings', {})
+
+
+def _new_result(file_path: str, input_root: str, output_root: str) -> FileResult:
+    return FileResult(
+        input_path=file_path,
+        output_path=output_path_for(file_path, input_root, output_root),
+        rel_path=os.path.relpath(file_path, input_root)
+    )
+
+
+def process_file(file_path: str, input_root: str, output_root: str, settings: Dict,
+                 file_id: str, progress_callback: Optional[Callable] = None,
+                 log_callback: Optional[Callable] = None, source: Optional[str] = None) -> FileResult:
+    """
+    Normalize a single file into the output tree.
+
+    Never raises for per-file problems; failures are reported in
+    FileResult.error so batch loops can decide what to do next.
+
+    Args:
+        file_path: Input file path
+        input_root: Input directory the relative layout is taken from
+        output_root: Output directory
+        settings: Processing settings (see normalize_file)
+        file_id: Job ID used for process tracking and callbacks
+        progress_callback: Optional progress callback(job_id, phase, status, pct)
+        log_callback: Optional log callback(job_id, phase, message)
+        source: Optional path to read instead of file_path (e.g. a
+            prefetched local copy, see prefetch)
+
+    Returns:
+        FileResult for the file
+    """
+    result = _new_result(file_path, input_root, output_root)
+    started = time.monotonic()
+
+    try:
+        os.makedirs(os.path.dirname(result.output_path), exist_ok=True)
+        info = normalize_file(source or file_path, result.output_path, settings, file_id,
+                              progress_callback or _ignore_progress,
+                              log_callback or _ignore_log)
+        if info is None:
+            result.canceled = True
+        else:
+            _apply_info(result, info)
+    except Exception as e:
+        logger.error(f"Failed to process {file_path}: {e}")
+        result.error = str(e)
+        result.failure = classify_failure(e)
+
+    result.elapsed_sec = time.monotonic() - started
+    return result
+
+
+def process_group(files: List[str], input_root: str, output_root: str, settings: Dict,
+                  file_ids: List[str], progress_callback: Optional[Callable] = None,
+                  log_callback: Optional[Callable] = None,
+                  sources: Optional[Dict[str, str]] = None) -> List[FileResult]:
+    """
+    Normalize a group of short files with shared FFmpeg processes.
+
+    Falls back to process_file() for each file if the grouped run fails,
+    so one bad clip cannot fail its whole group.
+
+    Args:
+        files: Input files (see multi_file.plan_groups)
+        input_root: Input directory
+        output_root: Output directory
+        settings: Processing settings
+        file_ids: Job ID per file for callbacks and process tracking
+        progress_callback: Optional progress callback(job_id, phase, status, pct)
+        log_callback: Optional log callback(job_id, phase, message)
+        sources: Optional {file: path to read instead} (see process_file)
+
+    Returns:
+        One FileResult per file, in order
+    """
+    sources = sources or {}
+    if len(files) == 1:
+        return [process_file(files[0], input_root, output_root, settings, file_ids[0],
+                             progress_callback, log_callback, sources.get(files[0]))]
+
+    progress_callback = progress_callback or _ignore_progress
+    log_callback = log_callback or _ignore_log
+    results = [_new_result(f, input_root, output_root) for f in files]
+    started = time.monotonic()
+    try:
+        for result in results:
+            os.makedirs(os.path.dirname(result.output_path), exist_ok=True)
+        infos = normalize_group([(sources.get(r.input_path, r.input_path), r.output_path, file_id)
+                                 for r, file_id in zip(results, file_ids)],
+                                settings, progress_callback, log_callback)
+    except Exception as e:
+        logger.warning(f"Grouped processing failed, falling back to one file at a time: {e}")
+        return [process_file(f, input_root, output_root, settings, file_id, progress_callback, log_callback,
+                             sources.get(f))
+                for f, file_id in zip(files, file_ids)]
+
+    elapsed = (time.monotonic() - started) / len(files)
+    for index, result in enumerate(results):
+        if infos is None:
+            result.canceled = True
+        else:
+            _apply_info(result, infos[index])
+        result.elapsed_sec = elapsed
+    return results
+
+
+async def aprocess_file(file_path: str, input_root: str, output_root: str, settings: Dict,
+                        file_id: str, progress_callback: Optional[Callable] = None,
+                        log_callback: Optional[Callable] = None, source: Optional[str] = None) -> FileResult:
+    """
+    asyncio variant of process_file(): FFmpeg runs as children of the
+    running event loop (see async_executor). Same arguments and result.
+    """
+    result = _new_result(file_path, input_root, output_root)
+    started = time.monotonic()
+
+    try:
+        os.makedirs(os.path.dirname(result.output_path), exist_ok=True)
+        info = await anormalize_file(source or file_path, result.output_path, settings, file_id,
+                                     progress_callback or _ignore_progress,
+                                     log_callback or _ignore_log)
+        if info is None:
+            result.canceled = True
+        else:
+            _apply_info(result, info)
+    except Exception as e:
+        logger.error(f"Failed to process {file_path}: {e}")
+        result.error = str(e)
+        result.failure = classify_failure(e)
+
+    result.elapsed_sec = time.monotonic() - started
+    return result
+
+
+async def aprocess_group(files: List[str], input_root: str, output_root: str, settings: Dict,
+                         file_ids: List[str], progress_callback: Optional[Callable] = None,
+                         log_callback: Optional[Callable] = None,
+                         sources: Optional[Dict[str, str]] = None) -> List[FileResult]:
+    """
+    asyncio variant of process_group(). Single files go through
+    aprocess_file(); grouped clips run in the loop's thread pool.
+    """
+    if len(files) == 1:
+        return [await aprocess_file(files[0], input_root, output_root, settings, file_ids[0],
+                                    progress_callback, log_callback, (sources or {}).get(files[0]))]
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, process_group, files, input_root, output_root, settings,
+                                      file_ids, progress_callback, log_callback, sources)
+
+
+def process_batch(input_path: str, output_path: str, settings: Optional[Dict] = None,
+                  files: Optional[Iterable[str]] = None, concurrency: int = 1,
+                  progress_callback: Optional[Callable] = None,
+                  log_callback: Optional[Callable] = None) -> Iterator[FileResult]:
+    """
+    Normalize a batch of files, yielding a FileResult as each one completes.
+
+    Example:
+        for result in process_batch('/data/in', '/data/out', {'normMode': 'lufs'}):
+            print(result.rel_path, result.gain_db, result.error)
+
+    Args:
+        input_path: Input directory
+        output_path: Output directory
+        settings: Processing settings (see normalize_file); defaults apply if None
+        files: Optional explicit list of files under input_path (default: scan)
+        concurrency: Number of files processed at once
+        progress_callback: Optional progress callback(job_id, phase, status, pct)
+        log_callback: Optional log callback(job_id, phase, message)
+
+    Yields:
+        FileResult objects in completion order
+    """
+    settings = settings or {}
+    file_list = list(files) if files is not None else scan_files(input_path)
+
+    def run_one(file_path):
+        # Relative paths are unique within a batch, unlike basenames
+        file_id = os.path.relpath(file_path, input_path)
+        return process_file(file_path, input_path, output_path, settings, file_id,
+                            progress_callback, log_callback)
+
+    if concurrency <= 1:
+        for file_path in file_list:
+            if process_manager.is_canceled():
+                return
+            yield run_one(file_path)
+        return
+
+    # Keep only `concurrency` files in flight so huge batches don't
+    # queue every future up front
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        remaining = iter(file_list)
+
+        def submit_next():
+            for file_path in remaining:
+                pending.add(pool.submit(run_one, file_path))
+                return True
+            return False
+
+        for _ in range(concurrency):
+            if not submit_next():
+                break
+        while pending:
+            done = next(as_completed(pending))
+            pending.discard(done)
+            if not process_manager.is_canceled():
+                submit_next()
+            yield done.result()
+
+
+async def aprocess_batch(input_path: str, output_path: str, settings: Optional[Dict] = None,
+                         files: Optional[Iterable[str]] = None, concurrency: int = 1,
+                         progress_callback: Optional[Callable] = None,
+                         log_callback: Optional[Callable] = None) -> AsyncIterator[FileResult]:
+    """
+    asyncio variant of process_batch().
+
+    Example:
+        async for result in aprocess_batch('/data/in', '/data/out', concurrency=4):
+            await store(result.to_dict())
+
+    FFmpeg processes are children of the running event loop, so no thread
+    is parked per file; arguments and results are the same as
+    process_batch(). Closing the iterator early kills the files in flight.
+    """
+    settings = settings or {}
+    file_list = list(files) if files is not None else scan_files(input_path)
+
+    def run_one(file_path):
+        file_id = os.path.relpath(file_path, input_path)
+        return asyncio.ensure_future(aprocess_file(file_path, input_path, output_path, settings, file_id,
+                                                   progress_callback, log_callback))
+
+    pending = set()
+    remaining = iter(file_list)
+
+    def submit_next():
+        for file_path in remaining:
+            pending.add(run_one(file_path))
+            return True
+        return False
+
+    for _ in range(max(1, concurrency)):
+        if not submit_next():
+            break
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                if not process_manager.is_canceled():
+                    submit_next()
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def new_batch_state() -> Dict:
+    """Create a fresh batch state dict (same shape as the UI's processing_state)."""
+    return {
+        'running': False,
+        'paused': False,
+        'processed_files': set(),  # Track completed files for resume
+        'total_files': 0
+    }
+
+
+def verify_batch_output(input_path: str, output_path: str,
+                        files: Optional[Iterable[str]] = None, settings: Optional[Dict] = None,
+                        on_mismatch: Optional[Callable[[str, str, List[str]], None]] = None) -> Dict:
+    """
+    Verify that all input files have matching output files.
+
+    Outputs are checked from their WAV headers in a thread pool (see verify).
+
+    Args:
+        input_path: Input directory
+        output_path: Output directory
+        files: Optional subset of inputs to check (default: scan input_path)
+        settings: Processing settings the outputs were rendered with
+        on_mismatch: Optional callback(input_file, verdict, problems), called
+            as soon as a missing or mismatched output is found
+
+    Returns:
+        Dict with success, matched (outputs present), missing and
+        mismatched ("rel/path (problem; ...)" entries)
+    """
+    results = {
+        'success': True,
+        'matched': 0,
+        'missing': 0,
+        'mismatched': []
+    }
+    try:
+        input_files = files if files is not None else scan_files(input_path)
+        pairs = ((f, output_path_for(f, input_path, output_path)) for f in input_files)
+
+        def on_result(input_file, verdict, problems):
+            if verdict == VERIFY_OK:
+                return
+            rel_path = os.path.relpath(input_file, input_path)
+            if verdict == VERIFY_MISSING:
+                logger.error(f"Missing output file: {rel_path}")
+                results['success'] = False
+            else:
+                logger.warning(f"Output mismatch for {rel_path}: {'; '.join(problems)}")
+            results['mismatched'].append(f"{rel_path} ({'; '.join(problems)})")
+            if on_mismatch:
+                on_mismatch(input_file, verdict, problems)
+
+        started = time.monotonic()
+        counts = verify_outputs(pairs, settings or {}, on_result)
+        results['missing'] = counts[VERIFY_MISSING]
+        results['matched'] = counts[VERIFY_OK] + counts[VERIFY_MISMATCH]
+        logger.info(f"Verified {sum(counts.values())} outputs in {time.monotonic() - started:.2f}s")
+        return results
+
+    except Exception as e:
+        logger.error(f"Verification error: {e}")
+        return {'success': False, 'matched': 0, 'missing': 0, 'mismatched': []}
+
+
+class _UnitQueue:
+    """
+    Units still to start in a run_batch() call.
+
+    Files interrupted by a pause go first, then retries whose backoff has
+    passed, then the remaining scheduled units. Files whose staged output
+    is still being moved (see staging) keep the batch going, as a failed
+    move is retried.
+    """
+
+    def __init__(self, units: List[List[str]], retries: RetryQueue):
+        self._units = deque(units)
+        self._resume = deque()
+        self.retries = retries
+        self.moving: Dict[str, Tuple[int, FileResult]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._units or self._resume or len(self.retries) or self.moving)
+
+    def take(self) -> Optional[List[str]]:
+        """The next unit to start, or None if only retries still in backoff are left."""
+        if self._resume:
+            return [self._resume.popleft()]
+        retry = self.retries.pop_due()
+        if retry is not None:
+            return [retry]
+        return self._units.popleft() if self._units else None
+
+    def resume_later(self, file_path: str) -> None:
+        """Run a file again after a pause interrupted it."""
+        self._resume.append(file_path)
+
+    def upcoming(self, count: int) -> List[str]:
+        """Files of the next scheduled units, up to `count` (for prefetching)."""
+        upcoming = []
+        for unit in self._units:
+            if len(upcoming) >= count:
+                break
+            upcoming.extend(unit[:count - len(upcoming)])
+        return upcoming
+
+
+def run_batch(input_path: str, output_path: str, settings: Dict, state: Dict,
+              emit: Callable, files: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Process every WAV file under input_path into output_path.
+
+    Events are reported as emit(event, data) with these event names:
+    sync, batchStart, fileTable, tuning, schedule, fileStart, phase, log,
+    fileDone, requeued, fileFailed, progress, verifyMismatch, error,
+    stopped and allDone.
+    Per-file events identify files by an integer fileId: its index in the
+    relative paths sent once by fileTable (see file_table).
+
+    A failed file does not stop the batch: transient I/O errors and killed
+    FFmpeg processes are retried with a backoff (requeued, see failures),
+    other failures are final (fileFailed) and listed in the summary's
+    failure report. FFmpeg runs that miss their watchdog deadline are
+    killed and retried as 'stalled'. Files interrupted by a pause run
+    again on resume.
+
+    tuning reports the values chosen for "auto" concurrency/ffmpegThreads
+    (see tuner); schedule (concurrent batches only) carries the dispatch
+    order's predicted makespan (see scheduler).
+
+    Args:
+        input_path: Input directory
+        output_path: Output directory
+        settings: Processing settings (see normalize_file)
+        state: Batch state dict from new_batch_state(); 'running' and
+            'paused' may be flipped from another thread to stop or pause
+        emit: Event callback(event, data)
+        files: Optional subset of files under input_path to process
+            (default: scan input_path); verification is limited to it
+
+    Returns:
+        Summary dict with total, completed, failed, stopped, verification,
+        schedule, failures (see failures.failure_report), watchdog
+        (stall counts and observed rates, see watchdog.metrics),
+        checksums (see checksums.ManifestWriter.close), staging (see
+        staging.OutputStager.close), prefetch (see prefetch.Prefetcher.close)
+        and sync (see sync.SyncPlan.to_dict, plus pruned)
+    """
+    summary = {
+        'total': 0,
+        'completed': 0,
+        'failed': 0,
+        'stopped': False,
+        'verification': None,
+        'schedule': None,
+        'failures': None,
+        'watchdog': None,
+        'checksums': None,
+        'staging': None,
+        'prefetch': None,
+        'sync': None
+    }
+
+    auto_tune = needs_tuning(settings)
+    concurrency = 1 if auto_tune else max(1, int(settings.get('concurrency', 1) or 1))
+    bridge = None
+    manifests = None
+    stager = None
+    prefetcher = None
+    sync_index = None
+    if concurrency > 1 or auto_tune:
+        # Events now come from the event loop and its worker threads
+        emit = bridge = EventBridge(emit)
+
+    try:
+        logger.info(f"Batch worker started: input_path={input_path}, output_path={output_path}, concurrency={concurrency}")
+
+        # A previous stop or pause may have left the cancel flag set
+        process_manager.reset()
+        watchdog.reset_stalls()
+
+        # Probe FFmpeg once up front so per-file stages only do cached lookups
+        get_capabilities()
+
+        # Scan for files
+        batch_files = list(files) if files is not None else scan_files(input_path)
+        wav_files = batch_files
+        logger.info(f"Found {len(wav_files)} WAV files")
+
+        # Sync: only inputs whose output is missing or out of date (see sync)
+        sync_plan = None
+        if settings.get('sync', False):
+            index = read_index(output_path)
+            sync_plan = plan_sync(batch_files, input_path, output_path, settings, index)
+            summary['sync'] = sync_plan.to_dict()
+            stale = [shard_key(f, input_path) for f in sync_plan.todo]
+            # With a file subset, entries outside it are not orphans
+            if files is None and settings.get('syncPrune', False) and sync_plan.orphans:
+                summary['sync']['pruned'] = prune_orphans(output_path, sync_plan.orphans, index)
+                stale.extend(rel for rel in sync_plan.orphans if rel not in index)
+            # Files rendered again get fresh manifest lines; pruned ones none
+            drop_manifest_entries(output_path, stale)
+            wav_files = sync_plan.todo
+            sync_index = SyncIndex(output_path, settings, index)
+            logger.info(f"Sync: {len(wav_files)} to render, {sync_plan.up_to_date} up to date "
+                        f"({sync_plan.reasons}), {len(sync_plan.orphans)} orphaned")
+            emit('sync', summary['sync'])
+
+        # Filter out already processed files (for resume)
+        if state['processed_files']:
+            unprocessed = [f for f in wav_files if f not in state['processed_files']]
+            logger.info(f"Resuming: {len(unprocessed)} files remaining (already processed: {len(state['processed_files'])})")
+            wav_files = unprocessed
+
+        # Check if there are files to process
+        if not wav_files:
+            if sync_plan is not None:
+                logger.info("Sync: all outputs are up to date")
+            else:
+                logger.warning("No files to process (all may have been processed already)")
+            emit('allDone', {})
+            return summary
+
+        total = state.get('total_files', 0)
+        if not total or total == 0:
+            total = len(wav_files)
+            state['total_files'] = total
+        summary['total'] = total
+
+        completed = len(state['processed_files'])
+
+        logger.info(f"Triggering batch start event with {total} files (starting at {completed})")
+        emit('batchStart', {'total': total, 'completed': completed})
+
+        # Compact IDs for per-file events and process tracking; names are sent once
+        file_ids, rel_paths = file_table(batch_files, input_path)
+        emit('fileTable', {'files': rel_paths})
+
+        def progress_cb(job_id, phase, status, pct):
+            emit('phase', {'fileId': job_id, 'phase': phase, 'status': status, 'pct': pct})
+
+        def log_cb(job_id, phase, message):
+            emit('log', {'fileId': job_id, 'phase': phase, 'message': message})
+
+        # Header durations drive grouping, scheduling and tuning
+        needs_durations = settings.get('multiFile', False) or concurrency > 1 or auto_tune
+        durations = scan_durations(wav_files) if needs_durations else {}
+
+        # "auto" concurrency/threads: stored calibration for this machine and input profile
+        if auto_tune:
+            settings, source = resolve_auto(settings, wav_files, input_path, durations,
+                                            log=lambda message: emit('log', {'fileId': None, 'phase': 'tune',
+                                                                             'message': message}))
+            concurrency = max(1, int(settings['concurrency']))
+            threads = settings.get('ffmpegThreads', 0)
+            logger.info(f"Auto tuning ({source}): concurrency={concurrency}, ffmpegThreads={threads}")
+            emit('tuning', {'source': source, 'concurrency': concurrency, 'ffmpegThreads': threads})
+
+        # Tiny clips can share FFmpeg processes (see multi_file)
+        if settings.get('multiFile', False):
+            units = plan_groups(wav_files, settings, durations)
+            grouped = sum(len(unit) for unit in units if len(unit) > 1)
+            if grouped:
+                logger.info(f"Multi-file mode: {grouped} short files in {sum(1 for u in units if len(u) > 1)} groups")
+        else:
+            units = [[f] for f in wav_files]
+
+        # Longest first, so long recordings don't end up running alone at the end
+        if concurrency > 1:
+            units, schedule = schedule_units(units, durations, concurrency, settings.get('schedule', 'lpt'))
+            summary['schedule'] = schedule
+            logger.info(f"Schedule ({schedule['strategy']}, {concurrency} slots): predicted makespan "
+                        f"{schedule['makespanSec']:.1f}s of audio per slot (scan order: "
+                        f"{schedule['fifoMakespanSec']:.1f}s, lower bound: {schedule['lowerBoundSec']:.1f}s)")
+            emit('schedule', schedule)
+
+        counters = {'completed': completed, 'failed': 0}
+        failures = []
+        # Fixity manifests: a resumed batch, a file subset (shard, worker) or a sync run adds to them
+        if settings.get('checksums'):
+            manifests = ManifestWriter(input_path, output_path, resolve_algorithms(settings['checksums']),
+                                       hash_inputs=settings.get('checksumInputs', True),
+                                       append=bool(state['processed_files']) or files is not None or
+                                       sync_plan is not None)
+
+        # Render to local scratch; copier threads move finished files into the output tree
+        render_root = output_path
+        if settings.get('scratchDir'):
+            stager = OutputStager(settings['scratchDir'], output_path,
+                                  settings.get('scratchLimitMb', DEFAULT_SCRATCH_LIMIT_MB),
+                                  settings.get('copyThreads', DEFAULT_COPY_THREADS))
+            render_root = stager.scratch_root
+            logger.info(f"Staging outputs in {render_root}")
+
+        # Warm the inputs queued behind the running ones (see prefetch)
+        prefetch_files = int(settings.get('prefetchFiles', 0) or 0)
+        if prefetch_files > 0:
+            prefetcher = Prefetcher(settings.get('prefetchMb'), settings.get('prefetchCopyDir'),
+                                    settings.get('prefetchCopyMaxMb', DEFAULT_COPY_MAX_MB))
+
+        work = _UnitQueue(units, RetryQueue(settings.get('maxRetries', DEFAULT_MAX_RETRIES),
+                                            settings.get('retryBackoffSec', DEFAULT_RETRY_BACKOFF_SEC)))
+
+        def emit_progress(file_id: int) -> None:
+            # Final failures count as finished for the overall bar
+            finished = counters['completed'] + counters['failed']
+            emit('progress', {
+                'fileId': file_id,
+                'filePct': 100,
+                'overallPct': round(finished / total * 100, 2),
+                'completed': counters['completed'],
+                'total': total
+            })
+
+        def start_unit(unit: List[str]) -> Tuple[List[int], Optional[Dict[str, str]]]:
+            unit_ids = [file_ids[file_path] for file_path in unit]
+            for offset, file_path in enumerate(unit):
+                logger.info(f"Processing file {counters['completed'] + offset + 1}/{total}: "
+                            f"{rel_paths[unit_ids[offset]]}")
+                emit('fileStart', {'fileId': unit_ids[offset]})
+            if prefetcher is None:
+                return unit_ids, None
+            # Local copies to read from, then queue what comes next
+            sources = {file_path: prefetcher.source(file_path) for file_path in unit}
+            prefetcher.ahead(work.upcoming(prefetch_files))
+            return unit_ids, sources
+
+        def fail_file(file_path: str, file_id: int, result: FileResult, retry: bool = True) -> None:
+            failure = result.failure or FAILURE_ERROR
+            attempt = work.retries.attempts(file_path)
+            delay = work.retries.offer(file_path, failure) if retry else None
+            if delay is not None:
+                logger.warning(f"Retrying {rel_paths[file_id]} in {delay:.1f}s "
+                               f"(attempt {attempt} failed, {failure}): {result.error}")
+                emit('requeued', {'fileId': file_id, 'failure': failure, 'attempt': attempt,
+                                  'delaySec': round(delay, 2), 'message': result.error})
+                return
+            logger.error(f"Giving up on {rel_paths[file_id]} after {attempt} attempt(s) "
+                         f"({failure}): {result.error}")
+            counters['failed'] += 1
+            summary['failed'] = counters['failed']
+            failures.append({'fileId': file_id, 'file': rel_paths[file_id], 'failure': failure,
+                             'attempts': attempt, 'message': result.error})
+            emit('fileFailed', {'fileId': file_id, 'failure': failure, 'attempts': attempt,
+                                'message': result.error})
+            emit_progress(file_id)
+
+        def settle_moves(retry: bool = True) -> None:
+            # Staged files count as done once the copier has put them in place
+            if stager is None:
+                return
+            for file_path, error in stager.finished():
+                file_id, result = work.moving.pop(file_path)
+                if error is None:
+                    complete_file(file_path, file_id, result)
+                else:
+                    result.error = f"Could not move output into place: {error}"
+                    result.failure = classify_failure(error)
+                    fail_file(file_path, file_id, result, retry)
+
+        def finish_unit(unit: List[str], unit_ids: List[int], results: List[FileResult]) -> None:
+            for file_path, file_id, result in zip(unit, unit_ids, results):
+                if prefetcher is not None:
+                    prefetcher.release(file_path)
+                if result.canceled:
+                    # Not processed: a paused batch runs it again on resume
+                    if state['running']:
+                        work.resume_later(file_path)
+                    continue
+
+                if result.error is not None:
+                    fail_file(file_path, file_id, result)
+                    continue
+
+                if stager is not None:
+                    # Moved into place on a copier thread, then hashed from scratch
+                    dest_path = output_path_for(file_path, input_path, output_path)
+                    after_move = None
+                    if manifests is not None:
+                        after_move = partial(manifests.hash_now, file_path, result.output_path,
+                                             os.path.relpath(dest_path, output_path))
+                    work.moving[file_path] = (file_id, result)
+                    stager.submit(result.output_path, dest_path, after_move, tag=file_path)
+                    result.output_path = dest_path
+                    continue
+
+                if manifests is not None:
+                    # Hashed on a background thread while the output is still cached
+                    manifests.add(file_path, result.output_path)
+                complete_file(file_path, file_id, result)
+
+        def complete_file(file_path: str, file_id: int, result: FileResult) -> None:
+            if sync_index is not None:
+                    sync_index.record(shard_key(file_path, input_path), sync_plan.stats.get(file_path), file_path)
+
+            # Mark file as processed
+            state['processed_files'].add(file_path)
+            counters['completed'] += 1
+            summary['completed'] = counters['completed']
+
+            logger.info(f"File complete: {os.path.basename(file_path)} ({counters['completed']}/{total})")
+            emit('fileDone', {'fileId': file_id, 'result': result.to_dict()})
+            emit_progress(file_id)
+
+        if concurrency > 1:
+            asyncio.run(_run_units_concurrently(work, concurrency, input_path, render_root, settings,
+                                                state, emit, start_unit, finish_unit,
+                                                progress_cb, log_cb, stager, settle_moves))
+        else:
+            while work:
+                settle_moves()
+
+                # Check for stop
+                if not state['running']:
+                    logger.info("Processing stopped by user")
+                    emit('stopped', {})
+                    break
+
+                # Check for pause
+                while state['paused']:
+                    if not state['running']:  # Stop requested during pause
+                        break
+                    time.sleep(0.5)
+
+                if not state['running']:
+                    break
+
+                # Scratch full: let the copiers catch up
+                if stager is not None and not stager.wait_for_space(0.5):
+                    continue
+
+                unit = work.take()
+                if unit is None:
+                    # Only retries still in backoff, or moves still running, are left
+                    if work.moving:
+                        stager.wait_finished(work.retries.wait_sec())
+                    else:
+                        time.sleep(work.retries.wait_sec())
+                    continue
+
+                unit_ids, sources = start_unit(unit)
+                results = process_group(unit, input_path, render_root, settings, unit_ids,
+                                        progress_cb, log_cb, sources)
+                finish_unit(unit, unit_ids, results)
+
+        # Outputs must be in place before they are verified
+        if stager is not None:
+            summary['staging'] = stager.close()
+            # The batch is over: moves failing now are not retried
+            settle_moves(retry=False)
+            stager = None
+            logger.info(f"Staging: moved {summary['staging']['files']} files "
+                        f"({summary['staging']['errors']} errors)")
+        completed = counters['completed']
+
+        summary['watchdog'] = watchdog.metrics()
+        if summary['watchdog']['stalls']:
+            logger.warning(f"Watchdog killed {summary['watchdog']['stalls']} stalled FFmpeg run(s): "
+                           f"{summary['watchdog']['stallsByStage']}")
+        if failures:
+            summary['failures'] = failure_report(failures)
+            logger.warning(f"{len(failures)} file(s) failed: {summary['failures']['byClass']}")
+
+        summary['stopped'] = not state['running']
+
+        if prefetcher is not None:
+            summary['prefetch'] = prefetcher.close()
+            prefetcher = None
+            logger.info(f"Prefetch: {summary['prefetch']}")
+
+        if sync_index is not None:
+            sync_index.close()
+            sync_index = None
+
+        if manifests is not None:
+            summary['checksums'] = manifests.close()
+            manifests = None
+            logger.info(f"Checksums: {summary['checksums']['files']} files hashed "
+                        f"({', '.join(summary['checksums']['algorithms'])})")
+
+        # Processing complete - verify all files
+        if state['running'] and not state['paused']:
+            logger.info(f"Batch processing complete: {completed}/{total} files")
+            logger.info("Verifying output files...")
+
+            # Failed files are reported in summary['failures'], not as missing outputs
+            verify_files = batch_files
+            if failures:
+                failed_paths = {batch_files[entry['fileId']] for entry in failures}
+                verify_files = [f for f in batch_files if f not in failed_paths]
+
+            def on_mismatch(input_file, verdict, problems):
+                emit('verifyMismatch', {'fileId': file_ids[input_file], 'verdict': verdict, 'problems': problems})
+
+            verification_results = verify_batch_output(input_path, output_path, verify_files,
+                                                       settings, on_mismatch)
+            summary['verification'] = verification_results
+
+            if verification_results['missing'] > 0:
+                # Files are actually missing - this is an error
+                logger.error(f"✗ Verification failed: {verification_results['missing']} files missing")
+                emit('error', {'message': f"Verification failed: {verification_results['missing']} files not processed"})
+            else:
+                # No missing files - success (even if there are property mismatches)
+                logger.info(f"✓ Verification passed: {verification_results['matched']} files processed")
+                if verification_results['mismatched']:
+                    logger.info(f"Note: {len(verification_results['mismatched'])} files had property differences")
+                emit('allDone', {
+                    'matched': verification_results['matched'],
+                    'mismatched': len(verification_results['mismatched']),
+                    'failed': counters['failed']
+                })
+
+    except Exception as e:
+        logger.error(f"Batch processing error: {e}")
+        summary['failed'] += 1
+        emit('error', {'message': str(e)})
+    finally:
+        if not state['paused']:
+            state['running'] = False
+            state['processed_files'].clear()
+            state['total_files'] = 0
+        if prefetcher is not None:
+            prefetcher.close()
+        if stager is not None:
+            stager.close()
+        if manifests is not None:
+            manifests.close()
+        if sync_index is not None:
+            sync_index.close()
+        if bridge is not None:
+            bridge.close()
+
+    return summary
+
+
+async def _run_units_concurrently(work: _UnitQueue, concurrency: int, input_path: str,
+                                  output_path: str, settings: Dict, state: Dict, emit: Callable,
+                                  start_unit: Callable, finish_unit: Callable,
+                                  progress_cb: Callable, log_cb: Callable,
+                                  stager: Optional[OutputStager] = None,
+                                  settle_moves: Optional[Callable] = None) -> None:
+    """
+    run_batch()'s dispatch loop with up to `concurrency` units in flight.
+
+    New units start only while the batch is running and not paused (and,
+    with scratch staging, while the scratch budget has room); units
+    already in flight are always awaited and reported. settle_moves is
+    called every round to report staged files the copiers have moved.
+    """
+    pending = {}
+    stop_reported = False
+
+    while True:
+        if settle_moves is not None:
+            settle_moves()
+        while len(pending) < concurrency and state['running'] and not state['paused'] and \
+                (stager is None or stager.has_space()):
+            unit = work.take()
+            if unit is None:
+                break
+            unit_ids, sources = start_unit(unit)
+            task = asyncio.ensure_future(aprocess_group(unit, input_path, output_path, settings,
+                                                        unit_ids, progress_cb, log_cb, sources))
+            pending[task] = (unit, unit_ids)
+
+        if not state['running'] and work and not stop_reported:
+            logger.info("Processing stopped by user")
+            emit('stopped', {})
+            stop_reported = True
+
+        if not pending:
+            if state['running'] and (state['paused'] or work):
+                # Paused, or only retries still in backoff are left
+                await asyncio.sleep(0.5 if state['paused'] else work.retries.wait_sec())
+                continue
+            return
+
+        done, _ = await asyncio.wait(pending, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            unit, unit_ids = pending.pop(task)
+            finish_unit(unit, unit_ids, task.result())
+
+
+def stop_batch(state: Dict) -> None:
+    """Request a running batch to stop and kill its FFmpeg processes."""
+    state['running'] = False
+    state['paused'] = False
+    process_manager.kill_all()
@@ -0,0 +1,141 @@
+"""
+Vectorized peak analysis for groups of short clips.
+
+In multi-file peak mode, a group of PCM/float clips is loaded through
+WavReader into one zero-padded (clips x frames x channels) array, and
+trim edges, peaks and gains for the whole group come out of a handful
+of NumPy reductions instead of per-file FFmpeg runs and Python loops.
+The gain-adjusted clips are then written in-process, so a group of
+mappable WAVs needs no FFmpeg process at all.
+
+Trim edges follow silencedetect's rules: a frame is silent when every
+channel is under the threshold, and leading/trailing silence is only
+trimmed when it lasts at least the minimum silence duration.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from .wav_header import WavHeader
+from .decode_once import needs_decoding
+
+if np is not None:
+    from .wav_reader import WavReader
+    from .wav_writer import CODEC_FORMATS, write_wav
+    from . import loudness
+
+logger = logging.getLogger(__name__)
+
+HAVE_NUMPY = np is not None
+
+
+def can_analyze(headers: List[Optional[WavHeader]], codecs: List[str]) -> bool:
+    """True if every clip can be read directly and written in-process."""
+    if not HAVE_NUMPY or not headers:
+        return False
+    return all(not needs_decoding(h) for h in headers) and all(c in CODEC_FORMATS for c in codecs)
+
+
+def load_clips(paths: List[str], headers: List[WavHeader]) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    Load clips into one zero-padded float32 array.
+
+    Returns:
+        (samples of shape clips x max_frames x max_channels, frame counts)
+    """
+    lengths = np.array([h.num_frames for h in headers], dtype=np.int64)
+    channels = max(h.channels for h in headers)
+    samples = np.zeros((len(paths), int(lengths.max(initial=0)), channels), dtype=np.float32)
+    for index, (path, header) in enumerate(zip(paths, headers)):
+        with WavReader(path, header) as reader:
+            samples[index, :header.num_frames, :header.channels] = reader.read()
+    return samples, lengths
+
+
+def _silent_frames(samples: 'np.ndarray', headers: List[WavHeader], threshold_db: float,
+                   use_hpf: bool) -> 'np.ndarray':
+    """(clips x frames) mask of frames where every channel is under the threshold."""
+    threshold = 10.0 ** (threshold_db / 20.0)
+    level = np.abs(samples)
+    if use_hpf:
+        # One filter pass per sample rate over all clips' channels side by side
+        level = np.empty_like(samples)
+        clips, frames, channels = samples.shape
+        rates = np.array([h.sample_rate for h in headers])
+        for rate in np.unique(rates):
+            chosen = np.flatnonzero(rates == rate)
+            columns = samples[chosen].transpose(1, 0, 2).reshape(frames, -1)
+            filtered = loudness.filter_biquads(columns, [loudness.highpass_biquad(int(rate))], int(rate))
+            level[chosen] = np.abs(filtered.reshape(frames, len(chosen), channels).transpose(1, 0, 2))
+    return (level < threshold).all(axis=2)
+
+
+def analyze_clips(samples: 'np.ndarray', lengths: 'np.ndarray', headers: List[WavHeader],
+                  settings: Dict) -> Tuple[List[Tuple[float, float]], List[Optional[float]], List[bool]]:
+    """
+    Trim spans and peaks for a padded group of clips.
+
+    Args:
+        samples: Array from load_clips()
+        lengths: Frame counts from load_clips()
+        headers: Clip headers
+        settings: Processing settings (autoTrim and trim* keys)
+
+    Returns:
+        (trim span in seconds, peak in dBFS or None if silent, and whether
+        a non-silent region was found, per clip)
+    """
+    from .audio_processor import trim_config
+
+    clips, frames, _ = samples.shape
+    rates = np.array([h.sample_rate for h in headers], dtype=np.float64)
+    durations = lengths / rates
+    starts = np.zeros(clips, dtype=np.int64)
+    ends = lengths.copy()
+    any_loud = np.zeros(clips, dtype=bool)
+
+    if settings.get('autoTrim', False) and frames:
+        threshold_db, min_dur_sec, use_hpf, _ = trim_config(settings)
+        loud = ~_silent_frames(samples, headers, threshold_db, use_hpf)
+        loud &= np.arange(frames)[np.newaxis, :] < lengths[:, np.newaxis]
+        any_loud = loud.any(axis=1)
+        first_loud = np.argmax(loud, axis=1)
+        last_loud = frames - 1 - np.argmax(loud[:, ::-1], axis=1)
+        min_frames = min_dur_sec * rates
+
+        lead_trim = first_loud >= min_frames
+        tail_trim = (lengths - (last_loud + 1)) >= min_frames
+        eligible = any_loud & (durations * 1000 >= settings.get('trimMinFileMs', 800))
+        pad = np.round(settings.get('trimPadMs', 800) / 1000 * rates).astype(np.int64)
+
+        trim_start = np.where(eligible & lead_trim, np.maximum(0, first_loud - pad), 0)
+        trim_end = np.where(eligible & tail_trim, np.minimum(lengths, last_loud + 1 + pad), lengths)
+        starts, ends = trim_start, trim_end
+
+    # Peak over each clip's span: mask frames outside it, then one reduction
+    index = np.arange(frames)[np.newaxis, :]
+    inside = (index >= starts[:, np.newaxis]) & (index < ends[:, np.newaxis])
+    peaks = np.where(inside, np.abs(samples).max(axis=2), 0.0).max(axis=1) if frames else np.zeros(clips)
+    with np.errstate(divide='ignore'):
+        peak_db = 20.0 * np.log10(peaks)
+
+    spans = [(float(s / r), float(e / r)) for s, e, r in zip(starts, ends, rates)]
+    return spans, [float(p) if np.isfinite(p) else None for p in peak_db], any_loud.tolist()
+
+
+def render_clip(input_path: str, header: WavHeader, span: Tuple[float, float],
+                gain_db: float, output_path: str, codec: str) -> None:
+    """
+    Write one clip's span with a gain applied.
+
+    The span is re-read from the file map at double precision, so 32-bit
+    and 64-bit sources are not rounded through the float32 analysis array.
+    """
+    with WavReader(input_path, header) as reader:
+        clip = reader.read_time(span[0], span[1], dtype=np.float64)
+    clip *= 10.0 ** (gain_db / 20.0)
+    write_wav(output_path, clip, header.sample_rate, codec)
@@ -0,0 +1,241 @@
+"""
+Fixity manifests for batch outputs and inputs.
+
+With the checksums setting on, every rendered file is hashed once right
+after it is written, while it is still in the page cache, so archive
+ingest does not have to read the outputs again. The same read also
+computes every requested algorithm. Inputs are hashed the same way for
+provenance.
+
+Lines are appended to BagIt-style manifests in the output root as files
+finish ("<hex digest>  <path>", paths relative to the output or input
+root, with forward slashes):
+
+- manifest-<alg>.txt: outputs
+- input-manifest-<alg>.txt: inputs
+
+Sync runs add to the manifests of earlier runs; the lines of files they
+render again, or prune, are dropped first (see drop_manifest_entries).
+
+"fast" selects xxHash (xxh128) if the xxhash package is installed, else
+BLAKE3 if blake3 is installed, else BLAKE2b from the standard library.
+md5, sha1, sha256 and sha512 can be added for archive compatibility.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover - optional dependency
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:  # pragma: no cover - optional dependency
+    blake3 = None
+
+logger = logging.getLogger(__name__)
+
+FAST = 'fast'
+HASHLIB_ALGORITHMS = ('blake2b', 'md5', 'sha1', 'sha256', 'sha512')
+READ_CHUNK = 1024 * 1024
+HASH_WORKERS = 2
+
+OUTPUT_MANIFEST = 'manifest-{alg}.txt'
+INPUT_MANIFEST = 'input-manifest-{alg}.txt'
+
+
+def fast_algorithm() -> str:
+    """The fastest algorithm available here."""
+    if xxhash is not None:
+        return 'xxh128'
+    if blake3 is not None:
+        return 'blake3'
+    return 'blake2b'
+
+
+def resolve_algorithms(spec: Union[str, List[str]]) -> List[str]:
+    """
+    Parse a checksums setting ("fast,md5" or a list) into algorithm names.
+
+    Raises:
+        ValueError: For unknown algorithms, or ones whose package is missing
+    """
+    names = spec.split(',') if isinstance(spec, str) else list(spec)
+    algorithms = []
+    for name in (n.strip().lower() for n in names):
+        if not name:
+            continue
+        if name == FAST:
+            name = fast_algorithm()
+        if name == 'xxh128' and xxhash is None:
+            raise ValueError("checksum xxh128 needs the xxhash package")
+        if name == 'blake3' and blake3 is None:
+            raise ValueError("checksum blake3 needs the blake3 package")
+        if name not in HASHLIB_ALGORITHMS and name not in ('xxh128', 'blake3'):
+            raise ValueError(f"unknown checksum algorithm: {name}")
+        if name not in algorithms:
+            algorithms.append(name)
+    return algorithms
+
+
+def _new_hash(algorithm: str):
+    if algorithm == 'xxh128':
+        return xxhash.xxh3_128()
+    if algorithm == 'blake3':
+        return blake3.blake3()
+    return hashlib.new(algorithm)
+
+
+def hash_file(path: str, algorithms: List[str]) -> Dict[str, str]:
+    """Hex digests of a file for each algorithm, from a single read."""
+    hashes = [_new_hash(algorithm) for algorithm in algorithms]
+    buffer = bytearray(READ_CHUNK)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            for h in hashes:
+                h.update(view[:count])
+    return {algorithm: h.hexdigest() for algorithm, h in zip(algorithms, hashes)}
+
+
+def manifest_path_entry(rel_path: str) -> str:
+    """A relative path as written in a BagIt manifest line."""
+    return rel_path.replace(os.sep, '/').replace('%', '%25').replace('\r', '%0D').replace('\n', '%0A')
+
+
+def _is_manifest(name: str) -> bool:
+    return name.endswith('.txt') and (name.startswith('manifest-') or name.startswith('input-manifest-'))
+
+
+def drop_manifest_entries(output_root: str, rel_paths: Iterable[str]) -> int:
+    """
+    Remove the lines of some files from every manifest in an output tree.
+
+    Each changed manifest is rewritten under a temporary name and renamed
+    into place.
+
+    Args:
+        output_root: Output directory holding the manifests
+        rel_paths: Relative paths (forward slashes) whose lines to remove
+
+    Returns:
+        Number of lines removed
+    """
+    entries = {manifest_path_entry(rel_path) for rel_path in rel_paths}
+    if not entries:
+        return 0
+    try:
+        names = sorted(name for name in os.listdir(output_root) if _is_manifest(name))
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for name in names:
+        path = os.path.join(output_root, name)
+        with open(path, encoding='utf-8', newline='\n') as f:
+            lines = f.readlines()
+        kept = [line for line in lines if line.rstrip('\n').partition('  ')[2] not in entries]
+        if len(kept) == len(lines):
+            continue
+        temp_path = os.path.join(output_root, f'.{name}.tmp')
+        with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(kept)
+        os.replace(temp_path, path)
+        removed += len(lines) - len(kept)
+    return removed
+
+
+class ManifestWriter:
+    """
+    Hashes finished files on background threads and appends manifest lines.
+
+    Call add() as each file is done and close() at the end of the batch;
+    close() waits for pending hashes.
+    """
+
+    def __init__(self, input_root: str, output_root: str, algorithms: List[str],
+                 hash_inputs: bool = True, append: bool = False, workers: int = HASH_WORKERS):
+        self.input_root = input_root
+        self.output_root = output_root
+        self.algorithms = algorithms
+        self.hash_inputs = hash_inputs
+        self._lock = threading.Lock()
+        self._files = 0
+        self._errors = 0
+        self._bytes = 0
+        self._busy_sec = 0.0
+        self._manifests = {}
+        mode = 'a' if append else 'w'
+        for algorithm in algorithms:
+            names = [('output', OUTPUT_MANIFEST)] + ([('input', INPUT_MANIFEST)] if hash_inputs else [])
+            for kind, pattern in names:
+                path = os.path.join(output_root, pattern.format(alg=algorithm))
+                self._manifests[kind, algorithm] = open(path, mode, encoding='utf-8', newline='\n')
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='checksum')
+
+    def add(self, input_file: str, output_file: str) -> None:
+        """Queue a finished file (and its input) for hashing."""
+        self._pool.submit(self.hash_now, input_file, output_file)
+
+    def hash_now(self, input_file: str, output_file: str, output_rel: Optional[str] = None) -> None:
+        """
+        Hash a finished file (and its input) on the calling thread.
+
+        Args:
+            input_file: Input path
+            output_file: Rendered file to read
+            output_rel: Manifest path of the output if output_file is not
+                under the output root (e.g. a staged scratch copy)
+        """
+        entries = [('output', output_file, output_rel)]
+        if self.hash_inputs:
+            entries.append(('input', input_file, None))
+        for kind, path, rel_path in entries:
+            started = time.monotonic()
+            try:
+                digests = hash_file(path, self.algorithms)
+                size = os.path.getsize(path)
+            except OSError as e:
+                logger.warning(f"Could not hash {path}: {e}")
+                with self._lock:
+                    self._errors += 1
+                continue
+            if rel_path is None:
+                rel_path = os.path.relpath(path, self.output_root if kind == 'output' else self.input_root)
+            entry = manifest_path_entry(rel_path)
+            with self._lock:
+                for algorithm, digest in digests.items():
+                    self._manifests[kind, algorithm].write(f"{digest}  {entry}\n")
+                self._bytes += size
+                self._busy_sec += time.monotonic() - started
+                if kind == 'output':
+                    self._files += 1
+
+    def close(self) -> Dict:
+        """
+        Wait for pending hashes and close the manifests.
+
+        Returns:
+            Dict with algorithms, files, errors, bytesHashed, hashSec and
+            manifests (paths written)
+        """
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            for f in self._manifests.values():
+                f.close()
+            return {
+                'algorithms': self.algorithms,
+                'files': self._files,
+                'errors': self._errors,
+                'bytesHashed': self._bytes,
+                'hashSec': round(self._busy_sec, 3),
+                'manifests': sorted(f.name for f in self._manifests.values())
+            }
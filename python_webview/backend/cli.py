@@ -0,0 +1,447 @@
+"""
+Headless command-line interface for batch processing.
+
+Drives the same batch engine as the desktop app (backend.batch) without
+importing pywebview, so it runs on a bare server with only FFmpeg:
+
+    python -m backend run INPUT_DIR OUTPUT_DIR --norm-mode lufs --auto-trim
+
+Static sharding across machines sharing a filesystem:
+
+    python -m backend run IN OUT --shard 1/3     # on node 1 (2/3, 3/3 elsewhere)
+    python -m backend merge-shards IN OUT --shards 3
+
+Dynamic load balancing with a coordinator and any number of workers:
+
+    python -m backend coordinator IN OUT --listen unix:/tmp/ban.sock
+    python -m backend worker --connect unix:/tmp/ban.sock    # one per slot/host
+
+Calibrating concurrency x FFmpeg threads for "auto" settings:
+
+    python -m backend tune INPUT_DIR --norm-mode lufs
+    python -m backend run IN OUT --norm-mode lufs --concurrency auto --ffmpeg-threads auto
+
+Progress is written to stdout as JSON lines, one object per event, e.g.
+{"event": "fileDone", "fileId": 3, "result": {...}}. Integer fileIds
+index the relative paths listed once by the fileTable event.
+Diagnostics go to stderr.
+
+Exit codes:
+    0   All files processed and verified
+    1   One or more files failed, or verification found missing outputs
+    2   Usage error (bad arguments, missing input, non-empty output)
+    3   FFmpeg not found
+    130 Interrupted (SIGINT/SIGTERM)
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import logging
+from typing import Dict, List, Optional
+
+from .batch import new_batch_state, run_batch, stop_batch, is_output_empty, scan_files
+from .ffmpeg_paths import get_ffmpeg_path
+from .ffmpeg_caps import get_capabilities
+from .distributed import (Coordinator, serve_coordinator, run_worker,
+                          DEFAULT_LEASE_TIMEOUT, DEFAULT_HEARTBEAT_INTERVAL, DEFAULT_MAX_ATTEMPTS)
+from .failures import failure_report
+from .checksums import resolve_algorithms
+from .tuner import AUTO, calibrate, candidate_grid, held_settings, SAMPLE_AUDIO_SEC
+from .sharding import (SHARD_STRATEGIES, parse_shard, select_shard, journal_path,
+                       ShardJournal, merge_shard_journals)
+
+logger = logging.getLogger(__name__)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NO_FFMPEG = 3
+EXIT_INTERRUPTED = 130
+
+
+def int_or_auto(value: str):
+    """argparse type: a non-negative integer or "auto" (see tuner)."""
+    if value == AUTO:
+        return value
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"expected a non-negative integer or 'auto', got {value!r}")
+    return number
+
+
+# (flag, settings key, type, help) for every setting read by normalize_file.
+# Booleans get a matching --no-<flag> switch.
+SETTING_FLAGS = [
+    ('--norm-mode', 'normMode', ['peak', 'lufs'], 'Normalization mode (default: peak)'),
+    ('--target-bit-depth', 'targetBitDepth', ['16', '24', 'original'], 'Output bit depth (default: 16)'),
+    ('--peak-target-db', 'peakTargetDb', float, 'Peak target in dBFS (default: -2)'),
+    ('--peak-only-boost', 'peakOnlyBoost', bool, 'Peak mode: never reduce gain (default: on)'),
+    ('--lufs-target', 'lufsTarget', float, 'Integrated loudness target in LUFS (default: -16)'),
+    ('--tp-margin', 'tpMargin', float, 'True peak ceiling in dBTP (default: -1.0)'),
+    ('--limiter-limit', 'limiterLimit', float, 'Limiter ceiling, linear 0-1 (default: 0.97)'),
+    ('--fast-normalize', 'fastNormalize', bool, 'LUFS: single-pass loudnorm (default: off)'),
+    ('--multi-file', 'multiFile', bool, 'Peak mode: process short clips in shared FFmpeg runs (default: off)'),
+    ('--decode-once', 'decodeOnce', bool, 'Decode compressed WAVs once and process in memory (default: on)'),
+    ('--in-process-lufs', 'inProcessLufs', bool, 'LUFS: render short PCM/float files with NumPy (default: on)'),
+    ('--concurrency', 'concurrency', int_or_auto, 'Files processed at once on one event loop, or auto (default: 1)'),
+    ('--schedule', 'schedule', ['lpt', 'fifo'], 'Dispatch order with --concurrency: longest first or scan order (default: lpt)'),
+    ('--ffmpeg-threads', 'ffmpegThreads', int_or_auto, 'Threads per FFmpeg process, 0 = FFmpeg decides, auto = calibrated (default: 0)'),
+    ('--max-retries', 'maxRetries', int, 'Retries for files failing with transient I/O errors or killed FFmpeg (default: 2)'),
+    ('--retry-backoff-sec', 'retryBackoffSec', float, 'Delay before the first retry, doubled for each next one (default: 2)'),
+    ('--scratch-dir', 'scratchDir', str, 'Render on this local folder and move finished files to OUTPUT (default: off)'),
+    ('--scratch-limit-mb', 'scratchLimitMb', float, 'With --scratch-dir, pause new files while this much output waits to be copied (default: 4096)'),
+    ('--copy-threads', 'copyThreads', int, 'With --scratch-dir, threads moving files to OUTPUT (default: 4)'),
+    ('--segment-analysis', 'segmentAnalysis', bool, 'Analyze long files as parallel time segments (default: off)'),
+    ('--segment-sec', 'segmentSec', float, 'Segment length for --segment-analysis; files under two segments run whole (default: 300)'),
+    ('--segment-workers', 'segmentWorkers', int, 'Most segments per file at once, 0 = CPU count (default: 0)'),
+    ('--prefetch-files', 'prefetchFiles', int, 'Warm this many queued inputs ahead of the running ones (default: 0, off)'),
+    ('--prefetch-mb', 'prefetchMb', float, 'Memory budget for prefetched inputs (default: 10%% of available RAM, at most 1024)'),
+    ('--prefetch-copy-dir', 'prefetchCopyDir', str, 'Copy small prefetched inputs to this local/RAM folder, e.g. /dev/shm (default: off)'),
+    ('--prefetch-copy-max-mb', 'prefetchCopyMaxMb', float, 'Largest input copied by --prefetch-copy-dir (default: 64)'),
+    ('--checksums', 'checksums', str, 'Write fixity manifests to OUTPUT, e.g. "fast" or "fast,md5,sha256" (default: off)'),
+    ('--checksum-inputs', 'checksumInputs', bool, 'With --checksums, also hash inputs into input-manifest-<alg>.txt (default: on)'),
+    ('--sync', 'sync', bool, 'Render only inputs whose output is missing or out of date; OUTPUT may be non-empty (default: off)'),
+    ('--sync-prune', 'syncPrune', bool, 'With --sync, delete outputs whose input is gone (default: off)'),
+    ('--sync-hash', 'syncHash', bool, 'With --sync, compare inputs with a changed mtime by content before rendering (default: off)'),
+    ('--verbose-logs', 'verboseLogs', bool, 'Verbose FFmpeg logging (default: off)'),
+    ('--auto-trim', 'autoTrim', bool, 'Trim leading/trailing silence (default: off)'),
+    ('--trim-pad-ms', 'trimPadMs', float, 'Padding kept around detected audio (default: 800)'),
+    ('--trim-threshold-db', 'trimThresholdDb', float, 'Silence threshold in dB (default: -50)'),
+    ('--trim-min-duration-ms', 'trimMinDurationMs', float, 'Minimum silence duration (default: 200)'),
+    ('--trim-min-file-ms', 'trimMinFileMs', float, 'Skip trimming files shorter than this (default: 800)'),
+    ('--trim-conservative', 'trimConservative', bool, 'Conservative trim thresholds (default: off)'),
+    ('--trim-hpf', 'trimHPF', bool, 'High-pass filter before silence detection (default: off)'),
+]
+
+
+def add_setting_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add one flag per processing setting to a parser."""
+    group = parser.add_argument_group('processing settings (override --settings)')
+    for flag, key, kind, help_text in SETTING_FLAGS:
+        if kind is bool:
+            group.add_argument(flag, dest=key, action='store_const', const=True, default=None,
+                               help=help_text)
+            group.add_argument('--no-' + flag[2:], dest=key, action='store_const', const=False,
+                               help=argparse.SUPPRESS)
+        elif isinstance(kind, list):
+            group.add_argument(flag, dest=key, choices=kind, default=None, help=help_text)
+        else:
+            group.add_argument(flag, dest=key, type=kind, default=None, help=help_text)
+
+
+def load_settings(args: argparse.Namespace) -> Dict:
+    """
+    Build the settings dict from an optional JSON file plus flag overrides.
+
+    The JSON file uses the same keys as the desktop app's settings
+    (e.g. {"normMode": "lufs", "lufsTarget": -18}).
+    """
+    settings = {}
+    if args.settings:
+        with open(args.settings, 'r', encoding='utf-8') as f:
+            loaded = json.load(f)
+        if not isinstance(loaded, dict):
+            raise ValueError(f"Settings file must contain a JSON object: {args.settings}")
+        settings.update(loaded)
+
+    for _, key, _, _ in SETTING_FLAGS:
+        value = getattr(args, key, None)
+        if value is not None:
+            settings[key] = value
+
+    bit_depth = settings.get('targetBitDepth')
+    if bit_depth is not None and bit_depth != 'original':
+        settings['targetBitDepth'] = int(bit_depth)
+    if settings.get('checksums'):
+        resolve_algorithms(settings['checksums'])
+
+    return settings
+
+
+class JsonLinesEmitter:
+    """Write batch engine events to a stream as JSON lines."""
+
+    def __init__(self, stream, quiet_events: Optional[List[str]] = None):
+        self.stream = stream
+        self.quiet_events = set(quiet_events or [])
+
+    def __call__(self, event: str, data: Dict) -> None:
+        if event in self.quiet_events:
+            return
+        record = {'event': event}
+        record.update(data)
+        self.stream.write(json.dumps(record, default=str) + '\n')
+        self.stream.flush()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Create the top-level argument parser."""
+    parser = argparse.ArgumentParser(
+        prog='python -m backend',
+        description='Bulk Audio Normalizer - headless batch processing'
+    )
+    parser.add_argument('--log-level', default='warning',
+                        choices=['debug', 'info', 'warning', 'error'],
+                        help='Diagnostic log level on stderr (default: warning)')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run = subparsers.add_parser('run', help='Normalize every WAV file under INPUT into OUTPUT')
+    run.add_argument('input', help='Input directory (scanned recursively for .wav/.wave)')
+    run.add_argument('output', help='Output directory (relative layout is preserved)')
+    run.add_argument('--settings', metavar='FILE', help='JSON settings file')
+    run.add_argument('--force', action='store_true',
+                     help='Allow a non-empty output directory')
+    run.add_argument('--quiet', action='store_true',
+                     help='Only emit per-file and batch events (no phase/log lines)')
+    run.add_argument('--failure-report', metavar='FILE',
+                     help='Write the files that failed (with error class and message) to FILE as JSON')
+    run.add_argument('--shard', metavar='I/N',
+                     help='Only process shard I of N (1-based); implies a shared output folder')
+    run.add_argument('--shard-by', choices=SHARD_STRATEGIES, default='hash',
+                     help='Shard by relative path hash or balanced audio duration (default: hash)')
+    add_setting_arguments(run)
+    run.set_defaults(func=cmd_run)
+
+    merge = subparsers.add_parser('merge-shards',
+                                  help='Check that every input was produced exactly once by N shards')
+    merge.add_argument('input', help='Input directory used by the shards')
+    merge.add_argument('output', help='Shared output directory holding the shard journals')
+    merge.add_argument('--shards', type=int, required=True, help='Number of shards (N)')
+    merge.set_defaults(func=cmd_merge_shards)
+
+    coord = subparsers.add_parser('coordinator', help='Hand out files under INPUT to worker processes')
+    coord.add_argument('input', help='Input directory (scanned recursively for .wav/.wave)')
+    coord.add_argument('output', help='Output directory (relative layout is preserved)')
+    coord.add_argument('--listen', required=True, metavar='ADDR',
+                       help='HOST:PORT or unix:/path/to.sock')
+    coord.add_argument('--settings', metavar='FILE', help='JSON settings file')
+    coord.add_argument('--force', action='store_true', help='Allow a non-empty output directory')
+    coord.add_argument('--lease-timeout', type=float, default=DEFAULT_LEASE_TIMEOUT,
+                       help=f'Seconds without a heartbeat before work is re-dispatched (default: {DEFAULT_LEASE_TIMEOUT:g})')
+    coord.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                       help=f'Dispatch attempts per file (default: {DEFAULT_MAX_ATTEMPTS})')
+    add_setting_arguments(coord)
+    coord.set_defaults(func=cmd_coordinator)
+
+    work = subparsers.add_parser('worker', help='Process files leased by a coordinator')
+    work.add_argument('--connect', required=True, metavar='ADDR',
+                      help='Coordinator address: HOST:PORT or unix:/path/to.sock')
+    work.add_argument('--input', help="Local path of the input tree (default: the coordinator's)")
+    work.add_argument('--output', help="Local path of the output tree (default: the coordinator's)")
+    work.add_argument('--heartbeat', type=float, default=DEFAULT_HEARTBEAT_INTERVAL,
+                      help=f'Seconds between heartbeats (default: {DEFAULT_HEARTBEAT_INTERVAL:g})')
+    work.add_argument('--connect-timeout', type=float, default=30.0,
+                      help='Seconds to wait for the coordinator to come up (default: 30)')
+    work.set_defaults(func=cmd_worker)
+
+    tune = subparsers.add_parser('tune', help='Calibrate concurrency and FFmpeg threads on a sample of INPUT')
+    tune.add_argument('input', help='Input directory (scanned recursively for .wav/.wave)')
+    tune.add_argument('--settings', metavar='FILE', help='JSON settings file')
+    tune.add_argument('--sample-sec', type=float, default=SAMPLE_AUDIO_SEC,
+                      help=f'Seconds of audio per trial (default: {SAMPLE_AUDIO_SEC:g}, raised for long files)')
+    tune.add_argument('--max-memory-mb', type=float,
+                      help='Reject configurations whose peak memory exceeds this')
+    add_setting_arguments(tune)
+    tune.set_defaults(func=cmd_tune)
+
+    return parser
+
+
+def cmd_tune(args: argparse.Namespace) -> int:
+    """Calibrate on the input set and store the result for "auto" settings."""
+    if not os.path.isdir(args.input):
+        logger.error(f"Input directory not found: {args.input}")
+        return EXIT_USAGE
+    try:
+        settings = load_settings(args)
+    except (OSError, ValueError) as e:
+        logger.error(f"Invalid settings: {e}")
+        return EXIT_USAGE
+    try:
+        get_ffmpeg_path()
+    except RuntimeError as e:
+        logger.error(str(e))
+        return EXIT_NO_FFMPEG
+    get_capabilities()
+
+    files = scan_files(args.input)
+    if not files:
+        logger.error(f"No WAV files found in {args.input}")
+        return EXIT_USAGE
+
+    emit = JsonLinesEmitter(sys.stdout)
+    result = calibrate(files, args.input, settings, candidates=candidate_grid(),
+                       budget_sec=args.sample_sec, max_memory_mb=args.max_memory_mb,
+                       log=lambda message: emit('log', {'phase': 'tune', 'message': message}),
+                       held=held_settings(settings, use_defaults=False))
+    if result is None:
+        return EXIT_FAILED
+    emit('tuning', result)
+    return EXIT_OK
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    """Run a batch and return the process exit code."""
+    if not os.path.isdir(args.input):
+        logger.error(f"Input directory not found: {args.input}")
+        return EXIT_USAGE
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        logger.error("Input folder cannot be the same as output folder")
+        return EXIT_USAGE
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            logger.error(str(e))
+            return EXIT_USAGE
+
+    try:
+        settings = load_settings(args)
+    except (OSError, ValueError) as e:
+        logger.error(f"Invalid settings: {e}")
+        return EXIT_USAGE
+
+    # The sync index would be rewritten by every node at once
+    if shard and settings.get('sync'):
+        logger.error("--sync cannot be combined with --shard")
+        return EXIT_USAGE
+    # Shards share one output folder, so other nodes may already have written to it;
+    # a sync run updates an existing output tree
+    if not args.force and not shard and not settings.get('sync') and not is_output_empty(args.output):
+        logger.error(f"Output directory must be empty (use --force or --sync to override): {args.output}")
+        return EXIT_USAGE
+
+    try:
+        get_ffmpeg_path()
+    except RuntimeError as e:
+        logger.error(str(e))
+        return EXIT_NO_FFMPEG
+    get_capabilities()
+
+    os.makedirs(args.output, exist_ok=True)
+
+    state = new_batch_state()
+    state['running'] = True
+    interrupted = []
+
+    def handle_signal(signum, frame):
+        interrupted.append(signum)
+        stop_batch(state)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    emit = JsonLinesEmitter(sys.stdout, ['phase', 'log'] if args.quiet else None)
+    files = None
+    if shard:
+        index, count = shard
+        files = select_shard(scan_files(args.input), args.input, index, count, args.shard_by)
+        emit = ShardJournal(journal_path(args.output, index, count), emit)
+        files = emit.pending(files, args.input)
+        logger.info(f"Shard {index}/{count} ({args.shard_by}): {len(files)} files to process")
+
+    summary = run_batch(args.input, args.output, settings, state, emit, files=files)
+    emit('summary', summary)
+    if args.failure_report:
+        with open(args.failure_report, 'w', encoding='utf-8') as f:
+            json.dump(summary['failures'] or failure_report([]), f, indent=2)
+
+    if interrupted or summary['stopped']:
+        return EXIT_INTERRUPTED
+    verification = summary.get('verification') or {}
+    if summary['failed'] or verification.get('missing', 0) > 0:
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def cmd_coordinator(args: argparse.Namespace) -> int:
+    """Serve the input queue to workers until everything is done."""
+    if not os.path.isdir(args.input):
+        logger.error(f"Input directory not found: {args.input}")
+        return EXIT_USAGE
+    if not args.force and not is_output_empty(args.output):
+        logger.error(f"Output directory must be empty (use --force to override): {args.output}")
+        return EXIT_USAGE
+    try:
+        settings = load_settings(args)
+    except (OSError, ValueError) as e:
+        logger.error(f"Invalid settings: {e}")
+        return EXIT_USAGE
+
+    os.makedirs(args.output, exist_ok=True)
+    emit = JsonLinesEmitter(sys.stdout)
+    coordinator = Coordinator(scan_files(args.input), os.path.abspath(args.input),
+                              os.path.abspath(args.output), settings, emit,
+                              lease_timeout=args.lease_timeout, max_attempts=args.max_attempts)
+    try:
+        summary = serve_coordinator(coordinator, args.listen)
+    except ValueError as e:
+        logger.error(str(e))
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        emit('summary', coordinator.summary())
+        return EXIT_INTERRUPTED
+
+    emit('summary', summary)
+    return EXIT_FAILED if summary['failed'] else EXIT_OK
+
+
+def cmd_worker(args: argparse.Namespace) -> int:
+    """Process leased files until the coordinator reports no more work."""
+    try:
+        get_ffmpeg_path()
+    except RuntimeError as e:
+        logger.error(str(e))
+        return EXIT_NO_FFMPEG
+    get_capabilities()
+
+    emit = JsonLinesEmitter(sys.stdout)
+    try:
+        counts = run_worker(args.connect, args.input, args.output, args.heartbeat, emit,
+                            connect_timeout=args.connect_timeout)
+    except ValueError as e:
+        logger.error(str(e))
+        return EXIT_USAGE
+    except OSError as e:
+        logger.error(f"Lost connection to coordinator: {e}")
+        return EXIT_FAILED
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+
+    emit('summary', counts)
+    return EXIT_FAILED if counts['failed'] else EXIT_OK
+
+
+def cmd_merge_shards(args: argparse.Namespace) -> int:
+    """Verify shard journals and write the merged journal."""
+    if not os.path.isdir(args.input) or not os.path.isdir(args.output):
+        logger.error("Input and output directories must exist")
+        return EXIT_USAGE
+    if args.shards < 1:
+        logger.error("--shards must be at least 1")
+        return EXIT_USAGE
+
+    report = merge_shard_journals(scan_files(args.input), args.input, args.output, args.shards)
+    JsonLinesEmitter(sys.stdout)('mergeShards', report)
+    return EXIT_OK if report['ok'] else EXIT_FAILED
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLI entry point."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper()),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
+    return args.func(args)
@@ -0,0 +1,444 @@
+"""
+Decode-once pipeline for inputs that need FFmpeg to decode them.
+
+Files the memory-mapped reader cannot read directly (ADPCM, A-law/mu-law,
+other compressed WAV payloads) would otherwise be decoded three times by
+normalize_file: once for silence detection, once for analysis and once
+for the render. Here FFmpeg decodes them a single time to raw float32 on
+a pipe; trim detection and measurement run on the buffered samples in
+Python, and one encoder FFmpeg receives the gain-adjusted samples on
+stdin. Decoded audio above DECODE_SPILL_BYTES is spilled to a temporary
+file (in the scratch folder if one is set, else the system temp folder)
+and memory-mapped instead of held in RAM. Everything after the decode
+works one block at a time (see loudness.measure_blocks), so no full-length
+copy of the samples is made.
+
+Requires NumPy; normalize_file only routes files here when it is present.
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+import subprocess
+import logging
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from .process_manager import process_manager
+from .failures import FFmpegError, FFmpegStalled
+from .watchdog import watchdog
+from .ffmpeg_paths import get_ffmpeg_path, get_ffprobe_path
+from .wav_header import WavHeader, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+from . import loudness
+
+logger = logging.getLogger(__name__)
+
+HAVE_NUMPY = np is not None
+
+# Decoded audio larger than this is spilled to a temp file and memory-mapped
+DECODE_SPILL_BYTES = 256 * 1024 * 1024
+_PIPE_CHUNK = 1 << 20
+# Frames handed to the encoder (and scanned for silence) per block
+_BLOCK_FRAMES = 1 << 16
+# Frames high-pass filtered at a time for trim detection
+_FILTER_BLOCK_FRAMES = 1 << 20
+
+# (format, bytes per sample) combinations WavReader maps without decoding
+_MAPPABLE = {(WAVE_FORMAT_PCM, 1), (WAVE_FORMAT_PCM, 2), (WAVE_FORMAT_PCM, 3), (WAVE_FORMAT_PCM, 4),
+             (WAVE_FORMAT_IEEE_FLOAT, 4), (WAVE_FORMAT_IEEE_FLOAT, 8)}
+
+
+def needs_decoding(header: Optional[WavHeader]) -> bool:
+    """True if the samples cannot be read without FFmpeg decoding them."""
+    if header is None or not header.channels:
+        return True
+    width = header.block_align // header.channels
+    return (header.audio_format, width) not in _MAPPABLE or width * header.channels != header.block_align
+
+
+def _stream_layout(input_path: str, header: Optional[WavHeader], job_id: str) -> Tuple[int, int]:
+    """
+    (channels, sample_rate) of the decoded stream, from the header or ffprobe.
+
+    Returns (0, 0) if the probe was canceled.
+
+    Raises:
+        FFmpegError: If ffprobe failed
+    """
+    if header is not None and header.channels and header.sample_rate:
+        return header.channels, header.sample_rate
+    proc = process_manager.spawn(
+        [get_ffprobe_path(), '-v', 'error', '-select_streams', 'a:0',
+         '-show_entries', 'stream=channels,sample_rate', '-of', 'json', input_path],
+        job_id=job_id
+    )
+    try:
+        stdout, stderr = proc.communicate(timeout=30)
+    except subprocess.TimeoutExpired:
+        process_manager.kill_process_tree(proc)
+        raise
+    finally:
+        process_manager.untrack(proc, job_id)
+    if proc.returncode != 0:
+        if process_manager.is_canceled():
+            return 0, 0
+        raise FFmpegError('Probing', proc.returncode, stderr.decode('utf-8', errors='ignore'))
+    streams = json.loads(stdout.decode('utf-8', errors='ignore') or '{}').get('streams') or [{}]
+    return int(streams[0].get('channels', 0)), int(streams[0].get('sample_rate', 0))
+
+
+class DecodedAudio:
+    """Float32 samples (frames x channels), in memory or in a spilled temp file."""
+
+    def __init__(self, samples: 'np.ndarray', sample_rate: int, spill_path: Optional[str] = None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.spill_path = spill_path
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    def close(self) -> None:
+        self.samples = None
+        if self.spill_path:
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+            self.spill_path = None
+
+
+def decode(input_path: str, channels: int, sample_rate: int, job_id: str,
+           spill_dir: Optional[str] = None, audio_sec: Optional[float] = None) -> Optional[DecodedAudio]:
+    """
+    Decode a file once to raw float32 PCM.
+
+    Args:
+        input_path: File to decode
+        channels: Channel count of the decoded stream
+        sample_rate: Sample rate of the decoded stream
+        job_id: Job ID (the decoder is tracked for cancellation)
+        spill_dir: Directory for the temp file when the audio is large
+            (default: the system temp folder)
+        audio_sec: Expected duration, for the watchdog deadline
+
+    Returns:
+        DecodedAudio, or None if the job was canceled
+
+    Raises:
+        FFmpegError: If FFmpeg failed
+        FFmpegStalled: If FFmpeg missed its watchdog deadline
+    """
+    cmd = [get_ffmpeg_path(), '-hide_banner', '-nostats', '-v', 'error', '-i', input_path,
+           '-map', '0:a:0', '-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', str(channels),
+           '-ar', str(sample_rate), 'pipe:1']
+    proc = process_manager.spawn(cmd, job_id=job_id)
+
+    stderr_chunks = []
+    drain = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    drain.start()
+
+    buffer = bytearray()
+    spill = None
+    try:
+        with watchdog.guard(proc, 'decode', audio_sec, job_id):
+            while True:
+                chunk = proc.stdout.read(_PIPE_CHUNK)
+                if not chunk:
+                    break
+                if spill is not None:
+                    spill.write(chunk)
+                    continue
+                buffer += chunk
+                if len(buffer) > DECODE_SPILL_BYTES:
+                    spill = tempfile.NamedTemporaryFile(prefix='.ban-decode-', suffix='.f32',
+                                                        dir=spill_dir, delete=False)
+                    spill.write(buffer)
+                    buffer = bytearray()
+            proc.wait()
+            if proc.returncode != 0 and not process_manager.is_canceled():
+                # Raised inside the guard so a watchdog kill is reported as a stall
+                drain.join()
+                message = b''.join(stderr_chunks).decode('utf-8', errors='ignore')
+                logger.error(f"Decode failed for {input_path}: {message.strip()}")
+                raise FFmpegError('Decoding', proc.returncode, message)
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.remove(spill.name)
+            spill = None
+        raise
+    finally:
+        drain.join()
+        process_manager.untrack(proc, job_id)
+        if spill is not None:
+            spill.close()
+
+    frame_bytes = 4 * channels
+    if process_manager.is_canceled():
+        if spill is not None:
+            os.remove(spill.name)
+        return None
+
+    if spill is None:
+        frames = len(buffer) // frame_bytes
+        samples = np.frombuffer(buffer, dtype='<f4', count=frames * channels).reshape(frames, channels)
+        return DecodedAudio(samples, sample_rate)
+
+    frames = os.path.getsize(spill.name) // frame_bytes
+    if frames == 0:
+        os.remove(spill.name)
+        return DecodedAudio(np.zeros((0, channels), dtype='<f4'), sample_rate)
+    samples = np.memmap(spill.name, dtype='<f4', mode='r+', shape=(frames, channels))
+    return DecodedAudio(samples, sample_rate, spill.name)
+
+
+def detect_silences(samples: 'np.ndarray', sample_rate: int, threshold_db: float,
+                    min_dur_sec: float, use_hpf: bool = False) -> list:
+    """
+    Silences as silencedetect reports them.
+
+    A frame is silent when every channel is below the threshold; a run
+    of silent frames at least min_dur_sec long is a silence.
+
+    Returns:
+        [start, end] pairs in seconds
+    """
+    threshold = 10.0 ** (threshold_db / 20.0)
+    frames = samples.shape[0]
+    silent = np.empty(frames, dtype=bool)
+    if use_hpf:
+        # Filtered a block at a time, each with the filter's impulse length of history
+        sections = [loudness.highpass_biquad(sample_rate)]
+        taps = int(loudness.K_WEIGHTING_IMPULSE_SEC * sample_rate)
+        for start in range(0, frames, _FILTER_BLOCK_FRAMES):
+            preroll = min(start, taps - 1)
+            block = loudness.filter_biquads(samples[start - preroll:start + _FILTER_BLOCK_FRAMES],
+                                            sections, sample_rate)[preroll:]
+            silent[start:start + block.shape[0]] = (np.abs(block) < threshold).all(axis=1)
+    else:
+        for start in range(0, frames, _BLOCK_FRAMES):
+            block = samples[start:start + _BLOCK_FRAMES]
+            silent[start:start + block.shape[0]] = (np.abs(block) < threshold).all(axis=1)
+
+    edges = np.diff(np.concatenate([[0], silent.view(np.int8), [0]]))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    min_frames = min_dur_sec * sample_rate
+    keep = (run_ends - run_starts) >= min_frames
+    return [[s / sample_rate, e / sample_rate] for s, e in zip(run_starts[keep], run_ends[keep])]
+
+
+def _sample_peak_db(samples: 'np.ndarray') -> Optional[float]:
+    peak = 0.0
+    for start in range(0, samples.shape[0], _BLOCK_FRAMES):
+        block = samples[start:start + _BLOCK_FRAMES]
+        if block.size:
+            peak = max(peak, float(np.abs(block).max()))
+    return 20.0 * np.log10(peak) if peak > 0 else None
+
+
+def _encode(samples: 'np.ndarray', gain, sample_rate: int, output_path: str,
+            codec: str, filters: Optional[str], extra_args: list, job_id: str) -> None:
+    """
+    Run one encoder FFmpeg fed with gain-adjusted float32 samples on stdin.
+
+    gain is a scalar or a callable(start, stop) returning the per-frame
+    gain of those frames. A failed or stalled encode removes its partial
+    output.
+    """
+    channels = samples.shape[1]
+    cmd = [get_ffmpeg_path(), '-hide_banner', '-nostats', '-v', 'error', '-y',
+           '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0']
+    if filters:
+        cmd += ['-af', filters]
+    cmd += extra_args + ['-acodec', codec, output_path]
+    proc = process_manager.spawn(cmd, job_id=job_id, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+
+    stderr_chunks = []
+    drain = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    drain.start()
+    try:
+        with watchdog.guard(proc, 'encode', samples.shape[0] / sample_rate, job_id):
+            try:
+                for start in range(0, samples.shape[0], _BLOCK_FRAMES):
+                    if process_manager.is_canceled():
+                        break
+                    block = samples[start:start + _BLOCK_FRAMES]
+                    if callable(gain):
+                        block = block * gain(start, start + block.shape[0])[:, np.newaxis]
+                    else:
+                        block = block * gain
+                    proc.stdin.write(block.astype('<f4').tobytes())
+            except BrokenPipeError:
+                pass
+            finally:
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+                proc.wait()
+                drain.join()
+
+            if proc.returncode != 0 and not process_manager.is_canceled():
+                raise FFmpegError('Encoding', proc.returncode,
+                                  b''.join(stderr_chunks).decode('utf-8', errors='ignore'))
+    except (FFmpegError, FFmpegStalled):
+        # Don't leave a truncated file behind for verification to count
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    finally:
+        process_manager.untrack(proc, job_id)
+
+
+def normalize_decoded(input_path: str, output_path: str, settings: Dict, job_id: str,
+                      progress_callback: Callable, log_callback: Callable,
+                      header: Optional[WavHeader], duration_sec: float, out_codec: str) -> Optional[Dict]:
+    """
+    Run normalize_file's detect, analyze and render stages on one decode.
+
+    Args:
+        input_path: Input file path
+        output_path: Output file path
+        settings: Processing settings
+        job_id: Job ID
+        progress_callback: Progress callback(job_id, phase, status, pct)
+        log_callback: Log callback(job_id, phase, message)
+        header: Parsed WAV header (None for non-WAV input)
+        duration_sec: Input duration
+        out_codec: Output codec from choose_output_codec()
+
+    Returns:
+        Same dict as normalize_file, or None if canceled
+    """
+    # Imported here: audio_processor routes files to this module
+    from .audio_processor import (trim_config, voice_region_from_silences, padded_trim,
+                                  peak_gain_db, LOUDNORM_LRA)
+
+    stage_start = time.monotonic()
+    timings = {}
+    norm_mode = settings.get('normMode', 'peak')
+
+    progress_callback(job_id, 'detect', 'start', 0)
+    channels, sample_rate = _stream_layout(input_path, header, job_id)
+    if process_manager.is_canceled():
+        return None
+    if not channels or not sample_rate:
+        raise RuntimeError("Could not determine the audio stream layout")
+    log_callback(job_id, 'detect', f"Decode-once: decoding {channels}ch {sample_rate} Hz to float32")
+
+    # Never spill into the output tree (it may be a network share)
+    spill_dir = settings.get('scratchDir') or None
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    audio = decode(input_path, channels, sample_rate, job_id, spill_dir, duration_sec)
+    if audio is None:
+        return None
+
+    try:
+        if audio.spill_path:
+            log_callback(job_id, 'detect', "Decode-once: decoded audio spilled to a temporary file")
+        decoded_sec = audio.frames / sample_rate
+        duration_sec = decoded_sec or duration_sec
+        seek_start, seek_end = 0, duration_sec
+
+        if settings.get('autoTrim', False):
+            min_file_ms = settings.get('trimMinFileMs', 800)
+            if duration_sec * 1000 >= min_file_ms:
+                threshold_db, min_dur_sec, use_hpf, _ = trim_config(settings)
+                silences = detect_silences(audio.samples, sample_rate, threshold_db, min_dur_sec, use_hpf)
+                region = voice_region_from_silences(silences, duration_sec)
+                if region:
+                    seek_start, seek_end = padded_trim(region, duration_sec, settings)
+                    log_callback(job_id, 'trim', f"Trim applied: start={seek_start:.3f}s end={seek_end:.3f}s")
+                else:
+                    log_callback(job_id, 'trim', "No trimming applied: could not detect non-silent region")
+            else:
+                log_callback(job_id, 'trim', f"No trimming applied: file shorter than minimum {min_file_ms}ms")
+
+        progress_callback(job_id, 'detect', 'done', 100)
+        timings['detect'] = time.monotonic() - stage_start
+        stage_start = time.monotonic()
+        if process_manager.is_canceled():
+            return None
+
+        # Analysis on the trimmed span
+        progress_callback(job_id, 'analyze', 'start', 0)
+        span = audio.samples[int(round(seek_start * sample_rate)):int(round(seek_end * sample_rate))]
+        measured_max_volume = None
+        measured = None
+        if norm_mode == 'lufs':
+            measured = loudness.measure_blocks(span, sample_rate)
+        else:
+            measured_max_volume = _sample_peak_db(span)
+        progress_callback(job_id, 'analyze', 'done', 100)
+        timings['analyze'] = time.monotonic() - stage_start
+        stage_start = time.monotonic()
+        if process_manager.is_canceled():
+            return None
+
+        # Render: one encoder fed from memory
+        progress_callback(job_id, 'render', 'start', 0)
+        filters = None
+        extra_args = []
+        lufs_render = None
+        gain = 1.0
+        gain_db = None
+        if norm_mode == 'lufs':
+            target_lufs = settings.get('lufsTarget', -16)
+            target_tp = settings.get('tpMargin', -1.0)
+            limiter = settings.get('limiterLimit', 0.97)
+            if measured['measured_I'] is not None and measured['measured_LRA'] <= LOUDNORM_LRA:
+                # Constant gain plus true-peak limiting, all in-process
+                gain_db = float(target_lufs) - measured['measured_I']
+                amp = 10.0 ** (gain_db / 20.0)
+                ceiling = min(float(limiter), 10.0 ** (float(target_tp) / 20.0)) * \
+                    10.0 ** (-loudness.LIMITER_SAFETY_DB / 20.0)
+                # Computed per encoder block from the span around it
+                gain = partial(loudness.limiter_gain_block, span, amp, ceiling, sample_rate)
+                lufs_render = 'linear'
+                log_callback(job_id, 'render', f"LUFS linear gain (decode-once): {gain_db:+.2f} dB")
+            else:
+                filters = f"loudnorm=I={target_lufs}:TP={target_tp}:LRA={LOUDNORM_LRA}:print_format=summary"
+                extra_args = ['-ar', str(sample_rate)]
+                lufs_render = 'dynamic'
+                log_callback(job_id, 'render', "LUFS dynamic loudnorm (decode-once) on the decoded samples")
+        else:
+            gain_db = peak_gain_db(measured_max_volume, settings)
+            gain = 10.0 ** (gain_db / 20.0)
+            log_callback(job_id, 'analyze',
+                         f"Peak mode: measuredMax={f'{measured_max_volume:.1f}' if measured_max_volume is not None else 'n/a'} dB, "
+                         f"target={settings.get('peakTargetDb', -2)} dB, gain={gain_db:.2f} dB, "
+                         f"onlyBoost={settings.get('peakOnlyBoost', True)}")
+
+        _encode(span, gain, sample_rate, output_path, out_codec, filters, extra_args, job_id)
+        if process_manager.is_canceled():
+            return None
+    finally:
+        audio.close()
+
+    progress_callback(job_id, 'render', 'done', 100)
+    timings['render'] = time.monotonic() - stage_start
+    log_callback(job_id, 'render', f"Completed: {output_path}")
+
+    return {
+        'durationSec': duration_sec,
+        'codec': out_codec,
+        'trimStart': seek_start,
+        'trimEnd': seek_end,
+        'measuredMaxVolume': measured_max_volume,
+        'measuredI': measured['measured_I'] if measured else None,
+        'measuredTP': measured['measured_TP'] if measured else None,
+        'measuredLRA': measured['measured_LRA'] if measured else None,
+        'gainDb': gain_db,
+        'lufsRender': lufs_render,
+        'timings': timings
+    }
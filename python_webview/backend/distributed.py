@@ -0,0 +1,481 @@
+"""
+Coordinator/worker mode for dynamic load balancing across processes or hosts.
+
+The coordinator owns the file queue (from scan_files) and leases one file
+at a time to each worker over a TCP or Unix socket. Workers run the usual
+per-file unit (process_file -> normalize_file) and send heartbeats while
+rendering. A lease that is not renewed within the lease timeout, or whose
+worker disconnects, is put back at the front of the queue and handed to
+another worker, up to max_attempts times (canceled and failed results
+count as attempts too).
+
+Files are named by their relative path with forward slashes (see
+sharding.shard_key), so workers on other platforms resolve them under
+their own input root. Workers render into a private hidden folder in the
+output tree and move a file into place only once the coordinator has
+accepted its result, so a late result from an expired lease never
+overwrites the output of the worker the file was handed to next. A file
+counts as done only when the worker reports the move; a failed move is
+retried like a failed render.
+
+Protocol: one JSON object per line in both directions.
+
+    worker -> coordinator           coordinator -> worker
+    {"type": "hello", "worker"}     {"type": "welcome", "input", "output", "settings"}
+    {"type": "request"}             {"type": "work", "id", "rel"} | {"type": "wait", "retry"}
+                                    | {"type": "done"}
+    {"type": "heartbeat", "id"}     (no reply)
+    {"type": "result", "id", "result"}  {"type": "ack", "accepted"}
+    {"type": "moved", "id", "error"}    (no reply; sent after an accepted ok result)
+
+A message the coordinator cannot parse, or one missing its item id, ends
+the connection and puts the worker's leases back on the queue.
+
+Addresses are "HOST:PORT" for TCP or "unix:/path/to.sock" for a Unix socket.
+"""
+import os
+import json
+import time
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+import socketserver
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from .batch import process_file, output_path_for
+from .sharding import shard_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_TIMEOUT = 60.0
+DEFAULT_HEARTBEAT_INTERVAL = 5.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """
+    Parse "HOST:PORT" or "unix:/path" into (socket family, address).
+
+    Raises:
+        ValueError: If the address is malformed
+    """
+    if address.startswith('unix:'):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("Unix sockets are not supported on this platform")
+        path = address[len('unix:'):]
+        if not path:
+            raise ValueError(f"Missing socket path in {address!r}")
+        return socket.AF_UNIX, path
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"Address must be HOST:PORT or unix:/path, got {address!r}")
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def send_message(sock: socket.socket, message: Dict) -> None:
+    """Send one JSON line."""
+    sock.sendall((json.dumps(message, default=str) + '\n').encode('utf-8'))
+
+
+class Coordinator:
+    """
+    Work queue with leases. All methods are thread-safe.
+
+    Args:
+        files: Files to process (under input_root)
+        input_root: Input directory
+        output_root: Output directory
+        settings: Processing settings sent to every worker
+        emit: Event callback(event, data)
+        lease_timeout: Seconds without a heartbeat before a lease expires
+        max_attempts: Dispatch attempts per file before giving up on it
+    """
+
+    def __init__(self, files: List[str], input_root: str, output_root: str, settings: Dict,
+                 emit: Callable, lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.input_root = input_root
+        self.output_root = output_root
+        self.settings = settings
+        self.emit = emit
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+
+        self.items = {i: shard_key(f, input_root) for i, f in enumerate(files)}
+        self.queue = deque(self.items)
+        self.attempts = {i: 0 for i in self.items}
+        self.leases = {}  # item id -> (worker, deadline)
+        self.results = {}  # item id -> result dict
+        self.pending = {}  # item id -> accepted ok result waiting for its move
+        self.failed = {}  # item id -> reason
+        self.workers = set()
+        self.lock = threading.Lock()
+        self.finished_event = threading.Event()
+        if not self.items:
+            self.finished_event.set()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_event.is_set()
+
+    def welcome(self) -> Dict:
+        return {
+            'type': 'welcome',
+            'input': self.input_root,
+            'output': self.output_root,
+            'settings': self.settings
+        }
+
+    def register(self, worker: str) -> None:
+        with self.lock:
+            self.workers.add(worker)
+        self.emit('workerJoined', {'worker': worker})
+
+    def next_item(self, worker: str) -> Dict:
+        """Lease the next file to a worker."""
+        with self.lock:
+            if self.queue:
+                item_id = self.queue.popleft()
+                self.attempts[item_id] += 1
+                self.leases[item_id] = (worker, time.monotonic() + self.lease_timeout)
+                rel = self.items[item_id]
+            elif self.leases:
+                # Nothing queued, but leased work may still come back
+                return {'type': 'wait', 'retry': min(5.0, self.lease_timeout / 4)}
+            else:
+                return {'type': 'done'}
+        self.emit('fileStart', {'fileId': item_id, 'name': rel, 'worker': worker,
+                                'attempt': self.attempts[item_id]})
+        return {'type': 'work', 'id': item_id, 'rel': rel}
+
+    def heartbeat(self, worker: str, item_id: int) -> None:
+        with self.lock:
+            lease = self.leases.get(item_id)
+            if lease and lease[0] == worker:
+                self.leases[item_id] = (worker, time.monotonic() + self.lease_timeout)
+
+    def complete(self, worker: str, item_id: int, result: Dict) -> bool:
+        """
+        Record a result; returns False for stale results from an expired lease.
+
+        An ok result keeps its lease until the worker reports the move of
+        the output into place (see moved()).
+        """
+        with self.lock:
+            lease = self.leases.get(item_id)
+            if not lease or lease[0] != worker:
+                return False
+            if result.get('ok'):
+                self.pending[item_id] = result
+                self.leases[item_id] = (worker, time.monotonic() + self.lease_timeout)
+                return True
+            event = self._settle(item_id, result)
+        self.emit(event, {'fileId': item_id, 'worker': worker, 'result': result})
+        return True
+
+    def moved(self, worker: str, item_id: int, error: Optional[str] = None) -> bool:
+        """Finish an accepted result once its output is in place, or retry it if the move failed."""
+        with self.lock:
+            lease = self.leases.get(item_id)
+            if not lease or lease[0] != worker or item_id not in self.pending:
+                return False
+            result = self.pending.pop(item_id)
+            if error:
+                result = dict(result, ok=False, error=f"Could not move output into place: {error}")
+            event = self._settle(item_id, result)
+        self.emit(event, {'fileId': item_id, 'worker': worker, 'result': result})
+        return True
+
+    def _settle(self, item_id: int, result: Dict) -> str:
+        # Caller holds self.lock; returns the event to emit
+        del self.leases[item_id]
+        if result.get('ok'):
+            self.results[item_id] = result
+            event = 'fileDone'
+        elif self.attempts[item_id] < self.max_attempts:
+            self.queue.appendleft(item_id)
+            event = 'requeued'
+        else:
+            self.failed[item_id] = result.get('error') or 'failed'
+            event = 'fileFailed'
+        self._check_finished()
+        return event
+
+    def worker_left(self, worker: str) -> None:
+        """Re-dispatch everything a disconnected worker was still holding."""
+        with self.lock:
+            self.workers.discard(worker)
+            lost = [i for i, (w, _) in self.leases.items() if w == worker]
+            for item_id in lost:
+                self._release(item_id, 'worker disconnected')
+        self.emit('workerLeft', {'worker': worker, 'requeued': lost})
+
+    def reap_expired(self) -> None:
+        """Re-dispatch leases whose worker stopped sending heartbeats."""
+        now = time.monotonic()
+        with self.lock:
+            expired = [(i, w) for i, (w, deadline) in self.leases.items() if deadline < now]
+            for item_id, _ in expired:
+                self._release(item_id, 'lease expired')
+        for item_id, worker in expired:
+            self.emit('leaseExpired', {'fileId': item_id, 'worker': worker})
+
+    def _release(self, item_id: int, reason: str) -> None:
+        # Caller holds self.lock
+        del self.leases[item_id]
+        self.pending.pop(item_id, None)
+        if self.attempts[item_id] < self.max_attempts:
+            self.queue.appendleft(item_id)
+        else:
+            self.failed[item_id] = reason
+        self._check_finished()
+
+    def _check_finished(self) -> None:
+        # Caller holds self.lock
+        if not self.queue and not self.leases:
+            self.finished_event.set()
+
+    def summary(self) -> Dict:
+        with self.lock:
+            return {
+                'total': len(self.items),
+                'completed': len(self.results),
+                'failed': len(self.failed),
+                'failures': {self.items[i]: reason for i, reason in self.failed.items()}
+            }
+
+
+def _item_id(message: Dict) -> Optional[int]:
+    """The integer item id of a message, or None if it is missing or malformed."""
+    item_id = message.get('id')
+    if isinstance(item_id, bool) or not isinstance(item_id, int):
+        return None
+    return item_id
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    """Serves one worker connection."""
+
+    def handle(self):
+        coordinator: Coordinator = self.server.coordinator
+        worker = None
+        try:
+            for line in self.rfile:
+                message = json.loads(line.decode('utf-8'))
+                if not isinstance(message, dict):
+                    logger.warning(f"Dropping worker {worker}: message is not an object")
+                    break
+                kind = message.get('type')
+                item_id = _item_id(message)
+                if kind in ('heartbeat', 'result', 'moved') and item_id is None:
+                    logger.warning(f"Dropping worker {worker}: {kind} message without a valid id")
+                    break
+                if kind == 'hello':
+                    worker = str(message.get('worker') or self.client_address)
+                    coordinator.register(worker)
+                    send_message(self.connection, coordinator.welcome())
+                elif worker is None:
+                    break
+                elif kind == 'request':
+                    send_message(self.connection, coordinator.next_item(worker))
+                elif kind == 'heartbeat':
+                    coordinator.heartbeat(worker, item_id)
+                elif kind == 'result':
+                    result = message.get('result')
+                    accepted = coordinator.complete(worker, item_id, result if isinstance(result, dict) else {})
+                    send_message(self.connection, {'type': 'ack', 'accepted': accepted})
+                elif kind == 'moved':
+                    coordinator.moved(worker, item_id, message.get('error'))
+                else:
+                    logger.warning(f"Ignoring unknown message type from worker {worker}: {kind!r}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Worker connection error ({worker}): {e}")
+        finally:
+            if worker is not None:
+                coordinator.worker_left(worker)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+def serve_coordinator(coordinator: Coordinator, address: str,
+                      shutdown_grace: float = 10.0) -> Dict:
+    """
+    Serve work to workers until every file is done or failed.
+
+    Args:
+        coordinator: Coordinator holding the queue
+        address: "HOST:PORT" or "unix:/path"
+        shutdown_grace: Seconds to keep answering "done" to idle workers
+            once the queue is drained
+
+    Returns:
+        Coordinator summary dict
+    """
+    family, addr = parse_address(address)
+    if family == socket.AF_INET:
+        server = _TCPServer(addr, _CoordinatorHandler)
+    else:
+        if os.path.exists(addr):
+            os.unlink(addr)
+        server = _UnixServer(addr, _CoordinatorHandler)
+    server.coordinator = coordinator
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    coordinator.emit('listening', {'address': address, 'total': len(coordinator.items)})
+
+    try:
+        while not coordinator.finished_event.wait(1.0):
+            coordinator.reap_expired()
+
+        # Let connected workers pick up their "done" reply and disconnect
+        deadline = time.monotonic() + shutdown_grace
+        while coordinator.workers and time.monotonic() < deadline:
+            time.sleep(0.2)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if family != socket.AF_INET and os.path.exists(addr):
+            os.unlink(addr)
+
+    return coordinator.summary()
+
+
+def connect(address: str, timeout: float = 30.0) -> socket.socket:
+    """Connect to a coordinator, retrying until it is up or timeout expires."""
+    family, addr = parse_address(address)
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(addr)
+            return sock
+        except OSError:
+            sock.close()
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+
+
+def run_worker(address: str, input_root: Optional[str] = None, output_root: Optional[str] = None,
+               heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+               emit: Optional[Callable] = None, connect_timeout: float = 30.0) -> Dict:
+    """
+    Process files leased by a coordinator until it reports no more work.
+
+    Args:
+        address: Coordinator address ("HOST:PORT" or "unix:/path")
+        input_root: Local path of the input tree (default: the coordinator's)
+        output_root: Local path of the output tree (default: the coordinator's)
+        heartbeat_interval: Seconds between lease heartbeats
+        emit: Optional event callback(event, data)
+        connect_timeout: Seconds to keep retrying the initial connection
+
+    Returns:
+        Dict with processed and failed counts
+    """
+    emit = emit or (lambda event, data: None)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    sock = connect(address, connect_timeout)
+    reader = sock.makefile('rb')
+    send_lock = threading.Lock()
+    counts = {'processed': 0, 'failed': 0}
+    render_root = None
+
+    def send(message):
+        with send_lock:
+            send_message(sock, message)
+
+    def receive():
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Coordinator closed the connection")
+        return json.loads(line.decode('utf-8'))
+
+    try:
+        send({'type': 'hello', 'worker': worker})
+        welcome = receive()
+        input_root = input_root or welcome['input']
+        output_root = output_root or welcome['output']
+        settings = welcome.get('settings') or {}
+        emit('workerStarted', {'worker': worker, 'input': input_root, 'output': output_root})
+        # On the output filesystem, so accepted files are renamed into place
+        os.makedirs(output_root, exist_ok=True)
+        render_root = tempfile.mkdtemp(prefix='.ban-worker-', dir=output_root)
+
+        while True:
+            send({'type': 'request'})
+            reply = receive()
+            if reply['type'] == 'done':
+                break
+            if reply['type'] == 'wait':
+                time.sleep(reply.get('retry', 1.0))
+                continue
+
+            item_id = reply['id']
+            file_path = os.path.join(input_root, *reply['rel'].split('/'))
+            stop_heartbeat = threading.Event()
+
+            def heartbeat():
+                while not stop_heartbeat.wait(heartbeat_interval):
+                    try:
+                        send({'type': 'heartbeat', 'id': item_id})
+                    except OSError:
+                        return
+
+            beat = threading.Thread(target=heartbeat, daemon=True)
+            beat.start()
+            try:
+                result = process_file(file_path, input_root, render_root, settings,
+                                      f"w{item_id}")
+            finally:
+                stop_heartbeat.set()
+                beat.join()
+
+            rendered = result.output_path
+            result.output_path = output_path_for(file_path, input_root, output_root)
+            send({'type': 'result', 'id': item_id, 'result': result.to_dict()})
+            ack = receive()
+            if result.ok and ack.get('accepted', False):
+                try:
+                    os.makedirs(os.path.dirname(result.output_path), exist_ok=True)
+                    os.replace(rendered, result.output_path)
+                except OSError as e:
+                    logger.error(f"Could not move {rendered} to {result.output_path}: {e}")
+                    result.error = str(e)
+                send({'type': 'moved', 'id': item_id, 'error': None if result.ok else result.error})
+                if not result.ok:
+                    try:
+                        os.remove(rendered)
+                    except OSError:
+                        pass
+            else:
+                # Failed, or the lease expired and the file went to another worker
+                try:
+                    os.remove(rendered)
+                except OSError:
+                    pass
+            if result.ok:
+                counts['processed'] += 1
+            else:
+                counts['failed'] += 1
+            emit('fileDone', {'fileId': item_id, 'rel': reply['rel'], 'ok': result.ok,
+                              'accepted': ack.get('accepted', False), 'error': result.error})
+    finally:
+        reader.close()
+        sock.close()
+        if render_root is not None:
+            shutil.rmtree(render_root, ignore_errors=True)
+
+    return counts
@@ -0,0 +1,160 @@
+"""
+Failure classification and retry queue for batch runs.
+
+A file that fails no longer stops the batch. run_batch() classifies the
+error and either gives up on the file or puts it on a side queue to be
+retried after an exponential backoff:
+
+- corrupt: FFmpeg could not read the input (retrying will not help)
+- transient: I/O errors that may clear up (flaky network shares, busy devices)
+- killed: FFmpeg was killed by a signal or a timeout
+- stalled: FFmpeg missed its watchdog deadline and was killed (see watchdog)
+- error: anything else (not retried)
+
+Retries are started between regular units once their backoff has passed,
+so a file waiting for its next attempt never holds up the files behind it.
+"""
+import errno
+import heapq
+import time
+import asyncio
+import itertools
+import subprocess
+from typing import Dict, List, Optional
+
+FAILURE_CORRUPT = 'corrupt'
+FAILURE_TRANSIENT = 'transient'
+FAILURE_KILLED = 'killed'
+FAILURE_STALLED = 'stalled'
+FAILURE_ERROR = 'error'
+RETRYABLE_FAILURES = (FAILURE_TRANSIENT, FAILURE_KILLED, FAILURE_STALLED)
+
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF_SEC = 2.0
+MAX_RETRY_BACKOFF_SEC = 60.0
+# Files waiting for a retry at once; beyond this, failures are final
+RETRY_QUEUE_LIMIT = 256
+
+_TRANSIENT_ERRNOS = {
+    getattr(errno, name) for name in
+    ('EIO', 'EAGAIN', 'EBUSY', 'EINTR', 'ETIMEDOUT', 'ESTALE', 'ECONNRESET', 'ECONNABORTED',
+     'EHOSTDOWN', 'EHOSTUNREACH', 'ENETDOWN', 'ENETUNREACH', 'ENOLCK')
+    if hasattr(errno, name)
+}
+
+# Lower-case FFmpeg stderr fragments
+_TRANSIENT_MESSAGES = ('input/output error', 'resource temporarily unavailable', 'connection timed out',
+                       'stale file handle', 'device or resource busy', 'connection reset')
+_CORRUPT_MESSAGES = ('invalid data found when processing input', 'could not find codec parameters',
+                     'error while decoding', 'invalid riff header', 'unknown format',
+                     'header missing')
+
+
+class FFmpegError(RuntimeError):
+    """An FFmpeg process exited with a nonzero return code."""
+
+    def __init__(self, stage: str, returncode: int, stderr_text: str = ''):
+        lines = stderr_text.strip().splitlines()
+        tail = lines[-1] if lines else 'unknown error'
+        super().__init__(f"{stage} failed (FFmpeg exit code {returncode}): {tail}")
+        self.returncode = returncode
+        self.stderr_text = stderr_text
+
+
+class FFmpegStalled(TimeoutError):
+    """An FFmpeg process missed its watchdog deadline and was killed."""
+
+    def __init__(self, stage: str, timeout_sec: float):
+        super().__init__(f"{stage} stalled: FFmpeg killed after {timeout_sec:.0f}s")
+        self.stage = stage
+        self.timeout_sec = timeout_sec
+
+
+def classify_failure(error: BaseException) -> str:
+    """
+    Classify a per-file error.
+
+    Returns:
+        FAILURE_CORRUPT, FAILURE_TRANSIENT, FAILURE_KILLED, FAILURE_STALLED
+        or FAILURE_ERROR
+    """
+    if isinstance(error, FFmpegStalled):
+        return FAILURE_STALLED
+    if isinstance(error, (subprocess.TimeoutExpired, asyncio.TimeoutError, TimeoutError)):
+        return FAILURE_KILLED
+    if isinstance(error, FFmpegError):
+        if error.returncode < 0:
+            # Negative return codes are signals on POSIX
+            return FAILURE_KILLED
+        text = error.stderr_text.lower()
+        if any(message in text for message in _TRANSIENT_MESSAGES):
+            return FAILURE_TRANSIENT
+        if any(message in text for message in _CORRUPT_MESSAGES):
+            return FAILURE_CORRUPT
+        return FAILURE_ERROR
+    if isinstance(error, OSError) and error.errno in _TRANSIENT_ERRNOS:
+        return FAILURE_TRANSIENT
+    return FAILURE_ERROR
+
+
+class RetryQueue:
+    """
+    Files waiting for another attempt, released once their backoff has passed.
+
+    The n-th retry of a file waits backoff_sec * 2**(n-1) seconds (capped
+    at MAX_RETRY_BACKOFF_SEC).
+    """
+
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_sec: float = DEFAULT_RETRY_BACKOFF_SEC, limit: int = RETRY_QUEUE_LIMIT):
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_sec = max(0.0, float(backoff_sec))
+        self.limit = limit
+        self._heap = []
+        self._order = itertools.count()
+        self._retries: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def attempts(self, item: str) -> int:
+        """Attempts made or scheduled for an item so far (1 + retries)."""
+        return 1 + self._retries.get(item, 0)
+
+    def offer(self, item: str, failure: str) -> Optional[float]:
+        """
+        Queue a failed item for a retry if its failure is retryable and it
+        has retries left.
+
+        Returns:
+            Backoff delay in seconds, or None if the failure is final
+        """
+        if failure not in RETRYABLE_FAILURES or len(self._heap) >= self.limit:
+            return None
+        retries = self._retries.get(item, 0) + 1
+        if retries > self.max_retries:
+            return None
+        self._retries[item] = retries
+        delay = min(MAX_RETRY_BACKOFF_SEC, self.backoff_sec * 2 ** (retries - 1))
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), item))
+        return delay
+
+    def pop_due(self) -> Optional[str]:
+        """The next item whose backoff has passed, or None."""
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def wait_sec(self, limit: float = 0.5) -> float:
+        """Seconds until the next item is due, capped at `limit`."""
+        if not self._heap:
+            return limit
+        return max(0.0, min(limit, self._heap[0][0] - time.monotonic()))
+
+
+def failure_report(failures: List[Dict]) -> Dict:
+    """Summarize final failures: count per class plus the per-file entries."""
+    by_class = {}
+    for entry in failures:
+        by_class[entry['failure']] = by_class.get(entry['failure'], 0) + 1
+    return {'count': len(failures), 'byClass': by_class, 'files': failures}
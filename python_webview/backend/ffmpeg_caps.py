@@ -0,0 +1,168 @@
+"""
+One-time FFmpeg capability probe.
+
+Runs `ffmpeg -version`, `-filters` and `-encoders` once, and caches the
+result on disk keyed by binary path, size and mtime, so later runs (and
+every file in a batch) can check for a filter or encoder with a dict
+lookup instead of a spawn. If the probe fails, every capability is
+reported as available and FFmpeg's own errors surface as before. A
+failed probe is not cached: a missing binary is looked up again on the
+next call, and a binary whose probe failed is probed again once it
+changes (see ffmpeg_paths.reset_toolchain_cache).
+"""
+import os
+import re
+import json
+import logging
+import threading
+from typing import Dict, Optional
+
+from .ffmpeg_paths import get_ffmpeg_path, get_cache_dir
+from .process_manager import process_manager
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = 'ffmpeg_caps.json'
+PROBE_TIMEOUT = 20
+
+_lock = threading.Lock()
+_capabilities = None
+_probed = False
+# Cache key of a binary whose probe failed, so it is not re-probed for every file
+_failed_key = None
+
+
+def _run(ffmpeg: str, flag: str) -> str:
+    proc = process_manager.spawn([ffmpeg, '-hide_banner', flag])
+    stdout, _ = proc.communicate(timeout=PROBE_TIMEOUT)
+    return stdout.decode('utf-8', errors='ignore')
+
+
+def _parse_table(text: str, flag_width: int) -> Dict[str, str]:
+    """Parse `-filters`/`-encoders` output into {name: flags}."""
+    entries = {}
+    for line in text.splitlines():
+        parts = line.split()
+        # Skip the title, legend ("T.. = Timeline support") and separator lines
+        if len(parts) >= 2 and parts[1] != '=' and len(parts[0]) == flag_width:
+            entries[parts[1]] = parts[0]
+    return entries
+
+
+def probe_capabilities(ffmpeg: str) -> Dict:
+    """
+    Probe an FFmpeg binary (always spawns; see get_capabilities for the cached form).
+
+    Returns:
+        Dict with path, version, filters (list) and encoders (list)
+    """
+    version_text = _run(ffmpeg, '-version')
+    match = re.search(r'ffmpeg version (\S+)', version_text)
+    filters = _parse_table(_run(ffmpeg, '-filters'), 3)
+    encoders = _parse_table(_run(ffmpeg, '-encoders'), 6)
+    return {
+        'path': ffmpeg,
+        'version': match.group(1) if match else 'unknown',
+        'filters': sorted(filters),
+        'encoders': sorted(name for name, flags in encoders.items() if flags.startswith('A'))
+    }
+
+
+def _cache_key(ffmpeg: str) -> Optional[str]:
+    try:
+        st = os.stat(ffmpeg)
+    except OSError:
+        return None
+    return f"{os.path.realpath(ffmpeg)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def _load_disk_cache() -> Dict:
+    try:
+        with open(get_cache_dir() / CACHE_FILE_NAME, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_disk_cache(key: str, caps: Dict) -> None:
+    try:
+        path = get_cache_dir() / CACHE_FILE_NAME
+        data = _load_disk_cache()
+        # One entry per binary: drop entries for older builds at the same path
+        prefix = key.split('|', 1)[0] + '|'
+        data = {k: v for k, v in data.items() if not k.startswith(prefix)}
+        data[key] = caps
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Could not write FFmpeg capability cache: {e}")
+
+
+def get_capabilities() -> Optional[Dict]:
+    """
+    Get the capabilities of the resolved ffmpeg binary.
+
+    Probed at most once per process and once per binary build on disk.
+
+    Returns:
+        Capability dict (see probe_capabilities), or None if ffmpeg is
+        missing or could not be probed
+    """
+    global _capabilities, _probed, _failed_key
+    with _lock:
+        if _probed:
+            return _capabilities
+
+        try:
+            ffmpeg = get_ffmpeg_path()
+        except RuntimeError:
+            return None
+
+        key = _cache_key(ffmpeg)
+        if key:
+            if key == _failed_key:
+                return None
+            cached = _load_disk_cache().get(key)
+            if cached:
+                _capabilities = cached
+                _probed = True
+                return _capabilities
+
+        try:
+            caps = probe_capabilities(ffmpeg)
+        except Exception as e:
+            logger.warning(f"FFmpeg capability probe failed: {e}")
+            _failed_key = key
+            return None
+        _capabilities = caps
+        _probed = True
+
+        logger.info(f"FFmpeg {_capabilities['version']}: {len(_capabilities['filters'])} filters, "
+                    f"{len(_capabilities['encoders'])} audio encoders")
+        if key:
+            _save_disk_cache(key, _capabilities)
+        return _capabilities
+
+
+def has_filter(name: str) -> bool:
+    """True if ffmpeg provides the filter (or capabilities are unknown)."""
+    caps = get_capabilities()
+    return caps is None or name in caps['filters']
+
+
+def has_encoder(name: str) -> bool:
+    """True if ffmpeg provides the audio encoder (or capabilities are unknown)."""
+    caps = get_capabilities()
+    return caps is None or name in caps['encoders']
+
+
+def reset_capabilities() -> None:
+    """Forget the in-process probe result (the disk cache is left alone)."""
+    global _capabilities, _probed, _failed_key
+    with _lock:
+        _capabilities = None
+        _probed = False
+        _failed_key = None
@@ -6,11 +6,14 @@ Tries to find FFmpeg and FFprobe from:
 2. PyInstaller bundle (_MEIPASS temporary directory)
 3. npm ffmpeg-static/ffprobe-static packages (from Electron version)
 4. System PATH
+
+Resolution runs once per process; the result is cached for every later call.
 """
 import os
 import sys
 import shutil
 import platform
+import functools
 from pathlib import Path
 import logging
 
@@ -34,6 +37,27 @@ def get_base_path():
         return Path(__file__).parent.parent
 
 
+def get_cache_dir() -> Path:
+    """
+    Get the per-user cache directory for the application (created on demand).
+    
+    - Windows: %LOCALAPPDATA%\\BulkAudioNormalizer
+    - macOS: ~/Library/Caches/BulkAudioNormalizer
+    - Linux: $XDG_CACHE_HOME/bulk_audio_normalizer (default ~/.cache)
+    """
+    system = platform.system()
+    if system == 'Windows':
+        base = Path(os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local')
+        cache_dir = base / 'BulkAudioNormalizer'
+    elif system == 'Darwin':
+        cache_dir = Path.home() / 'Library' / 'Caches' / 'BulkAudioNormalizer'
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+        cache_dir = base / 'bulk_audio_normalizer'
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
 def find_local_ffmpeg() -> str:
     """
     Find ffmpeg binary in local bin directory.
@@ -187,9 +211,10 @@ def find_npm_ffprobe() -> str:
     return None
 
 
+@functools.lru_cache(maxsize=None)
 def get_ffmpeg_path() -> str:
     """
-    Get ffmpeg binary path.
+    Get ffmpeg binary path (resolved once per process).
     
     Returns:
         Path to ffmpeg binary
@@ -221,9 +246,10 @@ def get_ffmpeg_path() -> str:
     )
 
 
+@functools.lru_cache(maxsize=None)
 def get_ffprobe_path() -> str:
     """
-    Get ffprobe binary path.
+    Get ffprobe binary path (resolved once per process).
     
     Returns:
         Path to ffprobe binary
@@ -253,3 +279,15 @@ def get_ffprobe_path() -> str:
         "ffprobe not found. Please run 'python3 python_webview/setup_ffmpeg.py' "
         "or install ffmpeg on your system."
     )
+
+
+def reset_toolchain_cache() -> None:
+    """
+    Forget resolved binary paths and their capability probe (e.g. after
+    setup_ffmpeg.py installs new ones).
+    """
+    # Imported here: ffmpeg_caps imports this module
+    from .ffmpeg_caps import reset_capabilities
+    get_ffmpeg_path.cache_clear()
+    get_ffprobe_path.cache_clear()
+    reset_capabilities()
@@ -0,0 +1,446 @@
+"""
+In-process LUFS measurement and render engine (NumPy).
+
+For short PCM/float WAV files, LUFS mode can run without any FFmpeg
+subprocess: the samples are read from the memory-mapped data chunk, measured
+per ITU-R BS.1770 / EBU R128 (integrated loudness, loudness range and
+true peak), scaled by the constant gain that hits the target, passed
+through a lookahead true-peak limiter and written in the output codec.
+
+Everything is vectorized:
+- K-weighting is applied in the frequency domain (FFT overlap-add)
+- gating blocks come from cumulative sums of squared samples
+- true peak uses a 4x polyphase interpolator (np.convolve per phase)
+- the limiter's lookahead minimum and gain smoothing use block-wise
+  cumulative minima (van Herk/Gil-Werman) and cumulative sums
+
+measure_blocks() and limiter_gain_block() give the same results one
+block at a time, for long signals that must stay memory-mapped (see
+decode_once).
+
+NumPy is optional: without it (or for files the engine does not handle)
+normalize_file uses the FFmpeg path as before.
+"""
+import logging
+from typing import Dict, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from .wav_header import WavHeader, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+
+if np is not None:
+    from .wav_reader import WavReader
+    from .wav_writer import CODEC_FORMATS, write_wav
+
+logger = logging.getLogger(__name__)
+
+HAVE_NUMPY = np is not None
+
+# Files longer than this go through FFmpeg (the engine holds the file in memory)
+IN_PROCESS_MAX_SECONDS = 300
+
+# K-weighting impulse response length (the 38 Hz high-pass has decayed by then)
+K_WEIGHTING_IMPULSE_SEC = 0.25
+
+# BS.1770 gating
+BLOCK_SEC = 0.4
+BLOCK_STEP_SEC = 0.1
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# EBU Tech 3342 loudness range
+SHORT_TERM_SEC = 3.0
+LRA_RELATIVE_GATE = -20.0
+
+# True-peak interpolation. The limiter clamps exactly the points the
+# interpolator sees, so it needs more taps than a measurement-only meter
+OVERSAMPLE = 4
+_INTERP_TAPS = 128
+
+# Limiter timing: gain ramps over the lookahead and is held for the release
+LIMITER_LOOKAHEAD_MS = 5.0
+LIMITER_RELEASE_MS = 40.0
+# Headroom under the ceiling for interpolation between gain steps
+LIMITER_SAFETY_DB = 0.1
+
+# Frames converted to float64 at a time by the block-wise functions
+STREAM_BLOCK_FRAMES = 1 << 20
+
+
+def _db_to_amp(db: float) -> float:
+    return 10.0 ** (db / 20.0)
+
+
+def _amp_to_db(amp: float) -> float:
+    return float(20.0 * np.log10(amp)) if amp > 0 else float('-inf')
+
+
+def read_samples(path: str, header: WavHeader, start_sec: float = 0.0,
+                 end_sec: Optional[float] = None) -> Optional['np.ndarray']:
+    """
+    Read a span of a PCM/float WAV file as float64 (frames x channels).
+
+    Returns:
+        Array scaled to -1..1, or None if the sample format is unsupported
+    """
+    try:
+        reader = WavReader(path, header)
+    except ValueError:
+        return None
+    with reader:
+        return reader.read_time(start_sec, end_sec, dtype=np.float64)
+
+
+def _biquad_response(b, a, n_fft: int) -> 'np.ndarray':
+    """Complex frequency response of a biquad on the rfft bins of n_fft."""
+    z1 = np.exp(-2j * np.pi * np.fft.rfftfreq(n_fft))
+    z2 = z1 * z1
+    return (b[0] + b[1] * z1 + b[2] * z2) / (a[0] + a[1] * z1 + a[2] * z2)
+
+
+def _k_weighting_coefficients(sample_rate: int):
+    """BS.1770 pre-filter (high shelf) and RLB high-pass for any sample rate."""
+    # High shelf, re-derived for the sample rate as in libebur128
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10.0 ** (gain / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1.0 + k / q + k * k
+    hp_b = [1.0, -2.0, 1.0]
+    hp_a = [1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+    return (shelf_b, shelf_a), (hp_b, hp_a)
+
+
+def filter_biquads(samples: 'np.ndarray', sections, sample_rate: int,
+                   impulse_sec: float = K_WEIGHTING_IMPULSE_SEC) -> 'np.ndarray':
+    """
+    Apply a cascade of biquads ((b, a) pairs) to frames x channels samples.
+
+    The cascade runs as an FIR (its impulse response, truncated once it
+    has decayed) by FFT overlap-add over fixed-size blocks covering all
+    channels at once.
+    """
+    frames, channels = samples.shape
+    taps = int(impulse_sec * sample_rate)
+    n_fft = 1 << int(np.ceil(np.log2(4 * taps)))
+    response = np.ones(n_fft // 2 + 1, dtype=complex)
+    for b, a in sections:
+        response *= _biquad_response(b, a, n_fft)
+    kernel = np.fft.rfft(np.fft.irfft(response, n_fft)[:taps], n_fft)[:, np.newaxis]
+
+    block = n_fft - taps + 1
+    filtered = np.zeros((frames + taps - 1, channels))
+    for start in range(0, frames, block):
+        segment = samples[start:start + block]
+        length = segment.shape[0] + taps - 1
+        filtered[start:start + length] += np.fft.irfft(np.fft.rfft(segment, n_fft, axis=0) * kernel,
+                                                       n_fft, axis=0)[:length]
+    return filtered[:frames]
+
+
+def highpass_biquad(sample_rate: int, cutoff_hz: float = 80.0):
+    """2-pole Butterworth high-pass (FFmpeg's highpass=f=cutoff_hz) as a filter_biquads section."""
+    w0 = 2 * np.pi * cutoff_hz / sample_rate
+    alpha = np.sin(w0) / (2 * 0.707)
+    cos_w0 = np.cos(w0)
+    a0 = 1 + alpha
+    b = [(1 + cos_w0) / 2 / a0, -(1 + cos_w0) / a0, (1 + cos_w0) / 2 / a0]
+    a = [1.0, -2 * cos_w0 / a0, (1 - alpha) / a0]
+    return b, a
+
+
+def k_weighted_power(samples: 'np.ndarray', sample_rate: int) -> 'np.ndarray':
+    """Squared K-weighted samples (frames x channels)."""
+    weighted = filter_biquads(samples, _k_weighting_coefficients(sample_rate), sample_rate)
+    return weighted * weighted
+
+
+def _channel_weights(channels: int) -> 'np.ndarray':
+    # 5.1: L R C LFE Ls Rs -> LFE excluded, surrounds +1.5 dB
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+def _block_loudness(power: 'np.ndarray', weights: 'np.ndarray', block: int, step: int) -> 'np.ndarray':
+    """Weighted mean-square power of every gating block (not yet in LUFS)."""
+    frames = power.shape[0]
+    if frames < block:
+        return np.empty(0)
+    cumulative = np.concatenate([np.zeros((1, power.shape[1])), np.cumsum(power, axis=0)])
+    starts = np.arange(0, frames - block + 1, step)
+    mean_square = (cumulative[starts + block] - cumulative[starts]) / block
+    return mean_square @ weights
+
+
+def _to_lufs(z):
+    with np.errstate(divide='ignore'):
+        return -0.691 + 10.0 * np.log10(z)
+
+
+def integrated_loudness(power: 'np.ndarray', sample_rate: int, weights: 'np.ndarray') -> Optional[float]:
+    """Gated integrated loudness (LUFS), or None if nothing passes the gates."""
+    return _gated_integrated(_block_loudness(power, weights, int(round(BLOCK_SEC * sample_rate)),
+                                             int(round(BLOCK_STEP_SEC * sample_rate))))
+
+
+def _gated_integrated(z: 'np.ndarray') -> Optional[float]:
+    z = z[_to_lufs(z) > ABSOLUTE_GATE]
+    if z.size == 0:
+        return None
+    relative = _to_lufs(z.mean()) + RELATIVE_GATE
+    z = z[_to_lufs(z) > relative]
+    return float(_to_lufs(z.mean())) if z.size else None
+
+
+def loudness_range(power: 'np.ndarray', sample_rate: int, weights: 'np.ndarray') -> float:
+    """Loudness range (LU) from 3 s short-term blocks; 0 for shorter files."""
+    return _gated_range(_block_loudness(power, weights, int(round(SHORT_TERM_SEC * sample_rate)),
+                                        int(round(BLOCK_STEP_SEC * sample_rate))))
+
+
+def _gated_range(z: 'np.ndarray') -> float:
+    z = z[_to_lufs(z) > ABSOLUTE_GATE]
+    if z.size == 0:
+        return 0.0
+    relative = _to_lufs(z.mean()) + LRA_RELATIVE_GATE
+    levels = _to_lufs(z[_to_lufs(z) > relative])
+    if levels.size == 0:
+        return 0.0
+    low, high = np.percentile(levels, [10, 95])
+    return float(high - low)
+
+
+def _interpolator() -> 'np.ndarray':
+    """Kaiser-windowed sinc low-pass for 4x oversampling, split into phases."""
+    n = np.arange(_INTERP_TAPS) - (_INTERP_TAPS - 1) / 2.0
+    taps = np.sinc(n / OVERSAMPLE) * np.kaiser(_INTERP_TAPS, 5.0)
+    return taps.reshape(-1, OVERSAMPLE).T  # (phases, taps_per_phase)
+
+
+def true_peak_envelope(samples: 'np.ndarray') -> 'np.ndarray':
+    """
+    Per-frame true-peak estimate (max over channels and the 4x
+    interpolated points between this frame and the next).
+    """
+    phases = _interpolator()
+    # Group delay of the interpolator, in input frames
+    delay = (_INTERP_TAPS - 1) // (2 * OVERSAMPLE)
+    frames = samples.shape[0]
+    envelope = np.abs(samples).max(axis=1)
+    for ch in range(samples.shape[1]):
+        x = samples[:, ch]
+        for phase in phases:
+            y = np.convolve(x, phase)[delay:delay + frames]
+            np.maximum(envelope[:len(y)], np.abs(y), out=envelope[:len(y)])
+    # Interpolated points straddle two frames: attribute them to both
+    envelope[:-1] = np.maximum(envelope[:-1], envelope[1:])
+    return envelope
+
+
+def measure(samples: 'np.ndarray', sample_rate: int) -> Dict:
+    """
+    Measure a signal the way the loudnorm first pass does.
+
+    Returns:
+        Dict with measured_I (LUFS or None), measured_LRA (LU) and
+        measured_TP (dBTP)
+    """
+    weights = _channel_weights(samples.shape[1])
+    power = k_weighted_power(samples, sample_rate)
+    return {
+        'measured_I': integrated_loudness(power, sample_rate, weights),
+        'measured_LRA': loudness_range(power, sample_rate, weights),
+        'measured_TP': _amp_to_db(float(true_peak_envelope(samples).max()) if samples.size else 0.0)
+    }
+
+
+def measure_blocks(samples: 'np.ndarray', sample_rate: int,
+                   block_frames: int = STREAM_BLOCK_FRAMES) -> Dict:
+    """
+    measure() one block at a time, for long (e.g. memory-mapped) signals.
+
+    Each block is K-weighted with the filter's impulse length of the
+    previous block prepended, so the filtered samples are exact, and its
+    weighted power is summed per 100 ms step. The 400 ms and 3 s gating
+    blocks are then sums of 4 and 30 steps, which matches measure()
+    whenever the sample rate is a multiple of 10 Hz.
+
+    Args:
+        samples: frames x channels, any float dtype
+        sample_rate: Sample rate
+        block_frames: Frames converted to float64 at a time
+
+    Returns:
+        Same dict as measure()
+    """
+    frames, channels = samples.shape
+    weights = _channel_weights(channels)
+    sections = _k_weighting_coefficients(sample_rate)
+    taps = int(K_WEIGHTING_IMPULSE_SEC * sample_rate)
+    step = int(round(BLOCK_STEP_SEC * sample_rate))
+    # Whole steps per block, so step boundaries never straddle blocks
+    block_frames = max(1, block_frames // step) * step
+
+    step_power = []
+    peak = 0.0
+    for start in range(0, frames, block_frames):
+        stop = min(frames, start + block_frames)
+        preroll = min(start, taps - 1)
+        block = np.asarray(samples[start - preroll:stop], dtype=np.float64)
+        weighted = filter_biquads(block, sections, sample_rate)[preroll:]
+        power = (weighted * weighted) @ weights
+        whole = power.shape[0] // step
+        step_power.append(power[:whole * step].reshape(whole, step).sum(axis=1))
+        envelope = _envelope_span(samples, start, stop)
+        if envelope.size:
+            peak = max(peak, float(envelope.max()))
+
+    steps = np.concatenate(step_power) if step_power else np.empty(0)
+    cumulative = np.concatenate([[0.0], np.cumsum(steps)])
+
+    def windows(count: int) -> 'np.ndarray':
+        if steps.size < count:
+            return np.empty(0)
+        return (cumulative[count:] - cumulative[:-count]) / (count * step)
+
+    return {
+        'measured_I': _gated_integrated(windows(int(round(BLOCK_SEC / BLOCK_STEP_SEC)))),
+        'measured_LRA': _gated_range(windows(int(round(SHORT_TERM_SEC / BLOCK_STEP_SEC)))),
+        'measured_TP': _amp_to_db(peak)
+    }
+
+
+def _envelope_span(samples: 'np.ndarray', start: int, stop: int, scale: float = 1.0) -> 'np.ndarray':
+    """true_peak_envelope() of scale * samples for frames [start, stop) only."""
+    # The interpolator reads fewer than _INTERP_TAPS frames on either side
+    lo = max(0, start - _INTERP_TAPS)
+    hi = min(samples.shape[0], stop + _INTERP_TAPS)
+    block = np.asarray(samples[lo:hi], dtype=np.float64)
+    if scale != 1.0:
+        block = block * scale
+    return true_peak_envelope(block)[start - lo:stop - lo]
+
+
+def _sliding_min(values: 'np.ndarray', window: int) -> 'np.ndarray':
+    """out[i] = min(values[i:i + window]), padded with 1.0 past the end."""
+    n = values.shape[0]
+    padded_len = -(-(n + window - 1) // window) * window
+    padded = np.ones(padded_len)
+    padded[:n] = values
+    blocks = padded.reshape(-1, window)
+    prefix = np.minimum.accumulate(blocks, axis=1).ravel()
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(suffix[:n], prefix[window - 1:window - 1 + n])
+
+
+def limiter_gain(envelope: 'np.ndarray', ceiling: float, sample_rate: int) -> 'np.ndarray':
+    """
+    Gain curve that keeps envelope * gain under the ceiling.
+
+    The required gain is held for the release time after each peak and
+    reached over the lookahead before it: a windowed minimum over
+    [n - release, n + lookahead) followed by a lookahead-long moving
+    average, which can never rise above the minimum needed at a peak.
+    """
+    lookahead = max(1, int(round(LIMITER_LOOKAHEAD_MS * sample_rate / 1000.0)))
+    release = max(0, int(round(LIMITER_RELEASE_MS * sample_rate / 1000.0)))
+    n = envelope.shape[0]
+
+    required = np.ones(n)
+    over = envelope > ceiling
+    if not over.any():
+        return required
+    required[over] = ceiling / envelope[over]
+
+    held = _sliding_min(np.concatenate([np.ones(release), required]), release + lookahead)[:n]
+    # smoothed[i] = mean(held[i - lookahead + 1 .. i]); before the start the
+    # first held value stands in, so peaks in the first frames are covered too
+    cumulative = np.cumsum(np.concatenate([np.full(lookahead, held[0]), held]))
+    smoothed = (cumulative[lookahead:] - cumulative[:n]) / lookahead
+    return np.minimum(smoothed, 1.0)
+
+
+def limiter_gain_block(samples: 'np.ndarray', amp: float, ceiling: float, sample_rate: int,
+                       start: int, stop: int) -> 'np.ndarray':
+    """
+    Total gain (amp times the limiter gain) for frames [start, stop).
+
+    Equal to amp * limiter_gain(true_peak_envelope(samples * amp), ...)
+    over the same frames, but reads only the frames the limiter's
+    lookahead and release windows reach around the span.
+    """
+    lookahead = max(1, int(round(LIMITER_LOOKAHEAD_MS * sample_rate / 1000.0)))
+    release = max(0, int(round(LIMITER_RELEASE_MS * sample_rate / 1000.0)))
+    lo = max(0, start - release - lookahead)
+    hi = min(samples.shape[0], stop + lookahead)
+    gain = limiter_gain(_envelope_span(samples, lo, hi, amp), ceiling, sample_rate)
+    return amp * gain[start - lo:stop - lo]
+
+
+def can_render_in_process(header: Optional[WavHeader], codec: str, duration_sec: float) -> bool:
+    """True if the NumPy engine handles this input/output combination."""
+    if not HAVE_NUMPY or header is None or codec not in CODEC_FORMATS:
+        return False
+    if header.audio_format not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT) or not header.channels:
+        return False
+    return 0 < duration_sec <= IN_PROCESS_MAX_SECONDS
+
+
+def render_lufs(input_path: str, output_path: str, header: WavHeader, codec: str,
+                target_lufs: float, target_tp: float, limit: float, target_lra: float,
+                start_sec: float = 0.0, end_sec: Optional[float] = None) -> Optional[Dict]:
+    """
+    Measure and render one file in LUFS mode without FFmpeg.
+
+    Applies the constant gain that reaches target_lufs, then limits true
+    peaks to the lower of target_tp and the limiter ceiling.
+
+    Args:
+        input_path: Input WAV path
+        output_path: Output WAV path
+        header: Parsed input header
+        codec: Output codec from choose_output_codec()
+        target_lufs: Target integrated loudness
+        target_tp: True-peak ceiling (dBTP)
+        limit: Limiter ceiling (linear, as for alimiter)
+        target_lra: Loudness range above which dynamic loudnorm is needed
+        start_sec: Trim start
+        end_sec: Trim end (None for end of file)
+
+    Returns:
+        Dict with measured_I, measured_LRA, measured_TP, rendered and,
+        when rendered, gain_db and limited (fraction of frames the
+        limiter touched). rendered is False when the loudness range is
+        wider than a constant gain allows and dynamic loudnorm is needed.
+        None if the engine cannot measure the file (unsupported sample
+        format, or nothing above the gates).
+    """
+    samples = read_samples(input_path, header, start_sec, end_sec)
+    if samples is None or samples.shape[0] == 0:
+        return None
+
+    measured = measure(samples, header.sample_rate)
+    if measured['measured_I'] is None:
+        return None
+    if measured['measured_LRA'] > target_lra:
+        return dict(measured, rendered=False)
+
+    gain_db = float(target_lufs) - measured['measured_I']
+    samples *= _db_to_amp(gain_db)
+
+    ceiling = min(float(limit), _db_to_amp(float(target_tp))) * _db_to_amp(-LIMITER_SAFETY_DB)
+    gain = limiter_gain(true_peak_envelope(samples), ceiling, header.sample_rate)
+    samples *= gain[:, np.newaxis]
+
+    write_wav(output_path, samples, header.sample_rate, codec)
+    return dict(measured, gain_db=gain_db, limited=float(np.mean(gain < 1.0)), rendered=True)
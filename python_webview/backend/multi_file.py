@@ -0,0 +1,337 @@
+"""
+Multi-file FFmpeg invocations for very short clips.
+
+For corpora of many 0.5-3 s files, starting FFmpeg dominates the cost of
+each file. Here a group of K clips shares one FFmpeg process per stage:
+
+- detect: every input gets its own silencedetect, whose results are
+  printed by a named ametadata@sN instance so they can be told apart
+- analyze: per-input atrim + named volumedetect@vN
+- render: per-input atrim + volume, mapped to K separate outputs
+
+K adapts to the clips' total duration (GROUP_TARGET_SEC of audio per
+group, at most MAX_GROUP_FILES files), so launches drop by roughly K.
+Only peak mode is grouped; LUFS files keep their per-file path (short
+PCM/float files are already rendered in-process there). With NumPy, a
+group of PCM/float clips skips FFmpeg entirely: batch_peaks analyzes the
+group as one padded array and the outputs are written in-process.
+"""
+import re
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .process_manager import process_manager
+from .failures import FFmpegError
+from .watchdog import watchdog
+from .ffmpeg_paths import get_ffmpeg_path
+from .ffmpeg_caps import has_filter
+from . import batch_peaks
+from .wav_header import read_wav_header
+from .audio_processor import (get_duration_seconds, ffmpeg_threads, format_info_from_header, choose_output_codec,
+                              trim_config, voice_region_from_silences, padded_trim, peak_gain_db)
+
+logger = logging.getLogger(__name__)
+
+# Files at most this long are grouped
+TINY_FILE_SEC = 5.0
+# Audio per group: K grows for shorter clips
+GROUP_TARGET_SEC = 60.0
+# Upper bound on K (open files and command-line length, notably on Windows)
+MAX_GROUP_FILES = 32
+
+_METADATA_LINE = re.compile(r'^\[ametadata@s(\d+) @ [^\]]*\] lavfi\.silence_(start|end)=(-?[0-9.]+)', re.M)
+_MAX_VOLUME_LINE = re.compile(r'^\[volumedetect@v(\d+) @ [^\]]*\] max_volume: (-?[0-9.]+|-inf) dB', re.M)
+
+
+def plan_groups(files: List[str], settings: Dict,
+                durations: Optional[Dict[str, float]] = None) -> List[List[str]]:
+    """
+    Split files into processing units, keeping their order.
+
+    Tiny files are packed into groups of adaptive size; every other file
+    (and every file when grouping does not apply) is a unit of its own.
+
+    Args:
+        files: Input files
+        settings: Processing settings
+        durations: Already-known durations per file (read from headers if missing)
+
+    Returns:
+        List of units, each a list of file paths
+    """
+    if settings.get('normMode', 'peak') != 'peak':
+        return [[f] for f in files]
+
+    units = []
+    group: List[str] = []
+    group_sec = 0.0
+    for file_path in files:
+        duration = (durations or {}).get(file_path)
+        if duration is None:
+            duration = get_duration_seconds(file_path, header=read_wav_header(file_path))
+        if duration <= 0 or duration > TINY_FILE_SEC:
+            units.append([file_path])
+            continue
+        group.append(file_path)
+        group_sec += duration
+        if group_sec >= GROUP_TARGET_SEC or len(group) >= MAX_GROUP_FILES:
+            units.append(group)
+            group, group_sec = [], 0.0
+    if group:
+        units.append(group)
+    return units
+
+
+def _run(cmd: List[str], job_id: str, stage: str, audio_sec: float) -> str:
+    proc = process_manager.spawn(cmd, job_id=job_id)
+    try:
+        with watchdog.guard(proc, stage, audio_sec, job_id):
+            _, stderr = proc.communicate()
+    finally:
+        process_manager.untrack(proc, job_id)
+    stderr_text = stderr.decode('utf-8', errors='ignore')
+    if proc.returncode != 0 and not process_manager.is_canceled():
+        raise FFmpegError('Grouped FFmpeg run', proc.returncode, stderr_text)
+    return stderr_text
+
+
+def _input_args(inputs: List[str]) -> List[str]:
+    args = []
+    for input_path in inputs:
+        args += ['-i', input_path]
+    return args
+
+
+def _trim_filter(span: Tuple[float, float], duration_sec: float) -> str:
+    start, end = span
+    if start <= 0 and end >= duration_sec:
+        return ''
+    return f'atrim=start={start:.3f}:end={end:.3f},asetpts=PTS-STARTPTS,'
+
+
+def detect_silences(inputs: List[str], durations: List[float], settings: Dict,
+                    job_id: str) -> List[List[List[float]]]:
+    """
+    Silence intervals for every input, from one FFmpeg run.
+
+    Returns:
+        Per input, a list of [start, end] pairs in seconds
+    """
+    threshold_db, min_dur_sec, use_hpf, _ = trim_config(settings)
+    if use_hpf and not has_filter('highpass'):
+        use_hpf = False
+    hpf = 'highpass=f=80,' if use_hpf else ''
+
+    chains = []
+    outputs = []
+    for i in range(len(inputs)):
+        chains.append(f'[{i}:a]{hpf}silencedetect=n={threshold_db}dB:d={min_dur_sec},'
+                      f'ametadata@s{i}=mode=print[d{i}]')
+        outputs += ['-map', f'[d{i}]', '-f', 'null', '-']
+    cmd = [get_ffmpeg_path(), '-hide_banner', '-nostats', '-v', 'info'] + _input_args(inputs) + \
+          ['-filter_complex', ';'.join(chains)] + outputs
+    stderr_text = _run(cmd, job_id, 'detect', sum(durations))
+
+    events: List[List[Tuple[str, float]]] = [[] for _ in inputs]
+    for match in _METADATA_LINE.finditer(stderr_text):
+        index = int(match.group(1))
+        if index < len(events):
+            events[index].append((match.group(2), float(match.group(3))))
+
+    silences = []
+    for index, input_events in enumerate(events):
+        intervals = []
+        open_start = None
+        for kind, value in input_events:
+            if kind == 'start':
+                open_start = value
+            elif open_start is not None:
+                intervals.append([open_start, value])
+                open_start = None
+        # A silence still open at the end runs to the end of the file
+        if open_start is not None:
+            intervals.append([open_start, durations[index]])
+        silences.append(intervals)
+    return silences
+
+
+def measure_peaks(inputs: List[str], spans: List[Tuple[float, float]], durations: List[float],
+                  job_id: str) -> List[Optional[float]]:
+    """Max volume (dB) of each input's span, from one FFmpeg run."""
+    chains = []
+    outputs = []
+    for i in range(len(inputs)):
+        chains.append(f'[{i}:a]{_trim_filter(spans[i], durations[i])}volumedetect@v{i}[m{i}]')
+        outputs += ['-map', f'[m{i}]', '-f', 'null', '-']
+    cmd = [get_ffmpeg_path(), '-hide_banner', '-nostats', '-v', 'info'] + _input_args(inputs) + \
+          ['-filter_complex', ';'.join(chains)] + outputs
+    stderr_text = _run(cmd, job_id, 'analyze', sum(end - start for start, end in spans))
+
+    peaks: List[Optional[float]] = [None] * len(inputs)
+    for match in _MAX_VOLUME_LINE.finditer(stderr_text):
+        index = int(match.group(1))
+        if index < len(peaks) and match.group(2) != '-inf':
+            peaks[index] = float(match.group(2))
+    return peaks
+
+
+def _log_trim(job_id: str, span: Tuple[float, float], duration_sec: float, trimmed: bool,
+              settings: Dict, log_callback: Callable) -> None:
+    min_file_ms = settings.get('trimMinFileMs', 800)
+    if duration_sec * 1000 < min_file_ms:
+        log_callback(job_id, 'trim', f"No trimming applied: file shorter than minimum {min_file_ms}ms")
+    elif trimmed:
+        log_callback(job_id, 'trim', f"Trim applied: start={span[0]:.3f}s end={span[1]:.3f}s")
+    else:
+        log_callback(job_id, 'trim', "No trimming applied: could not detect non-silent region")
+
+
+def _analyze_with_ffmpeg(inputs: List[str], job_ids: List[str], durations: List[float], settings: Dict,
+                         timings: Dict, progress_callback: Callable, log_callback: Callable):
+    """Trim spans and peaks from one grouped silencedetect run and one volumedetect run."""
+    group_id = job_ids[0]
+
+    stage_start = time.monotonic()
+    for job_id in job_ids:
+        progress_callback(job_id, 'detect', 'start', 0)
+    spans = [(0.0, duration) for duration in durations]
+    if settings.get('autoTrim', False) and has_filter('silencedetect'):
+        min_file_ms = settings.get('trimMinFileMs', 800)
+        silences = detect_silences(inputs, durations, settings, group_id)
+        for i, job_id in enumerate(job_ids):
+            region = voice_region_from_silences(silences[i], durations[i])
+            if region and durations[i] * 1000 >= min_file_ms:
+                spans[i] = padded_trim(region, durations[i], settings)
+            _log_trim(job_id, spans[i], durations[i], region is not None, settings, log_callback)
+    for job_id in job_ids:
+        progress_callback(job_id, 'detect', 'done', 100)
+    timings['detect'] = time.monotonic() - stage_start
+    if process_manager.is_canceled():
+        return None, None
+
+    stage_start = time.monotonic()
+    for job_id in job_ids:
+        progress_callback(job_id, 'analyze', 'start', 0)
+    peaks = measure_peaks(inputs, spans, durations, group_id)
+    timings['analyze'] = time.monotonic() - stage_start
+    return spans, peaks
+
+
+def _analyze_in_process(inputs: List[str], job_ids: List[str], headers: List, durations: List[float],
+                        settings: Dict, timings: Dict, progress_callback: Callable, log_callback: Callable):
+    """Trim spans and peaks for the whole group from one padded array (see batch_peaks)."""
+    stage_start = time.monotonic()
+    for job_id in job_ids:
+        progress_callback(job_id, 'detect', 'start', 0)
+        progress_callback(job_id, 'analyze', 'start', 0)
+    samples, lengths = batch_peaks.load_clips(inputs, headers)
+    spans, peaks, voiced = batch_peaks.analyze_clips(samples, lengths, headers, settings)
+    del samples
+    if settings.get('autoTrim', False):
+        for i, job_id in enumerate(job_ids):
+            _log_trim(job_id, spans[i], durations[i], voiced[i], settings, log_callback)
+    for job_id in job_ids:
+        progress_callback(job_id, 'detect', 'done', 100)
+    timings['analyze'] = time.monotonic() - stage_start
+    return spans, peaks
+
+
+def normalize_group(jobs: List[Tuple[str, str, str]], settings: Dict,
+                    progress_callback: Callable, log_callback: Callable) -> Optional[List[Dict]]:
+    """
+    Peak-normalize a group of short files with one FFmpeg process per stage.
+
+    Args:
+        jobs: (input_path, output_path, job_id) per file
+        settings: Processing settings (normMode must be 'peak')
+        progress_callback: Progress callback(job_id, phase, status, pct)
+        log_callback: Log callback(job_id, phase, message)
+
+    Returns:
+        One normalize_file-style dict per job, or None if canceled
+
+    Raises:
+        FFmpegError: If a grouped FFmpeg run fails (callers fall back to
+            processing the files one by one)
+        FFmpegStalled: If a grouped FFmpeg run missed its watchdog deadline
+    """
+    if process_manager.is_canceled():
+        return None
+
+    inputs = [job[0] for job in jobs]
+    job_ids = [job[2] for job in jobs]
+    group_id = job_ids[0]
+    threads = ffmpeg_threads(settings)
+    thread_args = ['-threads', str(threads)] if threads > 0 else []
+
+    headers = [read_wav_header(path) for path in inputs]
+    durations = [get_duration_seconds(path, job_id, header)
+                 for path, job_id, header in zip(inputs, job_ids, headers)]
+    codecs = [choose_output_codec(settings.get('targetBitDepth', 16), format_info_from_header(header))
+              for header in headers]
+    timings = {}
+    in_process = batch_peaks.can_analyze(headers, codecs)
+
+    if in_process:
+        spans, peaks = _analyze_in_process(inputs, job_ids, headers, durations, settings,
+                                           timings, progress_callback, log_callback)
+    else:
+        spans, peaks = _analyze_with_ffmpeg(inputs, job_ids, durations, settings,
+                                            timings, progress_callback, log_callback)
+    if spans is None or process_manager.is_canceled():
+        return None
+    gains = [peak_gain_db(peak, settings) for peak in peaks]
+    for job_id, peak, gain_db in zip(job_ids, peaks, gains):
+        log_callback(job_id, 'analyze',
+                     f"Peak mode: measuredMax={peak if peak is not None else 'n/a'} dB, "
+                     f"target={settings.get('peakTargetDb', -2)} dB, gain={gain_db:.2f} dB, "
+                     f"onlyBoost={settings.get('peakOnlyBoost', True)}")
+        progress_callback(job_id, 'analyze', 'done', 100)
+
+    stage_start = time.monotonic()
+    for job_id in job_ids:
+        progress_callback(job_id, 'render', 'start', 0)
+    if in_process:
+        # In-process writer: no FFmpeg at all for this group
+        log_callback(group_id, 'render', f"Rendering {len(jobs)} files in-process")
+        for i, (input_path, output_path, _) in enumerate(jobs):
+            if process_manager.is_canceled():
+                return None
+            batch_peaks.render_clip(input_path, headers[i], spans[i], gains[i], output_path, codecs[i])
+    else:
+        # K outputs from one process
+        chains = []
+        outputs = []
+        for i, (_, output_path, job_id) in enumerate(jobs):
+            chains.append(f'[{i}:a]{_trim_filter(spans[i], durations[i])}volume={gains[i]:.2f}dB[o{i}]')
+            outputs += ['-map', f'[o{i}]'] + thread_args + \
+                       ['-acodec', codecs[i], '-map_metadata', '-1', output_path]
+        cmd = [get_ffmpeg_path(), '-hide_banner', '-nostats', '-v', 'error', '-y'] + _input_args(inputs) + \
+              ['-filter_complex', ';'.join(chains)] + outputs
+        log_callback(group_id, 'render', f"Rendering {len(jobs)} files in one FFmpeg process")
+        _run(cmd, group_id, 'render', sum(end - start for start, end in spans))
+    if process_manager.is_canceled():
+        return None
+    timings['render'] = time.monotonic() - stage_start
+
+    # Stage times are shared by the group; report each file's share
+    share = {stage: elapsed / len(jobs) for stage, elapsed in timings.items()}
+    results = []
+    for i, (_, output_path, job_id) in enumerate(jobs):
+        progress_callback(job_id, 'render', 'done', 100)
+        log_callback(job_id, 'render', f"Completed: {output_path}")
+        results.append({
+            'durationSec': durations[i],
+            'codec': codecs[i],
+            'trimStart': spans[i][0],
+            'trimEnd': spans[i][1],
+            'measuredMaxVolume': peaks[i],
+            'measuredI': None,
+            'measuredTP': None,
+            'measuredLRA': None,
+            'gainDb': gains[i],
+            'lufsRender': None,
+            'timings': dict(share)
+        })
+    return results
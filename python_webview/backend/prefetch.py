@@ -0,0 +1,191 @@
+"""
+Input read-ahead for upcoming files.
+
+While one file renders, nothing else touches the files queued behind it,
+so on spinning disks and network shares every FFmpeg start pays the cold
+read latency. A Prefetcher warms the next few queued inputs on a
+background thread. It uses posix_fadvise(WILLNEED) where available and
+a plain sequential read elsewhere.
+
+With a copy folder set (e.g. /dev/shm), small inputs are copied there
+instead, so FFmpeg reads them from RAM-backed storage. run_batch() then
+passes the copy as the file's source.
+
+Warmed bytes are capped by a memory budget. Page-cache prefetches count
+until their file starts; local copies count until their file finishes
+(see release()).
+"""
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import itertools
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Default budget: this share of available memory, capped
+PREFETCH_MEMORY_SHARE = 0.1
+MAX_DEFAULT_PREFETCH_MB = 1024
+DEFAULT_COPY_MAX_MB = 64
+_READ_CHUNK = 1024 * 1024
+
+
+def default_budget_mb() -> float:
+    """Prefetch budget from available memory."""
+    available_mb = psutil.virtual_memory().available / (1024 * 1024)
+    return min(MAX_DEFAULT_PREFETCH_MB, available_mb * PREFETCH_MEMORY_SHARE)
+
+
+def _warm(path: str) -> None:
+    """Ask the OS to read a file into the page cache."""
+    with open(path, 'rb') as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            return
+        # No fadvise (Windows, macOS): read it once
+        while f.read(_READ_CHUNK):
+            pass
+
+
+class Prefetcher:
+    """
+    Warms the next queued inputs on a background thread.
+
+    Call ahead() with the files that will start next, source() when a file
+    starts and release() when it is finished; close() at the end of the
+    batch removes any local copies.
+    """
+
+    def __init__(self, budget_mb: Optional[float] = None, copy_dir: Optional[str] = None,
+                 copy_max_mb: float = DEFAULT_COPY_MAX_MB):
+        self.budget_bytes = (budget_mb if budget_mb is not None else default_budget_mb()) * 1024 * 1024
+        self.copy_max_bytes = copy_max_mb * 1024 * 1024
+        self.copy_root = None
+        if copy_dir:
+            os.makedirs(copy_dir, exist_ok=True)
+            self.copy_root = tempfile.mkdtemp(prefix='ban-prefetch-', dir=copy_dir)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._held: Dict[str, int] = {}     # path -> bytes counted against the budget
+        self._copies: Dict[str, str] = {}   # path -> local copy, once complete
+        self._seen = set()
+        self._started = set()
+        self._held_bytes = 0
+        self._stats = {'warmed': 0, 'copied': 0, 'hits': 0, 'bytes': 0}
+        self._copy_names = itertools.count()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+        self._thread.start()
+
+    def ahead(self, paths: Iterable[str]) -> None:
+        """Queue upcoming inputs (in start order) for warming."""
+        with self._cond:
+            for path in paths:
+                if path not in self._seen:
+                    self._seen.add(path)
+                    self._queue.append(path)
+            self._cond.notify_all()
+
+    def source(self, path: str) -> str:
+        """
+        Mark an input as started.
+
+        Returns:
+            The local copy to read, or `path` itself
+        """
+        with self._cond:
+            self._started.add(path)
+            if path in self._copies:
+                self._stats['hits'] += 1
+                return self._copies[path]
+            # A page-cache prefetch is consumed once FFmpeg starts reading
+            self._held_bytes -= self._held.pop(path, 0)
+            self._cond.notify_all()
+            return path
+
+    def release(self, path: str) -> None:
+        """A started input is finished: drop its local copy and budget."""
+        with self._cond:
+            self._seen.discard(path)
+            self._started.discard(path)
+            self._held_bytes -= self._held.pop(path, 0)
+            copy = self._copies.pop(path, None)
+            self._cond.notify_all()
+        if copy:
+            try:
+                os.remove(copy)
+            except OSError:
+                pass
+
+    def _next(self) -> Optional[str]:
+        """Next queued path that fits the budget, waiting for room (None once closed)."""
+        with self._cond:
+            while not self._closed:
+                while self._queue and self._queue[0] in self._started:
+                    self._queue.popleft()
+                if self._queue and self._held_bytes < self.budget_bytes:
+                    return self._queue.popleft()
+                self._cond.wait()
+            return None
+
+    def _run(self) -> None:
+        while True:
+            path = self._next()
+            if path is None:
+                return
+            try:
+                size = os.path.getsize(path)
+                with self._cond:
+                    if path in self._started or size > self.budget_bytes:
+                        # Too late, or bigger than the whole budget
+                        continue
+                    self._held[path] = size
+                    self._held_bytes += size
+                if self.copy_root and size <= self.copy_max_bytes:
+                    self._copy(path)
+                else:
+                    _warm(path)
+                    with self._cond:
+                        self._stats['warmed'] += 1
+                        self._stats['bytes'] += size
+            except OSError as e:
+                logger.debug(f"Prefetch of {path} failed: {e}")
+                with self._cond:
+                    self._held_bytes -= self._held.pop(path, 0)
+
+    def _copy(self, path: str) -> None:
+        local = os.path.join(self.copy_root, f"{next(self._copy_names)}-{os.path.basename(path)}")
+        shutil.copyfile(path, local)
+        with self._cond:
+            if path in self._started or path not in self._held:
+                # Started (or finished) while copying: the original was used
+                stale = True
+            else:
+                stale = False
+                self._copies[path] = local
+                self._stats['copied'] += 1
+                self._stats['bytes'] += self._held[path]
+        if stale:
+            os.remove(local)
+
+    def close(self) -> Dict:
+        """
+        Stop the background thread and remove local copies.
+
+        Returns:
+            Dict with warmed, copied, hits (starts that read a local copy)
+            and bytes
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self.copy_root:
+            shutil.rmtree(self.copy_root, ignore_errors=True)
+        with self._cond:
+            return dict(self._stats)
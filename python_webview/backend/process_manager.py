@@ -6,10 +6,11 @@ with reliable process tree killing and cleanup.
 """
 import os
 import signal
+import asyncio
 import subprocess
 import psutil
 import logging
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,42 @@ class ProcessManager:
         Returns:
             subprocess.Popen object
         """
+        # Ensure we can capture output
+        if 'stdout' not in kwargs:
+            kwargs['stdout'] = subprocess.PIPE
+        if 'stderr' not in kwargs:
+            kwargs['stderr'] = subprocess.PIPE
+            
+        proc = subprocess.Popen(cmd, **self._group_kwargs(kwargs))
+        self.track(proc, job_id)
+        return proc
+        
+    async def aspawn(self, cmd: List[str], job_id: Optional[str] = None,
+                     **kwargs) -> asyncio.subprocess.Process:
+        """
+        Spawn a subprocess from a running event loop, with the same process
+        group handling and tracking as spawn().
+        
+        Args:
+            cmd: Command and arguments to execute
+            job_id: Optional job ID for tracking
+            **kwargs: Additional arguments for asyncio.create_subprocess_exec
+            
+        Returns:
+            asyncio.subprocess.Process object
+        """
+        if 'stdout' not in kwargs:
+            kwargs['stdout'] = asyncio.subprocess.PIPE
+        if 'stderr' not in kwargs:
+            kwargs['stderr'] = asyncio.subprocess.PIPE
+            
+        proc = await asyncio.create_subprocess_exec(*cmd, **self._group_kwargs(kwargs))
+        self.track(proc, job_id)
+        return proc
+        
+    @staticmethod
+    def _group_kwargs(kwargs: Dict) -> Dict:
+        """Put the child in its own process group so its whole tree can be killed."""
         # Create new process group on Unix, CREATE_NEW_PROCESS_GROUP on Windows
         if os.name == 'nt':  # Windows
             # CREATE_NO_WINDOW = 0x08000000
@@ -42,23 +79,27 @@ class ProcessManager:
             kwargs['creationflags'] = creation_flags
         else:  # Unix-like
             kwargs['start_new_session'] = True
-            
-        # Ensure we can capture output
-        if 'stdout' not in kwargs:
-            kwargs['stdout'] = subprocess.PIPE
-        if 'stderr' not in kwargs:
-            kwargs['stderr'] = subprocess.PIPE
-            
-        proc = subprocess.Popen(cmd, **kwargs)
+        return kwargs
         
-        # Track the process
-        if job_id:
-            if job_id not in self.active_processes:
-                self.active_processes[job_id] = []
-            self.active_processes[job_id].append(proc)
-            
+    def track(self, proc, job_id: Optional[str]) -> None:
+        """
+        Track a process under a job ID so kill_job()/kill_all() reach it.
+        
+        Args:
+            proc: subprocess.Popen or asyncio.subprocess.Process
+            job_id: Job ID (untracked if None)
+        """
+        if job_id is not None:
+            self.active_processes.setdefault(job_id, []).append(proc)
         logger.debug(f"Spawned process {proc.pid} for job {job_id}")
-        return proc
+        
+    def untrack(self, proc, job_id: Optional[str]) -> None:
+        """Stop tracking a finished process."""
+        processes = self.active_processes.get(job_id)
+        if processes and proc in processes:
+            processes.remove(proc)
+            if not processes:
+                self.active_processes.pop(job_id, None)
         
     def kill_process_tree(self, proc: subprocess.Popen) -> None:
         """
@@ -119,14 +160,13 @@ class ProcessManager:
         Args:
             job_id: Job ID to kill
         """
-        if job_id not in self.active_processes:
+        processes = self.active_processes.pop(job_id, None)
+        if not processes:
             return
             
-        processes = self.active_processes[job_id]
-        for proc in processes:
+        for proc in list(processes):
             self.kill_process_tree(proc)
             
-        del self.active_processes[job_id]
         logger.info(f"Killed all processes for job {job_id}")
         
     def kill_all(self) -> None:
@@ -137,6 +177,10 @@ class ProcessManager:
             self.kill_job(job_id)
         logger.info("Killed all processes")
         
+    def reset(self) -> None:
+        """Clear the cancel flag set by kill_all() before starting or resuming work."""
+        self.cancel_all = False
+        
     def cleanup_job(self, job_id: str) -> None:
         """
         Clean up finished processes for a job.
@@ -145,10 +189,10 @@ class ProcessManager:
             job_id: Job ID to clean up
         """
         if job_id in self.active_processes:
-            # Remove finished processes
+            # Remove finished processes (asyncio processes report returncode only)
             self.active_processes[job_id] = [
                 p for p in self.active_processes[job_id]
-                if p.poll() is None
+                if (p.poll() if hasattr(p, 'poll') else p.returncode) is None
             ]
             # Remove job if no processes left
             if not self.active_processes[job_id]:
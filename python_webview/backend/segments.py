@@ -0,0 +1,197 @@
+"""
+Segment-parallel analysis of long recordings.
+
+One FFmpeg analysis pass over a 3-hour file decodes on a single core and
+holds up the end of the batch. With segmentAnalysis on, files longer
+than two segments are split by time into segments that run as parallel
+FFmpeg processes (input seeking with -ss/-t). The per-segment results
+are then merged into what a single pass would have reported:
+
+- detect: silencedetect intervals, shifted to file time and joined
+  across segment boundaries
+- peak: volumedetect max_volume is the max over segments
+- LUFS: ebur128 logs the momentary (400 ms) and short-term (3 s)
+  loudness every 100 ms. Those are the BS.1770 gating blocks, so the
+  integrated loudness, its relative gate and the loudness range are
+  gated from the blocks of all segments together. The true peak is the
+  max over segments. Each segment starts 3 s early so its first
+  blocks are full, and only blocks ending inside the segment are kept.
+
+The merged values take the place of the loudnorm first pass and feed the
+render stage unchanged (see audio_processor.normalize_steps).
+
+A silence shorter than the minimum duration on either side of a
+boundary is not reported, so a trim edge that falls on a boundary can
+land up to trimMinDurationMs early (keeping slightly more audio).
+"""
+import os
+import re
+import math
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_SEGMENT_SEC = 300.0
+MIN_SEGMENT_SEC = 30.0
+# Segments start this much early so the 3 s short-term blocks are full
+LOOKBACK_SEC = 3.0
+BLOCK_STEP_SEC = 0.1
+MOMENTARY_SEC = 0.4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+LRA_RELATIVE_GATE = -20.0
+
+Segment = Tuple[float, float]
+
+_FRAME_RE = re.compile(r't:\s*([0-9.]+)\s+TARGET:.*?M:\s*(-?[0-9.]+|-?inf)\s+S:\s*(-?[0-9.]+|-?inf)')
+_TRUE_PEAK_RE = re.compile(r'True peak:\s*\n\s*Peak:\s*(-?[0-9.]+|-?inf)')
+_MAX_VOLUME_RE = re.compile(r'max_volume:\s*(-?[0-9.]+)\s*dB')
+_SILENCE_START_RE = re.compile(r'silence_start: (-?[0-9.]+)')
+_SILENCE_END_RE = re.compile(r'silence_end: (-?[0-9.]+)')
+
+
+def plan_segments(start_sec: float, end_sec: float, settings: Dict) -> Optional[List[Segment]]:
+    """
+    Split [start_sec, end_sec] for parallel analysis.
+
+    Boundaries fall on the 100 ms block grid from start_sec.
+
+    Returns:
+        (start, end) pairs, or None if the span should be analyzed in one pass
+    """
+    if not settings.get('segmentAnalysis', False):
+        return None
+    segment_sec = max(MIN_SEGMENT_SEC, float(settings.get('segmentSec', DEFAULT_SEGMENT_SEC)))
+    length = end_sec - start_sec
+    if length < 2 * segment_sec:
+        return None
+    max_segments = int(settings.get('segmentWorkers', 0) or 0) or os.cpu_count() or 1
+    count = min(max_segments, math.ceil(length / segment_sec))
+    if count < 2:
+        return None
+    steps = math.ceil(length / count / BLOCK_STEP_SEC)
+    bounds = [start_sec + i * steps * BLOCK_STEP_SEC for i in range(count)] + [end_sec]
+    return [(bounds[i], bounds[i + 1]) for i in range(count) if bounds[i] < end_sec]
+
+
+def seek_args(start_sec: float, end_sec: float) -> List[str]:
+    """FFmpeg input options reading [start_sec, end_sec]."""
+    return ['-ss', f'{start_sec:.3f}', '-t', f'{end_sec - start_sec:.3f}']
+
+
+def lookback_start(segment: Segment, region_start: float) -> float:
+    """Where a LUFS segment's read starts (LOOKBACK_SEC early, not before the region)."""
+    return max(region_start, segment[0] - LOOKBACK_SEC)
+
+
+def merge_silences(stderr_texts: List[str], segments: List[Segment]) -> List[List[float]]:
+    """
+    Silence intervals in file time from per-segment silencedetect output.
+
+    A silence still open at a segment's end is closed there and joins a
+    silence starting at the next segment's beginning.
+    """
+    intervals = []
+    for text, (start, end) in zip(stderr_texts, segments):
+        starts = [float(m.group(1)) for m in _SILENCE_START_RE.finditer(text)]
+        ends = [float(m.group(1)) for m in _SILENCE_END_RE.finditer(text)]
+        for i in range(min(len(starts), len(ends))):
+            intervals.append([start + max(0.0, starts[i]), min(end, start + ends[i])])
+        if len(starts) > len(ends):
+            intervals.append([start + max(0.0, starts[-1]), end])
+    return intervals
+
+
+def merge_max_volume(stderr_texts: List[str]) -> Optional[float]:
+    """Loudest volumedetect max_volume over all segments, or None if any is missing."""
+    values = []
+    for text in stderr_texts:
+        match = _MAX_VOLUME_RE.search(text)
+        if not match:
+            return None
+        values.append(float(match.group(1)))
+    return max(values)
+
+
+def _energy(lufs: List[float]) -> List[float]:
+    return [10.0 ** ((value + 0.691) / 10.0) for value in lufs]
+
+
+def _lufs(energy: float) -> float:
+    return -0.691 + 10.0 * math.log10(energy) if energy > 0 else float('-inf')
+
+
+def _gate(levels: List[float], relative_gate: float) -> Tuple[List[float], Optional[float]]:
+    """Blocks passing the absolute and relative gates, and the relative threshold."""
+    levels = [level for level in levels if level > ABSOLUTE_GATE]
+    if not levels:
+        return [], None
+    energies = _energy(levels)
+    threshold = _lufs(sum(energies) / len(energies)) + relative_gate
+    return [level for level in levels if level > threshold], threshold
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of sorted values (as numpy's default)."""
+    position = (len(values) - 1) * pct / 100.0
+    low = math.floor(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def merge_loudness(stderr_texts: List[str], segments: List[Segment],
+                   read_starts: List[float], region_start: float) -> Optional[Dict]:
+    """
+    Loudnorm-style first-pass measurements from per-segment ebur128 output.
+
+    Args:
+        stderr_texts: FFmpeg output per segment (ebur128=peak=true)
+        segments: The (start, end) span each segment is responsible for
+        read_starts: Where each segment's read started (see lookback_start)
+        region_start: Start of the analyzed region
+
+    Returns:
+        Dict with measured_I, measured_LRA, measured_TP, measured_thresh
+        and offset (as strings, like loudnorm's JSON), or None if the
+        output could not be parsed
+    """
+    momentary, short_term, peaks = [], [], []
+    for text, (start, end), read_start in zip(stderr_texts, segments, read_starts):
+        first = round((start - region_start) / BLOCK_STEP_SEC)
+        last = round((end - region_start) / BLOCK_STEP_SEC)
+        frames = 0
+        for match in _FRAME_RE.finditer(text):
+            frames += 1
+            t = float(match.group(1))
+            # Block index on the region grid, counted by the block's end time
+            index = round((read_start + t - region_start) / BLOCK_STEP_SEC)
+            if not first < index <= last:
+                continue
+            if t >= MOMENTARY_SEC - BLOCK_STEP_SEC / 2:
+                momentary.append(float(match.group(2)))
+            if t >= LOOKBACK_SEC - BLOCK_STEP_SEC / 2:
+                short_term.append(float(match.group(3)))
+        peak = _TRUE_PEAK_RE.search(text)
+        if not frames or not peak:
+            return None
+        peaks.append(float(peak.group(1)))
+
+    gated, threshold = _gate(momentary, RELATIVE_GATE)
+    if not gated:
+        # Silence: loudnorm reports the floor of its gate
+        integrated, threshold = ABSOLUTE_GATE, ABSOLUTE_GATE
+    else:
+        energies = _energy(gated)
+        integrated = _lufs(sum(energies) / len(energies))
+
+    lra = 0.0
+    levels, _ = _gate(short_term, LRA_RELATIVE_GATE)
+    if levels:
+        levels.sort()
+        lra = _percentile(levels, 95) - _percentile(levels, 10)
+
+    return {
+        'measured_I': f'{integrated:.2f}',
+        'measured_LRA': f'{lra:.2f}',
+        'measured_TP': f'{max(peaks):.2f}',
+        'measured_thresh': f'{threshold:.2f}',
+        'offset': '0.00'
+    }
@@ -0,0 +1,225 @@
+"""
+Static sharding of one input tree across several machines.
+
+Every node scans the same input tree (e.g. on a shared filesystem) and
+deterministically picks its own subset, so no coordination is needed:
+
+- 'hash': stable hash of the POSIX-style relative path modulo N
+- 'duration': greedy longest-first packing of WAV header durations
+  into N bins of roughly equal total audio time. Durations come from
+  the header alone (or the file size, see scheduler.header_duration),
+  never from ffprobe: a probe that fails or times out on one node would
+  give it a different partition than the others.
+
+Each shard appends one JSON line per finished file to its own journal
+in the output root (.ban-shard-<i>-of-<N>.jsonl). merge_shard_journals()
+then confirms that every input was produced exactly once.
+"""
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, List, Set, Tuple
+
+from .scheduler import header_duration
+
+logger = logging.getLogger(__name__)
+
+SHARD_STRATEGIES = ('hash', 'duration')
+MERGED_JOURNAL_NAME = '.ban-journal.jsonl'
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse a shard spec "i/N" (1-based, e.g. "2/4").
+
+    Returns:
+        (index, count) with 1 <= index <= count
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    try:
+        index_str, count_str = spec.split('/')
+        index, count = int(index_str), int(count_str)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Shard must look like i/N (e.g. 1/4), got {spec!r}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {spec!r}")
+    return index, count
+
+
+def shard_key(file_path: str, input_root: str) -> str:
+    """Relative path with forward slashes, identical on every platform."""
+    return os.path.relpath(file_path, input_root).replace(os.sep, '/')
+
+
+def stable_hash(key: str) -> int:
+    """Hash that, unlike hash(), is the same in every process and on every host."""
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big')
+
+
+def assign_by_hash(files: List[str], input_root: str, count: int) -> Dict[str, int]:
+    """Map each file to a shard (1-based) by hashing its relative path."""
+    return {f: stable_hash(shard_key(f, input_root)) % count + 1 for f in files}
+
+
+def assign_by_duration(files: List[str], input_root: str, count: int) -> Dict[str, int]:
+    """
+    Map each file to a shard (1-based) balancing total audio duration.
+
+    Files are placed longest first onto the least loaded shard; ties are
+    broken by relative path and shard number so every node computes the
+    same assignment.
+    """
+    keyed = []
+    for f in files:
+        duration = header_duration(f)
+        keyed.append((-round(duration, 3), shard_key(f, input_root), f))
+    keyed.sort()
+
+    loads = [0.0] * count
+    assignment = {}
+    for neg_duration, _, f in keyed:
+        target = min(range(count), key=lambda i: (loads[i], i))
+        loads[target] += -neg_duration
+        assignment[f] = target + 1
+
+    logger.info("Shard loads (s): " + ', '.join(f"{i + 1}={load:.1f}" for i, load in enumerate(loads)))
+    return assignment
+
+
+def select_shard(files: List[str], input_root: str, index: int, count: int,
+                 strategy: str = 'hash') -> List[str]:
+    """
+    Return the files that belong to shard index of count.
+
+    Args:
+        files: All input files (from scan_files)
+        input_root: Input directory
+        index: Shard number, 1-based
+        count: Total number of shards
+        strategy: 'hash' or 'duration'
+    """
+    if strategy == 'hash':
+        assignment = assign_by_hash(files, input_root, count)
+    elif strategy == 'duration':
+        assignment = assign_by_duration(files, input_root, count)
+    else:
+        raise ValueError(f"Unknown shard strategy: {strategy}")
+    return [f for f in files if assignment[f] == index]
+
+
+def journal_path(output_root: str, index: int, count: int) -> str:
+    """Path of the journal for one shard."""
+    return os.path.join(output_root, f'.ban-shard-{index}-of-{count}.jsonl')
+
+
+def read_journal(path: str) -> List[Dict]:
+    """Read journal entries, skipping a torn last line from an interrupted run."""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed journal line in {path}")
+    return entries
+
+
+class ShardJournal:
+    """
+    Append-only record of the files one shard has produced.
+
+    Wraps a batch engine emit callback: every successful fileDone event
+    is appended to the journal before being passed on.
+    """
+
+    def __init__(self, path: str, emit):
+        self.path = path
+        self.emit = emit
+        self.done = {entry['rel'] for entry in read_journal(path) if entry.get('ok')}
+
+    def pending(self, files: List[str], input_root: str) -> List[str]:
+        """Files not yet recorded as done (for resuming an interrupted shard)."""
+        return [f for f in files if shard_key(f, input_root) not in self.done]
+
+    def __call__(self, event: str, data: Dict) -> None:
+        if event == 'fileDone' and data.get('result'):
+            result = data['result']
+            rel = result['rel_path'].replace(os.sep, '/')
+            entry = {
+                'rel': rel,
+                'output': result['output_path'],
+                'ok': result['ok'],
+                'elapsed': round(result['elapsed_sec'], 3)
+            }
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            if entry['ok']:
+                self.done.add(rel)
+        self.emit(event, data)
+
+
+def merge_shard_journals(files: List[str], input_root: str, output_root: str,
+                         count: int, write_merged: bool = True) -> Dict:
+    """
+    Check that every input was produced exactly once across all shards.
+
+    Args:
+        files: All input files (from scan_files)
+        input_root: Input directory
+        output_root: Output directory holding the shard journals
+        count: Number of shards
+        write_merged: Write a combined journal when the check passes
+
+    Returns:
+        Report dict with ok, expected, produced, missing, duplicates,
+        unexpected, missingOutputs and missingJournals
+    """
+    expected = {shard_key(f, input_root) for f in files}
+    seen: Dict[str, List[int]] = {}
+    merged: List[Dict] = []
+    missing_journals = []
+
+    for index in range(1, count + 1):
+        path = journal_path(output_root, index, count)
+        if not os.path.exists(path):
+            missing_journals.append(os.path.basename(path))
+            continue
+        for entry in read_journal(path):
+            if not entry.get('ok'):
+                continue
+            seen.setdefault(entry['rel'], []).append(index)
+            merged.append(dict(entry, shard=index))
+
+    produced: Set[str] = set(seen)
+    missing_outputs = sorted(
+        rel for rel in produced & expected
+        if not os.path.exists(os.path.join(output_root, *rel.split('/')))
+    )
+    report = {
+        'ok': False,
+        'expected': len(expected),
+        'produced': len(produced & expected),
+        'missing': sorted(expected - produced),
+        'duplicates': sorted(rel for rel, shards in seen.items() if len(set(shards)) > 1),
+        'unexpected': sorted(produced - expected),
+        'missingOutputs': missing_outputs,
+        'missingJournals': missing_journals
+    }
+    report['ok'] = not (report['missing'] or report['duplicates'] or report['unexpected']
+                        or report['missingOutputs'] or report['missingJournals'])
+
+    if report['ok'] and write_merged:
+        merged.sort(key=lambda entry: entry['rel'])
+        with open(os.path.join(output_root, MERGED_JOURNAL_NAME), 'w', encoding='utf-8') as f:
+            for entry in merged:
+                f.write(json.dumps(entry) + '\n')
+
+    return report
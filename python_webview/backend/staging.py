@@ -0,0 +1,197 @@
+"""
+Local scratch staging for outputs on network shares.
+
+FFmpeg writes output in small chunks, and on an SMB/NFS share each one
+is a network round trip that blocks the process. With a scratch folder
+set, run_batch() renders into a private directory on local disk.
+OutputStager then moves each finished file to its destination on a
+small pool of copier threads, using large transfers (copy_file_range
+where the OS supports it).
+
+Each file is copied to a hidden temporary name next to its destination
+and renamed into place with os.replace(), so readers of the output tree
+never see a partial file. Destination directories are created once per
+batch and remembered. When the files waiting to be copied exceed the
+scratch budget, or the scratch disk runs low, has_space() turns False
+and the batch starts no new files until the copiers catch up.
+
+finished() reports the outcome of each move, so the batch counts a file
+as done only once it is in place and handles a failed move like a failed
+render.
+"""
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCRATCH_LIMIT_MB = 4096
+DEFAULT_COPY_THREADS = 4
+# Keep at least this much free on the scratch disk
+MIN_SCRATCH_FREE_BYTES = 512 * 1024 * 1024
+COPY_CHUNK = 8 * 1024 * 1024
+PARTIAL_PREFIX = '.ban-partial-'
+
+
+def _copy_data(src, dst, size: int) -> None:
+    """Copy `size` bytes between open files, in-kernel if possible."""
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < size:
+                count = os.copy_file_range(src.fileno(), dst.fileno(), min(COPY_CHUNK, size - copied))
+                if count == 0:
+                    break
+                copied += count
+            if copied >= size:
+                return
+        except OSError as e:
+            # Cross-filesystem copies are refused by some kernels and network filesystems
+            logger.debug(f"copy_file_range unavailable ({e}); using buffered copy")
+        src.seek(copied)
+        dst.seek(copied)
+    shutil.copyfileobj(src, dst, COPY_CHUNK)
+
+
+class OutputStager:
+    """
+    Renders land in a scratch directory; copier threads move them to the output tree.
+
+    Use scratch_root as the render output root, submit() each finished
+    file and close() at the end of the batch.
+    """
+
+    def __init__(self, scratch_dir: str, output_root: str,
+                 limit_mb: float = DEFAULT_SCRATCH_LIMIT_MB, copy_threads: int = DEFAULT_COPY_THREADS):
+        os.makedirs(scratch_dir, exist_ok=True)
+        self.scratch_root = tempfile.mkdtemp(prefix='ban-scratch-', dir=scratch_dir)
+        self.output_root = output_root
+        self.limit_bytes = max(1.0, float(limit_mb)) * 1024 * 1024
+        self._cond = threading.Condition()
+        self._pending_bytes = 0
+        self._created_dirs = set()
+        self._dirs_lock = threading.Lock()
+        self._stats = {'files': 0, 'bytes': 0, 'errors': 0, 'copySec': 0.0, 'peakPendingBytes': 0}
+        self._finished = deque()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(copy_threads)),
+                                        thread_name_prefix='copier')
+
+    def has_space(self) -> bool:
+        """True if a new file may be rendered into scratch."""
+        with self._cond:
+            if self._pending_bytes == 0:
+                return True
+            if self._pending_bytes >= self.limit_bytes:
+                return False
+        return shutil.disk_usage(self.scratch_root).free >= MIN_SCRATCH_FREE_BYTES
+
+    def wait_for_space(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds for has_space(); returns its value."""
+        if self.has_space():
+            return True
+        with self._cond:
+            self._cond.wait(timeout)
+        return self.has_space()
+
+    def wait_finished(self, timeout: float) -> None:
+        """Block up to `timeout` seconds until a move has finished and not been collected."""
+        with self._cond:
+            if not self._finished:
+                self._cond.wait(timeout)
+
+    def finished(self) -> List[Tuple[Hashable, Optional[BaseException]]]:
+        """Moves finished since the last call, as (tag, error) pairs; error is None on success."""
+        with self._cond:
+            done = list(self._finished)
+            self._finished.clear()
+        return done
+
+    def submit(self, scratch_file: str, dest_file: str,
+               after_move: Optional[Callable[[], None]] = None, tag: Hashable = None) -> None:
+        """
+        Queue a finished scratch file for its move to `dest_file`.
+
+        Args:
+            scratch_file: Rendered file under scratch_root
+            dest_file: Final path in the output tree
+            after_move: Optional callable run on the copier thread once the
+                file is in place, while the scratch file still exists
+                (e.g. to hash it)
+            tag: Identifies the file in finished() (default: dest_file)
+        """
+        size = os.path.getsize(scratch_file)
+        with self._cond:
+            self._pending_bytes += size
+            self._stats['peakPendingBytes'] = max(self._stats['peakPendingBytes'], self._pending_bytes)
+        self._pool.submit(self._move, scratch_file, dest_file, size, after_move,
+                          dest_file if tag is None else tag)
+
+    def _make_dirs(self, directory: str) -> None:
+        with self._dirs_lock:
+            if directory in self._created_dirs:
+                return
+        os.makedirs(directory, exist_ok=True)
+        with self._dirs_lock:
+            self._created_dirs.add(directory)
+
+    def _move(self, scratch_file: str, dest_file: str, size: int,
+              after_move: Optional[Callable[[], None]], tag: Hashable) -> None:
+        started = time.monotonic()
+        directory, name = os.path.split(dest_file)
+        partial = os.path.join(directory, PARTIAL_PREFIX + name)
+        ok = False
+        error = None
+        try:
+            self._make_dirs(directory)
+            with open(scratch_file, 'rb') as src, open(partial, 'wb') as dst:
+                _copy_data(src, dst, size)
+            os.replace(partial, dest_file)
+            ok = True
+            if after_move is not None:
+                after_move()
+        except Exception as e:
+            if ok:
+                logger.warning(f"Post-move step failed for {dest_file}: {e}")
+            else:
+                logger.error(f"Could not move {scratch_file} to {dest_file}: {e}")
+                error = e
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+        finally:
+            try:
+                os.remove(scratch_file)
+            except OSError:
+                pass
+            with self._cond:
+                self._pending_bytes -= size
+                if ok:
+                    self._stats['files'] += 1
+                    self._stats['bytes'] += size
+                else:
+                    self._stats['errors'] += 1
+                self._stats['copySec'] += time.monotonic() - started
+                self._finished.append((tag, error))
+                self._cond.notify_all()
+
+    def close(self) -> Dict:
+        """
+        Wait for queued moves and remove the scratch directory. The last
+        moves can still be collected with finished().
+
+        Returns:
+            Dict with files, bytes, errors, copySec and peakPendingBytes
+        """
+        self._pool.shutdown(wait=True)
+        shutil.rmtree(self.scratch_root, ignore_errors=True)
+        with self._cond:
+            stats = dict(self._stats)
+        stats['copySec'] = round(stats['copySec'], 3)
+        return stats
@@ -0,0 +1,287 @@
+"""
+Incremental ("sync") runs into an existing output tree.
+
+A normal run wants an empty output folder, so adding a few hundred
+recordings to a large corpus would render everything again. With the
+sync setting on, run_batch() renders only the inputs whose output is
+missing or out of date, make-style.
+
+What each output was made from is kept in an index in the output root
+(.ban-sync.jsonl), one JSON line per rendered file:
+
+    {"rel": "s1/take1.wav", "size": 1234, "mtimeNs": ..., "settings": "<hash>"}
+
+An input is up to date when its index entry matches its current size and
+mtime, the entry's settings hash matches the current settings, and the
+output exists. The check is a dictionary lookup plus the input's stat;
+outputs are never opened (their existence comes from one directory walk
+of the output tree). With syncHash on, an input whose mtime changed but
+whose size did not is compared by content (BLAKE2b) before it is
+re-rendered, e.g. after a copy that did not preserve timestamps.
+
+Only settings that change the rendered audio go into the settings hash
+(see RUNTIME_SETTINGS). Settings left at their defaults and the same
+defaults spelled out hash differently, so keep the settings source
+(flags or --settings file) the same between sync runs.
+
+Orphans are index entries whose input is gone. With syncPrune on, their
+outputs are deleted and the entries dropped; outputs the index does not
+know about are never touched.
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .checksums import hash_file
+from .sharding import read_journal, shard_key
+
+logger = logging.getLogger(__name__)
+
+SYNC_INDEX_NAME = '.ban-sync.jsonl'
+INPUT_HASH = 'blake2b'
+HASH_WORKERS = 2
+
+# Settings that change how fast a batch runs but not what it renders
+RUNTIME_SETTINGS = frozenset((
+    'concurrency', 'schedule', 'ffmpegThreads', 'maxRetries', 'retryBackoffSec',
+    'scratchDir', 'scratchLimitMb', 'copyThreads',
+    'prefetchFiles', 'prefetchMb', 'prefetchCopyDir', 'prefetchCopyMaxMb',
+    'segmentAnalysis', 'segmentSec', 'segmentWorkers', 'multiFile', 'decodeOnce',
+    'checksums', 'checksumInputs', 'verboseLogs',
+    'sync', 'syncPrune', 'syncHash'
+))
+
+# Reasons an input is rendered
+SYNC_NEW = 'new'
+SYNC_CHANGED = 'changed'
+SYNC_SETTINGS = 'settings'
+SYNC_MISSING = 'missingOutput'
+
+
+def settings_hash(settings: Dict) -> str:
+    """Short stable hash of the settings that affect rendered output."""
+    relevant = {key: value for key, value in settings.items() if key not in RUNTIME_SETTINGS}
+    encoded = json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def index_path(output_root: str) -> str:
+    """Path of the sync index in an output tree."""
+    return os.path.join(output_root, SYNC_INDEX_NAME)
+
+
+def read_index(output_root: str) -> Dict[str, Dict]:
+    """Index entries by relative path (later lines win)."""
+    return {entry['rel']: entry for entry in read_journal(index_path(output_root)) if 'rel' in entry}
+
+
+def scan_outputs(output_root: str) -> set:
+    """Relative paths (forward slashes) of the files in an output tree, hidden names excluded."""
+    found = set()
+
+    def walk_dir(dirpath, prefix):
+        try:
+            for entry in os.scandir(dirpath):
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    walk_dir(entry.path, prefix + entry.name + '/')
+                elif entry.is_file():
+                    found.add(prefix + entry.name)
+        except (FileNotFoundError, PermissionError):
+            pass
+
+    walk_dir(output_root, '')
+    return found
+
+
+@dataclass
+class SyncPlan:
+    """What a sync run has to do."""
+    todo: List[str] = field(default_factory=list)
+    reasons: Dict[str, int] = field(default_factory=dict)
+    up_to_date: int = 0
+    orphans: List[str] = field(default_factory=list)
+    stats: Dict[str, os.stat_result] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        """Counts for the sync event and the batch summary."""
+        return {
+            'toRender': len(self.todo),
+            'upToDate': self.up_to_date,
+            'reasons': dict(self.reasons),
+            'orphans': len(self.orphans)
+        }
+
+
+def plan_sync(files: List[str], input_root: str, output_root: str, settings: Dict,
+              index: Optional[Dict[str, Dict]] = None) -> SyncPlan:
+    """
+    Split inputs into up-to-date files and files to render.
+
+    Args:
+        files: All input files (from scan_files)
+        input_root: Input directory
+        output_root: Output directory holding the index
+        settings: Settings of this run
+        index: Index entries (default: read from output_root)
+
+    Returns:
+        SyncPlan with the files to render in input order, counts per
+        reason, orphaned index entries and each input's stat
+    """
+    if index is None:
+        index = read_index(output_root)
+    outputs = scan_outputs(output_root)
+    current = settings_hash(settings)
+    compare_content = settings.get('syncHash', False)
+    plan = SyncPlan()
+    seen = set()
+
+    for file_path in files:
+        rel = shard_key(file_path, input_root)
+        seen.add(rel)
+        try:
+            st = os.stat(file_path)
+        except OSError as e:
+            # Vanished since the scan; let the batch report it
+            logger.warning(f"Could not stat {file_path}: {e}")
+            plan.todo.append(file_path)
+            plan.reasons[SYNC_CHANGED] = plan.reasons.get(SYNC_CHANGED, 0) + 1
+            continue
+        plan.stats[file_path] = st
+
+        entry = index.get(rel)
+        if entry is None:
+            reason = SYNC_NEW
+        elif rel not in outputs:
+            reason = SYNC_MISSING
+        elif entry.get('settings') != current:
+            reason = SYNC_SETTINGS
+        elif entry.get('size') == st.st_size and entry.get('mtimeNs') == st.st_mtime_ns:
+            reason = None
+        elif compare_content and entry.get('size') == st.st_size and entry.get(INPUT_HASH) and \
+                _content_hash(file_path) == entry[INPUT_HASH]:
+            # Same content: take the new mtime so it is not hashed again
+            entry['mtimeNs'] = st.st_mtime_ns
+            reason = None
+        else:
+            reason = SYNC_CHANGED
+
+        if reason is None:
+            plan.up_to_date += 1
+        else:
+            plan.todo.append(file_path)
+            plan.reasons[reason] = plan.reasons.get(reason, 0) + 1
+
+    plan.orphans = sorted(rel for rel in index if rel not in seen)
+    return plan
+
+
+def _content_hash(path: str) -> Optional[str]:
+    try:
+        return hash_file(path, [INPUT_HASH])[INPUT_HASH]
+    except OSError as e:
+        logger.warning(f"Could not hash {path}: {e}")
+        return None
+
+
+def prune_orphans(output_root: str, orphans: List[str], index: Dict[str, Dict]) -> int:
+    """
+    Delete the outputs of orphaned index entries and drop the entries.
+
+    Returns:
+        Number of output files deleted
+    """
+    removed = 0
+    for rel in orphans:
+        output_file = os.path.join(output_root, *rel.split('/'))
+        try:
+            os.remove(output_file)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove orphaned output {output_file}: {e}")
+            continue
+        index.pop(rel, None)
+        # Remove session folders left empty
+        directory = os.path.dirname(output_file)
+        while os.path.normpath(directory) != os.path.normpath(output_root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+    return removed
+
+
+class SyncIndex:
+    """
+    Append-only writer for the sync index.
+
+    Construct it with the entries to keep: the index is rewritten with
+    them first, so lines of earlier runs do not pile up. Call record() as
+    each file is rendered and close() at the end of the batch.
+    """
+
+    def __init__(self, output_root: str, settings: Dict, entries: Dict[str, Dict],
+                 workers: int = HASH_WORKERS):
+        self.path = index_path(output_root)
+        self.settings = settings_hash(settings)
+        self.hash_inputs = settings.get('syncHash', False)
+        self._lock = threading.Lock()
+        self._recorded = 0
+        # Rewrite compacted, then append
+        fd, temp_path = tempfile.mkstemp(prefix='.ban-sync-', dir=output_root)
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+            for entry in entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8', newline='\n')
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='sync-hash') \
+            if self.hash_inputs else None
+
+    def record(self, rel: str, st: Optional[os.stat_result], input_file: str) -> None:
+        """
+        Record a rendered file.
+
+        Args:
+            rel: Relative path (forward slashes)
+            st: The input's stat from before it was rendered, so an input
+                changed during its render is seen as stale next time
+            input_file: Input path (hashed with syncHash on)
+        """
+        if st is None:
+            return
+        entry = {'rel': rel, 'size': st.st_size, 'mtimeNs': st.st_mtime_ns, 'settings': self.settings}
+        if self._pool is not None:
+            self._pool.submit(self._hash_and_write, entry, input_file)
+        else:
+            self._write(entry)
+
+    def _hash_and_write(self, entry: Dict, input_file: str) -> None:
+        digest = _content_hash(input_file)
+        if digest:
+            entry[INPUT_HASH] = digest
+        self._write(entry)
+
+    def _write(self, entry: Dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            self._recorded += 1
+
+    def close(self) -> int:
+        """Wait for pending hashes and close the index; returns entries recorded."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        with self._lock:
+            self._file.close()
+            return self._recorded
@@ -0,0 +1,398 @@
+"""
+Calibration of concurrency x ffmpegThreads.
+
+Runs a short sample of the actual input set at several (concurrency,
+threads) combinations, measures throughput (seconds of audio processed
+per wall-clock second) and peak memory (this process plus its FFmpeg
+children), and keeps the fastest combination. Results are stored in the
+cache directory (tuning.json), keyed by machine (OS, CPU count, RAM,
+FFmpeg build) and input profile (sample format, typical duration, mode),
+so a later batch with "auto" settings reuses them without re-measuring.
+
+Trials dispatch the sample the way run_batch() would: multi-file groups
+when multiFile is on, in schedule order. When only one of the two
+settings is "auto", the other is held at its given value and only the
+"auto" one is searched; the held value is part of the profile key.
+
+Sample outputs go to a temporary folder that is deleted afterwards.
+"""
+import os
+import json
+import time
+import shutil
+import asyncio
+import platform
+import tempfile
+import threading
+import statistics
+import logging
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psutil
+
+from .ffmpeg_paths import get_cache_dir
+from .ffmpeg_caps import get_capabilities
+from .process_manager import process_manager
+from .scheduler import scan_durations, schedule_units
+from .async_executor import run_limited
+from .wav_header import read_wav_header, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+
+logger = logging.getLogger(__name__)
+
+AUTO = 'auto'
+TUNING_FILE_NAME = 'tuning.json'
+# Seconds of audio per trial, raised (up to the max) until every slot gets two files
+SAMPLE_AUDIO_SEC = 60.0
+MAX_SAMPLE_AUDIO_SEC = 900.0
+# Trials within this fraction of the best throughput count as ties (lowest memory wins)
+THROUGHPUT_TOLERANCE = 0.03
+MEMORY_POLL_SEC = 0.05
+# What a batch uses for concurrency/ffmpegThreads when they are not given
+BATCH_DEFAULTS = {'concurrency': 1, 'ffmpegThreads': 0}
+
+
+def needs_tuning(settings: Dict) -> bool:
+    """True if concurrency or ffmpegThreads is set to "auto"."""
+    return settings.get('concurrency') == AUTO or settings.get('ffmpegThreads') == AUTO
+
+
+def held_settings(settings: Dict, use_defaults: bool = True) -> Dict[str, int]:
+    """
+    The concurrency/ffmpegThreads values calibration keeps fixed (those not "auto").
+
+    Args:
+        settings: Processing settings
+        use_defaults: Hold settings that are not given at the batch defaults,
+            as run_batch() would run them; False searches them instead
+            (the tune command without flags)
+    """
+    held = {}
+    for key, default in BATCH_DEFAULTS.items():
+        value = settings.get(key)
+        if value == AUTO or (value is None and not use_defaults):
+            continue
+        held[key] = int(default if value is None else value)
+    return held
+
+
+def default_config() -> Dict:
+    """Configuration used when nothing has been measured: cores - 1 files, one thread each."""
+    return {'concurrency': max(1, (os.cpu_count() or 2) - 1), 'ffmpegThreads': 1}
+
+
+def machine_key() -> str:
+    """Identify this machine and FFmpeg build."""
+    caps = get_capabilities() or {}
+    ram_gb = round(psutil.virtual_memory().total / 2 ** 30)
+    return (f"{platform.system()}-{platform.machine()}-{os.cpu_count() or 1}cpu-{ram_gb}GB-"
+            f"ffmpeg-{caps.get('version', 'unknown')}")
+
+
+def _format_class(file_path: str) -> str:
+    header = read_wav_header(file_path)
+    if header is None:
+        return 'other'
+    if header.audio_format == WAVE_FORMAT_IEEE_FLOAT:
+        return 'float'
+    if header.audio_format == WAVE_FORMAT_PCM:
+        return f'pcm{header.bits_per_sample}'
+    return 'compressed'
+
+
+def _duration_class(seconds: float) -> str:
+    if seconds <= 5:
+        return 'tiny'
+    if seconds <= 60:
+        return 'short'
+    if seconds <= 600:
+        return 'medium'
+    return 'long'
+
+
+def profile_key(files: List[str], durations: Dict[str, float], settings: Dict,
+                held: Optional[Dict[str, int]] = None) -> str:
+    """
+    Describe an input set: dominant sample format, median duration class,
+    the settings that change the per-file work and any held values (see
+    held_settings).
+    """
+    probe = files[:: max(1, len(files) // 50)]  # Headers of at most ~50 files
+    formats = [_format_class(f) for f in probe]
+    dominant = max(set(formats), key=formats.count) if formats else 'other'
+    median = statistics.median(durations.get(f, 0.0) for f in files) if files else 0.0
+    mode = settings.get('normMode', 'peak')
+    extras = ''.join(flag for flag, key in (('+trim', 'autoTrim'), ('+multi', 'multiFile'))
+                     if settings.get(key, False))
+    held = held or {}
+    fixed = ''.join(f"-{prefix}{held[key]}" for prefix, key in (('c', 'concurrency'), ('t', 'ffmpegThreads'))
+                    if key in held)
+    return f"{mode}{extras}-{dominant}-{_duration_class(median)}{fixed}"
+
+
+def candidate_grid(cpu_count: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    (concurrency, ffmpegThreads) pairs to try. 0 threads lets FFmpeg
+    decide; fixed thread counts are skipped when they would put more than
+    two threads per core.
+    """
+    cpus = cpu_count or os.cpu_count() or 1
+    concurrencies = sorted({1, max(1, cpus // 2), max(1, cpus - 1), cpus, cpus * 2})
+    grid = []
+    for concurrency in concurrencies:
+        for threads in (1, 2, 0):
+            if threads and concurrency * threads > 2 * cpus:
+                continue
+            grid.append((concurrency, threads))
+    return grid
+
+
+def pick_sample(files: List[str], durations: Dict[str, float], budget_sec: float,
+                min_files: int) -> List[str]:
+    """
+    Files for one trial: spread across the input set, at most budget_sec
+    of audio in total.
+
+    Returns:
+        The sample, or an empty list if min_files files don't fit the budget
+    """
+    stride = max(1, len(files) // max(1, min_files * 4))
+    sample = []
+    total = 0.0
+    # Walk the set with a stride first so the sample is not just one folder
+    for f in files[::stride] + files:
+        if f in sample:
+            continue
+        duration = durations.get(f, 0.0)
+        if duration <= 0 or total + duration > budget_sec:
+            continue
+        sample.append(f)
+        total += duration
+        if total >= budget_sec * 0.99:
+            break
+    return sample if len(sample) >= min_files else []
+
+
+class _MemoryMonitor:
+    """Track the peak RSS of this process plus its children on a background thread."""
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='tuner-memory', daemon=True)
+
+    def _run(self) -> None:
+        me = psutil.Process()
+        while not self._stop.is_set():
+            total = 0
+            try:
+                for proc in [me] + me.children(recursive=True):
+                    try:
+                        total += proc.memory_info().rss
+                    except psutil.Error:
+                        pass
+            except psutil.Error:
+                pass
+            self.peak = max(self.peak, total)
+            self._stop.wait(MEMORY_POLL_SEC)
+
+    def __enter__(self) -> '_MemoryMonitor':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def measure(sample: List[str], input_root: str, settings: Dict, concurrency: int,
+            threads: int, durations: Dict[str, float]) -> Dict:
+    """
+    Process a sample once with one configuration.
+
+    Returns:
+        Trial dict with concurrency, ffmpegThreads, wallSec,
+        audioSecPerSec, peakMemoryMb and failed
+    """
+    from .batch import aprocess_group
+    from .multi_file import plan_groups
+
+    trial_settings = dict(settings, concurrency=concurrency, ffmpegThreads=threads)
+    output_root = tempfile.mkdtemp(prefix='ban-tune-')
+
+    # Same units and dispatch order as run_batch()
+    if settings.get('multiFile', False):
+        units = plan_groups(sample, trial_settings, durations)
+    else:
+        units = [[f] for f in sample]
+    if concurrency > 1:
+        units, _ = schedule_units(units, durations, concurrency, settings.get('schedule', 'lpt'))
+
+    async def run_all():
+        jobs = [partial(aprocess_group, unit, input_root, output_root, trial_settings,
+                        [os.path.relpath(f, input_root) for f in unit])
+                for unit in units]
+        return [result for group in await run_limited(jobs, concurrency) for result in group]
+
+    try:
+        with _MemoryMonitor() as memory:
+            started = time.monotonic()
+            results = asyncio.run(run_all())
+            wall = time.monotonic() - started
+    finally:
+        shutil.rmtree(output_root, ignore_errors=True)
+
+    audio = sum(durations.get(r.input_path, 0.0) for r in results if r.ok)
+    return {
+        'concurrency': concurrency,
+        'ffmpegThreads': threads,
+        'wallSec': round(wall, 3),
+        'audioSecPerSec': round(audio / wall, 2) if wall > 0 else 0.0,
+        'peakMemoryMb': round(memory.peak / 2 ** 20, 1),
+        'failed': sum(1 for r in results if not r.ok)
+    }
+
+
+def _best(trials: List[Dict], max_memory_mb: Optional[float]) -> Optional[Dict]:
+    usable = [t for t in trials if not t['failed'] and
+              (max_memory_mb is None or t['peakMemoryMb'] <= max_memory_mb)]
+    if not usable:
+        return None
+    top = max(t['audioSecPerSec'] for t in usable)
+    ties = [t for t in usable if t['audioSecPerSec'] >= top * (1 - THROUGHPUT_TOLERANCE)]
+    return min(ties, key=lambda t: (t['peakMemoryMb'], t['concurrency'] * max(1, t['ffmpegThreads'])))
+
+
+def load_tuning() -> Dict:
+    """All stored tuning results ({machine key: {profile key: result}})."""
+    try:
+        with open(get_cache_dir() / TUNING_FILE_NAME, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tuning(machine: str, profile: str, result: Dict) -> None:
+    """Store a tuning result (other machines' and profiles' entries are kept)."""
+    try:
+        path = get_cache_dir() / TUNING_FILE_NAME
+        data = load_tuning()
+        data.setdefault(machine, {})[profile] = result
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write tuning results: {e}")
+
+
+def calibrate(files: List[str], input_root: str, settings: Dict,
+              durations: Optional[Dict[str, float]] = None,
+              candidates: Optional[List[Tuple[int, int]]] = None,
+              budget_sec: float = SAMPLE_AUDIO_SEC, max_memory_mb: Optional[float] = None,
+              log: Optional[Callable[[str], None]] = None,
+              held: Optional[Dict[str, int]] = None) -> Optional[Dict]:
+    """
+    Measure candidate configurations on a sample of files and store the best.
+
+    Args:
+        files: The input set
+        input_root: Input directory
+        settings: Processing settings (concurrency/ffmpegThreads are overridden per trial)
+        durations: Duration per file (read from headers if omitted)
+        candidates: (concurrency, threads) pairs (default: candidate_grid())
+        budget_sec: Seconds of audio per trial (raised for long files, see MAX_SAMPLE_AUDIO_SEC)
+        max_memory_mb: Reject configurations whose peak memory exceeds this
+        log: Optional callback(message) for progress lines
+        held: concurrency/ffmpegThreads values to keep fixed (see
+            held_settings); candidates only vary the others
+
+    Returns:
+        Dict with concurrency, ffmpegThreads, audioSecPerSec, peakMemoryMb,
+        machine, profile, measuredAt and trials, or None if no sample fits
+        the budget, every trial failed, or the batch was canceled
+    """
+    log = log or logger.info
+    durations = durations if durations is not None else scan_durations(files)
+    held = held or {}
+    candidates = candidates or candidate_grid()
+    if held:
+        candidates = list(dict.fromkeys((held.get('concurrency', concurrency), held.get('ffmpegThreads', threads))
+                                        for concurrency, threads in candidates))
+    most_slots = max(concurrency for concurrency, _ in candidates)
+    if files:
+        typical = statistics.median(durations.get(f, 0.0) for f in files)
+        budget_sec = max(budget_sec, min(MAX_SAMPLE_AUDIO_SEC, 2 * most_slots * typical))
+    sample = pick_sample(files, durations, budget_sec, min_files=most_slots)
+    if not sample:
+        log(f"Calibration skipped: {most_slots} files do not fit a {budget_sec:g}s sample")
+        return None
+
+    machine = machine_key()
+    profile = profile_key(files, durations, settings, held)
+    log(f"Calibrating on {len(sample)} files ({sum(durations[f] for f in sample):.1f}s of audio), "
+        f"{len(candidates)} configurations")
+
+    trials = []
+    for concurrency, threads in candidates:
+        if process_manager.is_canceled():
+            return None
+        trial = measure(sample, input_root, settings, concurrency, threads, durations)
+        trials.append(trial)
+        log(f"  concurrency={concurrency} threads={threads or 'auto'}: "
+            f"{trial['audioSecPerSec']:.1f} s/s, peak {trial['peakMemoryMb']:.0f} MB"
+            + (f", {trial['failed']} failed" if trial['failed'] else ''))
+
+    best = _best(trials, max_memory_mb)
+    if best is None:
+        log("Calibration found no usable configuration")
+        return None
+    result = {
+        'concurrency': best['concurrency'],
+        'ffmpegThreads': best['ffmpegThreads'],
+        'audioSecPerSec': best['audioSecPerSec'],
+        'peakMemoryMb': best['peakMemoryMb'],
+        'machine': machine,
+        'profile': profile,
+        'measuredAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'trials': trials
+    }
+    save_tuning(machine, profile, result)
+    log(f"Best: concurrency={result['concurrency']} threads={result['ffmpegThreads'] or 'auto'} "
+        f"({result['audioSecPerSec']:.1f} s/s)")
+    return result
+
+
+def resolve_auto(settings: Dict, files: List[str], input_root: str,
+                 durations: Optional[Dict[str, float]] = None,
+                 log: Optional[Callable[[str], None]] = None,
+                 calibrate_missing: bool = True) -> Tuple[Dict, str]:
+    """
+    Replace "auto" concurrency/ffmpegThreads with concrete values.
+
+    Uses the stored result for this machine and input profile; without
+    one, calibrates on the input set first (if calibrate_missing), and
+    falls back to default_config() if that is not possible. Values that
+    are not "auto" are kept (missing ones get the batch defaults), and
+    calibration holds them fixed.
+
+    Returns:
+        (settings copy with integer values, source: 'stored', 'calibrated' or 'default')
+    """
+    durations = durations if durations is not None else scan_durations(files)
+    held = held_settings(settings)
+    stored = load_tuning().get(machine_key(), {}).get(profile_key(files, durations, settings, held))
+    source = 'stored'
+    if stored is None and calibrate_missing:
+        stored = calibrate(files, input_root, settings, durations, log=log, held=held)
+        source = 'calibrated'
+    if stored is None:
+        stored = default_config()
+        source = 'default'
+
+    resolved = dict(settings, **held)
+    for key in ('concurrency', 'ffmpegThreads'):
+        if resolved.get(key) == AUTO:
+            resolved[key] = stored[key]
+    return resolved, source
@@ -0,0 +1,135 @@
+"""
+Output verification from WAV headers.
+
+After a batch, every output is checked against its input without starting
+FFmpeg: both headers are parsed (see wav_header) and compared for sample
+rate, channel count, duration and the codec choose_output_codec() picks
+for the input. Header reads are a few small reads per file, so they run
+in a thread pool over a bounded window of the file list and a batch of
+hundreds of thousands of outputs verifies in seconds. Problems are
+reported through a callback as soon as each file is checked.
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .wav_header import read_wav_header, WavHeader, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+from .audio_processor import choose_output_codec, format_info_from_header
+
+logger = logging.getLogger(__name__)
+
+# Header reads are I/O bound, so use more threads than cores
+VERIFY_WORKERS = 16
+# Allowed duration difference: 1% of the input, but at least this many seconds
+DURATION_TOLERANCE = 0.01
+MIN_DURATION_TOLERANCE_SEC = 0.05
+
+# Verdicts
+VERIFY_OK = 'ok'
+VERIFY_MISSING = 'missing'
+VERIFY_MISMATCH = 'mismatch'
+
+
+def header_codec(header: WavHeader) -> Optional[str]:
+    """FFmpeg codec name for a PCM or float WAV header, or None for other formats."""
+    if header.audio_format == WAVE_FORMAT_IEEE_FLOAT:
+        return {32: 'pcm_f32le', 64: 'pcm_f64le'}.get(header.bits_per_sample)
+    if header.audio_format == WAVE_FORMAT_PCM:
+        return {8: 'pcm_u8', 16: 'pcm_s16le', 24: 'pcm_s24le', 32: 'pcm_s32le'}.get(header.bits_per_sample)
+    return None
+
+
+def check_output(input_file: str, output_file: str, settings: Dict) -> Tuple[str, List[str]]:
+    """
+    Compare one output with its input.
+
+    Trimming may shorten the output, so with autoTrim on only an output
+    longer than its input is a duration mismatch.
+
+    Returns:
+        (verdict, problems): VERIFY_OK, VERIFY_MISSING or VERIFY_MISMATCH,
+        plus human-readable descriptions of each problem found
+    """
+    if not os.path.exists(output_file):
+        return VERIFY_MISSING, ['missing']
+
+    out_header = read_wav_header(output_file)
+    if out_header is None:
+        return VERIFY_MISMATCH, ['output is not a readable WAV file']
+    in_header = read_wav_header(input_file)
+    if in_header is None:
+        # Nothing to compare against; the output at least parses
+        return VERIFY_OK, []
+
+    problems = []
+    if out_header.sample_rate != in_header.sample_rate:
+        problems.append(f"sample rate {in_header.sample_rate} vs {out_header.sample_rate}")
+    if out_header.channels != in_header.channels:
+        problems.append(f"channels {in_header.channels} vs {out_header.channels}")
+
+    tolerance = max(MIN_DURATION_TOLERANCE_SEC, in_header.duration * DURATION_TOLERANCE)
+    diff = out_header.duration - in_header.duration
+    if diff > tolerance or (diff < -tolerance and not settings.get('autoTrim', False)):
+        problems.append(f"duration {in_header.duration:.2f}s vs {out_header.duration:.2f}s")
+
+    expected = choose_output_codec(settings.get('targetBitDepth', 16), format_info_from_header(in_header))
+    actual = header_codec(out_header)
+    if actual != expected:
+        problems.append(f"codec {expected} expected, got {actual or f'format 0x{out_header.format_tag:04x}'}")
+
+    return (VERIFY_MISMATCH if problems else VERIFY_OK), problems
+
+
+def verify_outputs(pairs: Iterable[Tuple[str, str]], settings: Dict,
+                   on_result: Optional[Callable[[str, str, List[str]], None]] = None,
+                   workers: int = VERIFY_WORKERS) -> Dict[str, int]:
+    """
+    Check (input, output) pairs in a thread pool.
+
+    Only a few pairs per worker are in flight at a time, so `pairs` may
+    be a generator over a very large batch.
+
+    Args:
+        pairs: (input_file, output_file) pairs
+        settings: Processing settings the outputs were rendered with
+        on_result: Optional callback(input_file, verdict, problems), called
+            from this thread as each file finishes
+        workers: Thread count
+
+    Returns:
+        Counts per verdict
+    """
+    counts = {VERIFY_OK: 0, VERIFY_MISSING: 0, VERIFY_MISMATCH: 0}
+    remaining = iter(pairs)
+
+    def check(pair):
+        input_file, output_file = pair
+        try:
+            return input_file, check_output(input_file, output_file, settings)
+        except Exception as e:
+            logger.warning(f"Could not verify {output_file}: {e}")
+            return input_file, (VERIFY_MISMATCH, [f"verification error: {e}"])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = set()
+
+        def submit_next() -> bool:
+            for pair in remaining:
+                pending.add(pool.submit(check, pair))
+                return True
+            return False
+
+        for _ in range(max(1, workers) * 4):
+            if not submit_next():
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                submit_next()
+                input_file, (verdict, problems) = future.result()
+                counts[verdict] += 1
+                if on_result:
+                    on_result(input_file, verdict, problems)
+    return counts
@@ -0,0 +1,137 @@
+"""
+Watchdog deadlines for FFmpeg processes.
+
+Every FFmpeg stage gets a deadline scaled to the seconds of audio it
+processes: a startup grace plus the audio duration times the slowest
+plausible processing rate. Until a stage has been observed the rate is
+assumed to be real time; afterwards it is a multiple of the measured
+wall seconds per audio second, so deadlines tighten to what this machine
+and storage actually deliver.
+
+A process that misses its deadline is assumed to be wedged (e.g. on a
+flaky network share): its tree is killed via ProcessManager and
+FFmpegStalled is raised, which the batch engine retries like other
+transient failures (see failures). Stalls are counted per stage and
+reported in the batch summary.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .process_manager import process_manager
+from .failures import FFmpegStalled
+
+logger = logging.getLogger(__name__)
+
+# Allowance for process startup, probing and disk latency
+STARTUP_GRACE_SEC = 30.0
+# Assumed wall seconds per audio second before a stage has been observed
+DEFAULT_SEC_PER_AUDIO_SEC = 1.0
+# Deadline = this many times the observed rate ...
+OBSERVED_SLACK = 10.0
+# ... but never tighter than 20x real time
+MIN_SEC_PER_AUDIO_SEC = 0.05
+# Runs shorter than this are dominated by startup and not used as observations
+MIN_OBSERVED_AUDIO_SEC = 1.0
+_EWMA_WEIGHT = 0.2
+
+
+class Watchdog:
+    """Per-stage FFmpeg deadlines from audio duration and observed throughput."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates: Dict[str, float] = {}  # stage -> wall seconds per audio second (EWMA)
+        self._stalls: Dict[str, int] = {}
+
+    def deadline(self, stage: str, audio_sec: Optional[float]) -> float:
+        """Timeout in seconds for a stage processing `audio_sec` seconds of audio."""
+        with self._lock:
+            rate = self._rates.get(stage)
+        if rate is None:
+            per_sec = DEFAULT_SEC_PER_AUDIO_SEC
+        else:
+            per_sec = max(MIN_SEC_PER_AUDIO_SEC, rate * OBSERVED_SLACK)
+        return STARTUP_GRACE_SEC + max(0.0, audio_sec or 0.0) * per_sec
+
+    def timeout_for(self, step) -> Optional[float]:
+        """Timeout for an FFmpegRun step: its own, else the stage deadline (None if unstaged)."""
+        if step.timeout is not None:
+            return step.timeout
+        if step.stage is None:
+            return None
+        return self.deadline(step.stage, step.audio_sec)
+
+    def observe(self, stage: Optional[str], audio_sec: Optional[float], elapsed_sec: float) -> None:
+        """Record a completed run of a stage."""
+        if stage is None or not audio_sec or audio_sec < MIN_OBSERVED_AUDIO_SEC:
+            return
+        rate = elapsed_sec / audio_sec
+        with self._lock:
+            previous = self._rates.get(stage)
+            self._rates[stage] = rate if previous is None else previous + _EWMA_WEIGHT * (rate - previous)
+
+    def stalled(self, stage: Optional[str], job_id, timeout_sec: float,
+                audio_sec: Optional[float]) -> FFmpegStalled:
+        """Count a stall and build the exception to raise for it."""
+        stage = stage or 'ffmpeg'
+        with self._lock:
+            self._stalls[stage] = self._stalls.get(stage, 0) + 1
+        logger.warning(f"Watchdog: {stage} for job {job_id} missed its {timeout_sec:.0f}s deadline "
+                       f"({audio_sec or 0:.1f}s of audio); FFmpeg killed")
+        return FFmpegStalled(stage, timeout_sec)
+
+    @contextmanager
+    def guard(self, proc, stage: str, audio_sec: Optional[float], job_id):
+        """
+        Kill `proc`'s tree if the block outlives the stage deadline.
+
+        For processes driven by hand (pipes fed or drained in the block)
+        rather than through run_ffmpeg().
+
+        Raises:
+            FFmpegStalled: If the deadline passed
+        """
+        timeout = self.deadline(stage, audio_sec)
+        fired = threading.Event()
+
+        def expire():
+            fired.set()
+            process_manager.kill_process_tree(proc)
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        started = time.monotonic()
+        timer.start()
+        try:
+            yield
+        except Exception:
+            # Errors from the killed process are reported as the stall
+            if fired.is_set():
+                raise self.stalled(stage, job_id, timeout, audio_sec) from None
+            raise
+        finally:
+            timer.cancel()
+        if fired.is_set():
+            raise self.stalled(stage, job_id, timeout, audio_sec)
+        self.observe(stage, audio_sec, time.monotonic() - started)
+
+    def reset_stalls(self) -> None:
+        """Zero the stall counters (observed rates are kept)."""
+        with self._lock:
+            self._stalls.clear()
+
+    def metrics(self) -> Dict:
+        """Stall counts and observed rates, for batch summaries."""
+        with self._lock:
+            return {
+                'stalls': sum(self._stalls.values()),
+                'stallsByStage': dict(self._stalls),
+                'secPerAudioSec': {stage: round(rate, 4) for stage, rate in self._rates.items()}
+            }
+
+
+# Global watchdog instance
+watchdog = Watchdog()
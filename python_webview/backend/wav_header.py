@@ -0,0 +1,176 @@
+"""
+WAV header parsing shared by every caller that needs file metadata.
+
+Reads only the chunk headers and the fmt/ds64 chunks, seeking past
+everything else (bext, iXML, LIST, JUNK, ...) and never touching the
+sample data, so it costs a handful of small reads regardless of file
+size. Understands:
+- RIFF/WAVE, including odd-sized chunks
+- RF64 and BW64 (>4 GB) via the ds64 chunk
+- WAVE_FORMAT_EXTENSIBLE (0xFFFE), resolving the sub-format GUID to the
+  underlying PCM/float format code
+"""
+import os
+import uuid
+import struct
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# RF64/BW64 put this in 32-bit size fields that live in ds64 instead
+_SIZE_IN_DS64 = 0xFFFFFFFF
+_MAX_CHUNKS = 1024
+_UNCOMPRESSED = (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_ALAW, WAVE_FORMAT_MULAW)
+
+
+class WavHeader(NamedTuple):
+    """Compact description of a WAV file's format and data chunk."""
+    container: str              # 'RIFF', 'RF64' or 'BW64'
+    audio_format: int           # Effective format code (sub-format resolved)
+    format_tag: int             # Raw wFormatTag (0xFFFE for extensible)
+    subformat: Optional[str]    # Sub-format GUID for extensible files
+    channels: int
+    sample_rate: int
+    bits_per_sample: int        # Container bits per sample
+    valid_bits: int             # Significant bits (extensible), else bits_per_sample
+    block_align: int
+    data_offset: int            # File offset of the first sample byte
+    data_size: int              # Bytes of sample data
+    num_frames: int
+    duration: float             # Seconds
+
+    @property
+    def is_float(self) -> bool:
+        return self.audio_format == WAVE_FORMAT_IEEE_FLOAT
+
+    @property
+    def is_pcm(self) -> bool:
+        return self.audio_format == WAVE_FORMAT_PCM
+
+
+def read_wav_header(file_path: str) -> Optional[WavHeader]:
+    """
+    Parse a WAV file's header.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        WavHeader, or None if the file is not a readable WAV file
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            return _parse(f, file_size)
+    except (OSError, struct.error) as e:
+        logger.debug(f"WAV header parse failed for {file_path}: {e}")
+        return None
+
+
+def _parse(f, file_size: int) -> Optional[WavHeader]:
+    riff = f.read(12)
+    if len(riff) < 12 or riff[8:12] != b'WAVE':
+        return None
+    container = riff[0:4].decode('ascii', errors='replace')
+    if container not in ('RIFF', 'RF64', 'BW64'):
+        return None
+
+    fmt = None
+    ds64_data_size = None
+    fact_frames = None
+    pos = 12
+
+    for _ in range(_MAX_CHUNKS):
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            return None
+        chunk_id = chunk_header[0:4]
+        chunk_size = struct.unpack('<I', chunk_header[4:8])[0]
+        body_pos = pos + 8
+
+        if chunk_id == b'ds64':
+            body = f.read(min(chunk_size, 28))
+            if len(body) >= 16:
+                ds64_data_size = struct.unpack('<Q', body[8:16])[0]
+        elif chunk_id == b'fmt ':
+            body = f.read(min(chunk_size, 40))
+            if len(body) < 16:
+                return None
+            fmt = body
+        elif chunk_id == b'fact':
+            body = f.read(min(chunk_size, 4))
+            if len(body) == 4:
+                fact_frames = struct.unpack('<I', body)[0]
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            data_size = chunk_size
+            if data_size == _SIZE_IN_DS64 and ds64_data_size is not None:
+                data_size = ds64_data_size
+            # Streaming writers may leave 0/0xFFFFFFFF; trust the file size then
+            available = max(0, file_size - body_pos)
+            if data_size == 0 or data_size > available:
+                data_size = available
+            return _build(container, fmt, body_pos, data_size, fact_frames)
+
+        pos = body_pos + chunk_size + (chunk_size % 2)
+        if pos >= file_size:
+            return None
+        f.seek(pos)
+
+    return None
+
+
+def _build(container: str, fmt: bytes, data_offset: int, data_size: int,
+           fact_frames: Optional[int] = None) -> WavHeader:
+    format_tag, channels, sample_rate, byte_rate, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    audio_format = format_tag
+    subformat = None
+    valid_bits = bits
+
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 40:
+        valid_bits = struct.unpack('<H', fmt[18:20])[0] or bits
+        guid = fmt[24:40]
+        subformat = str(uuid.UUID(bytes_le=guid))
+        # KSDATAFORMAT_SUBTYPE_* GUIDs carry the plain format code in their first two bytes
+        audio_format = struct.unpack('<H', guid[0:2])[0]
+
+    if not block_align and channels and bits:
+        block_align = channels * ((bits + 7) // 8)
+    if not byte_rate and block_align:
+        byte_rate = block_align * sample_rate
+
+    if audio_format in _UNCOMPRESSED and block_align:
+        num_frames = data_size // block_align
+        duration = num_frames / sample_rate if sample_rate else 0.0
+    elif fact_frames and fact_frames != _SIZE_IN_DS64 and sample_rate:
+        # Compressed (e.g. ADPCM): the fact chunk holds the decoded frame count
+        num_frames = fact_frames
+        duration = num_frames / sample_rate
+    else:
+        # Compressed without a usable fact chunk: estimate from the byte rate
+        duration = data_size / byte_rate if byte_rate else 0.0
+        num_frames = int(round(duration * sample_rate))
+
+    return WavHeader(
+        container=container,
+        audio_format=audio_format,
+        format_tag=format_tag,
+        subformat=subformat,
+        channels=channels,
+        sample_rate=sample_rate,
+        bits_per_sample=bits,
+        valid_bits=valid_bits,
+        block_align=block_align,
+        data_offset=data_offset,
+        data_size=data_size,
+        num_frames=num_frames,
+        duration=duration
+    )
@@ -0,0 +1,190 @@
+"""
+Memory-mapped WAV sample access.
+
+WavReader maps a WAV file's data chunk with numpy.memmap and exposes it
+as a (frames x channels) array view, so reading a span of a multi-GB
+recording touches only the pages that span covers and never copies the
+whole file. Block iteration hands out views of the map; conversion to
+float happens per block, keeping memory bounded by the block size.
+
+Supports PCM 8/16/24/32-bit and IEEE float 32/64-bit (plain, RF64/BW64
+and WAVE_FORMAT_EXTENSIBLE, via wav_header.read_wav_header). 24-bit data
+is mapped as bytes and unpacked to int32 on demand.
+"""
+import logging
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from .wav_header import WavHeader, read_wav_header, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+
+logger = logging.getLogger(__name__)
+
+# (format, bytes per sample) -> (numpy dtype of the mapped samples, full-scale value)
+_SAMPLE_TYPES = {
+    (WAVE_FORMAT_PCM, 1): (np.dtype('u1'), 128.0),
+    (WAVE_FORMAT_PCM, 2): (np.dtype('<i2'), 32768.0),
+    (WAVE_FORMAT_PCM, 3): (np.dtype('u1'), 8388608.0),
+    (WAVE_FORMAT_PCM, 4): (np.dtype('<i4'), 2147483648.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 4): (np.dtype('<f4'), 1.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 8): (np.dtype('<f8'), 1.0),
+}
+
+DEFAULT_BLOCK_FRAMES = 65536
+
+
+def unpack_24(raw: np.ndarray) -> np.ndarray:
+    """
+    Unpack little-endian 24-bit samples to int32.
+
+    Args:
+        raw: uint8 array whose last axis holds the 3 bytes of each sample
+
+    Returns:
+        int32 array with the last axis dropped
+    """
+    raw = np.asarray(raw, dtype=np.uint8)
+    out = np.empty(raw.shape[:-1] + (4,), dtype=np.uint8)
+    out[..., 0] = 0
+    out[..., 1:] = raw
+    # Sample bytes sit in the top 24 bits; an arithmetic shift restores the sign
+    return out.view('<i4')[..., 0] >> 8
+
+
+class WavReader:
+    """
+    Zero-copy reader for the samples of a PCM/float WAV file.
+
+    Usage:
+        with WavReader(path) as reader:
+            for start, block in reader.blocks(48000):
+                ...  # block is a float32 (frames x channels) array
+    """
+
+    def __init__(self, path: str, header: Optional[WavHeader] = None):
+        """
+        Map a WAV file.
+
+        Args:
+            path: Path to the WAV file
+            header: Already-parsed header (read from the file if omitted)
+
+        Raises:
+            ValueError: If the file is not a WAV file or its sample format
+                is not supported
+        """
+        self.path = path
+        self.header = header or read_wav_header(path)
+        if self.header is None:
+            raise ValueError(f"Not a readable WAV file: {path}")
+
+        h = self.header
+        width = h.block_align // h.channels if h.channels else 0
+        sample_type = _SAMPLE_TYPES.get((h.audio_format, width))
+        if sample_type is None or width * h.channels != h.block_align:
+            raise ValueError(f"Unsupported WAV sample format (format {h.audio_format}, "
+                             f"{h.bits_per_sample} bits): {path}")
+        self.sample_width = width
+        self.dtype, self.full_scale = sample_type
+
+        shape = (h.num_frames, h.channels, 3) if width == 3 else (h.num_frames, h.channels)
+        if h.num_frames:
+            self._map = np.memmap(path, dtype=self.dtype, mode='r', offset=h.data_offset, shape=shape)
+        else:
+            self._map = np.empty(shape, dtype=self.dtype)
+
+    @property
+    def channels(self) -> int:
+        return self.header.channels
+
+    @property
+    def sample_rate(self) -> int:
+        return self.header.sample_rate
+
+    @property
+    def num_frames(self) -> int:
+        return self.header.num_frames
+
+    @property
+    def duration(self) -> float:
+        return self.header.duration
+
+    @property
+    def raw(self) -> np.ndarray:
+        """The mapped data chunk (frames x channels, or x 3 bytes for 24-bit)."""
+        return self._map
+
+    def frame_at(self, seconds: float) -> int:
+        """Frame index for a time offset, clamped to the file."""
+        return min(self.num_frames, max(0, int(round(seconds * self.sample_rate))))
+
+    def _span(self, start: int, stop: Optional[int]) -> Tuple[int, int]:
+        stop = self.num_frames if stop is None else min(self.num_frames, stop)
+        start = min(max(0, start), stop)
+        return start, stop
+
+    def raw_frames(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """View of frames [start, stop) in the file's own sample format (no copy)."""
+        start, stop = self._span(start, stop)
+        return self._map[start:stop]
+
+    def to_float(self, raw: np.ndarray, dtype=np.float32) -> np.ndarray:
+        """Convert raw frames from this file to floats in -1..1."""
+        if self.sample_width == 3:
+            samples = unpack_24(raw).astype(dtype)
+        else:
+            samples = raw.astype(dtype)
+        if self.header.audio_format == WAVE_FORMAT_IEEE_FLOAT:
+            return samples
+        if self.sample_width == 1:
+            samples -= 128.0
+        samples *= 1.0 / self.full_scale
+        return samples
+
+    def read(self, start: int = 0, stop: Optional[int] = None, dtype=np.float32) -> np.ndarray:
+        """Frames [start, stop) as floats (frames x channels)."""
+        return self.to_float(self.raw_frames(start, stop), dtype)
+
+    def read_time(self, start_sec: float = 0.0, end_sec: Optional[float] = None,
+                  dtype=np.float32) -> np.ndarray:
+        """Samples between two time offsets as floats (frames x channels)."""
+        stop = None if end_sec is None else self.frame_at(end_sec)
+        return self.read(self.frame_at(start_sec), stop, dtype)
+
+    def blocks(self, block_frames: int = DEFAULT_BLOCK_FRAMES, start: int = 0,
+               stop: Optional[int] = None, raw: bool = False,
+               dtype=np.float32) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Iterate over fixed-size blocks of frames.
+
+        Args:
+            block_frames: Frames per block (the last block may be shorter)
+            start: First frame
+            stop: End frame (exclusive), None for end of file
+            raw: Yield views of the mapped data instead of float copies
+            dtype: Float type for converted blocks
+
+        Yields:
+            (first frame of the block, block array)
+        """
+        start, stop = self._span(start, stop)
+        for block_start in range(start, stop, block_frames):
+            view = self._map[block_start:min(stop, block_start + block_frames)]
+            yield block_start, (view if raw else self.to_float(view, dtype))
+
+    def close(self) -> None:
+        """Release the mapping (raw views handed out earlier keep it alive until dropped)."""
+        mapping = getattr(self._map, '_mmap', None)
+        self._map = None
+        if mapping is not None:
+            try:
+                mapping.close()
+            except BufferError:
+                # Views still reference the map; it is released when they go away
+                pass
+
+    def __enter__(self) -> 'WavReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
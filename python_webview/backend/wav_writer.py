@@ -0,0 +1,98 @@
+"""
+WAV writer for the in-process render engine.
+
+Writes float sample arrays (frames x channels, nominal range -1..1) as a
+plain RIFF/WAVE file in any of the codecs choose_output_codec() can
+return. The header layout follows FFmpeg's WAV muxer (extensible format
+for more than two channels, rates above 48 kHz or more than 16 bits), so
+files rendered in-process look the same as files rendered by FFmpeg.
+"""
+import os
+import struct
+import uuid
+
+import numpy as np
+
+from .wav_header import WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_EXTENSIBLE
+
+# codec -> (format code, bits per sample)
+CODEC_FORMATS = {
+    'pcm_u8': (WAVE_FORMAT_PCM, 8),
+    'pcm_s16le': (WAVE_FORMAT_PCM, 16),
+    'pcm_s24le': (WAVE_FORMAT_PCM, 24),
+    'pcm_s32le': (WAVE_FORMAT_PCM, 32),
+    'pcm_f32le': (WAVE_FORMAT_IEEE_FLOAT, 32),
+    'pcm_f64le': (WAVE_FORMAT_IEEE_FLOAT, 64),
+}
+
+# Default speaker masks for common layouts (0 = unspecified)
+_CHANNEL_MASKS = {1: 0x4, 2: 0x3, 3: 0x7, 4: 0x33, 5: 0x37, 6: 0x3F, 8: 0x63F}
+_MAX_RIFF_DATA = 0xFFFFFFFF - 256
+
+
+def _encode(samples: np.ndarray, codec: str) -> bytes:
+    """Quantize float samples to the codec's sample format (interleaved)."""
+    if codec == 'pcm_f32le':
+        return samples.astype('<f4').tobytes()
+    if codec == 'pcm_f64le':
+        return samples.astype('<f8').tobytes()
+    if codec == 'pcm_u8':
+        return (np.clip(np.rint(samples * 128.0), -128, 127) + 128).astype(np.uint8).tobytes()
+    if codec == 'pcm_s16le':
+        return np.clip(np.rint(samples * 32768.0), -32768, 32767).astype('<i2').tobytes()
+    if codec == 'pcm_s32le':
+        return np.clip(np.rint(samples * 2147483648.0), -2147483648, 2147483647).astype('<i4').tobytes()
+    if codec == 'pcm_s24le':
+        ints = np.clip(np.rint(samples * 8388608.0), -8388608, 8388607).astype('<i4')
+        # Drop the high byte of each little-endian int32
+        return ints.reshape(-1, 1).view(np.uint8)[:, :3].tobytes()
+    raise ValueError(f"Unsupported output codec for in-process render: {codec}")
+
+
+def _fmt_chunk(format_code: int, channels: int, sample_rate: int, bits: int) -> bytes:
+    block_align = channels * bits // 8
+    byte_rate = block_align * sample_rate
+    extensible = channels > 2 or sample_rate > 48000 or bits > 16
+    if not extensible:
+        return struct.pack('<HHIIHH', format_code, channels, sample_rate, byte_rate, block_align, bits)
+    subformat = uuid.UUID(f'{format_code:08x}-0000-0010-8000-00aa00389b71')
+    return struct.pack('<HHIIHHHHI', WAVE_FORMAT_EXTENSIBLE, channels, sample_rate, byte_rate,
+                       block_align, bits, 22, bits, _CHANNEL_MASKS.get(channels, 0)) + subformat.bytes_le
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int, codec: str) -> None:
+    """
+    Write samples to a WAV file.
+
+    Args:
+        path: Output file path (replaced if it exists)
+        samples: Float array of shape (frames, channels)
+        sample_rate: Sample rate in Hz
+        codec: FFmpeg codec name from choose_output_codec()
+
+    Raises:
+        ValueError: If the codec is not a PCM/float WAV codec or the data
+            would not fit a RIFF file
+    """
+    if codec not in CODEC_FORMATS:
+        raise ValueError(f"Unsupported output codec for in-process render: {codec}")
+    format_code, bits = CODEC_FORMATS[codec]
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    channels = samples.shape[1]
+
+    data = _encode(samples, codec)
+    if len(data) > _MAX_RIFF_DATA:
+        raise ValueError("Rendered audio is too large for a RIFF WAV file")
+    fmt = _fmt_chunk(format_code, channels, sample_rate, bits)
+    pad = b'\x00' if len(data) % 2 else b''
+    riff_size = 4 + (8 + len(fmt)) + (8 + len(data) + len(pad))
+
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', riff_size) + b'WAVE')
+        f.write(b'fmt ' + struct.pack('<I', len(fmt)) + fmt)
+        f.write(b'data' + struct.pack('<I', len(data)))
+        f.write(data)
+        f.write(pad)
+    os.replace(tmp_path, path)
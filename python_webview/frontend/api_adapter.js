@@ -173,10 +173,18 @@ window.api = {
     window._batchStartCallback = callback;
   },
 
+  onFileTable: (callback) => {
+    window._fileTableCallback = callback;
+  },
+
   onFileDone: (callback) => {
     window._fileDoneCallback = callback;
   },
 
+  onFileFailed: (callback) => {
+    window._fileFailedCallback = callback;
+  },
+
   onAllDone: (callback) => {
     window._allDoneCallback = callback;
   },
@@ -275,15 +283,27 @@ window.triggerBatchStart = (total) => {
   }
 };
 
+window.triggerFileTable = (files) => {
+  if (window._fileTableCallback) {
+    window._fileTableCallback({ files });
+  }
+};
+
 window.triggerFileDone = (fileId) => {
   if (window._fileDoneCallback) {
     window._fileDoneCallback({ fileId });
   }
 };
 
-window.triggerAllDone = () => {
+window.triggerFileFailed = (fileId, failure, message) => {
+  if (window._fileFailedCallback) {
+    window._fileFailedCallback({ fileId, failure, message });
+  }
+};
+
+window.triggerAllDone = (failed) => {
   if (window._allDoneCallback) {
-    window._allDoneCallback();
+    window._allDoneCallback({ failed });
   }
 };
 
@@ -29,6 +29,8 @@ const overallPct = $('#overallPct');
 const overallCount = $('#overallCount');
 const batchStatus = $('#batchStatus');
 const fileList = $('#fileList');
+const fileSearch = $('#fileSearch');
+const fileListInfo = $('#fileListInfo');
 const logView = $('#logView');
 const btnClearLog = $('#btnClearLog');
 // Preview elements
@@ -68,11 +70,54 @@ window.api.onDebugInfo?.((info) => {
         `ffmpegPath=${info?.ffmpegPath}`,
         `ffprobePath=${info?.ffprobePath}`,
       ];
-      for (const ln of lines) logView.textContent += `[debug] main: ${ln}\n`;
+      for (const ln of lines) appendLog(`[debug] main: ${ln}`);
     }
   } catch {}
 });
 
+// Debug log: a fixed-size ring of lines. Lines are queued and appended once
+// per animation frame as a single text node (chunk); whole chunks are dropped
+// from the front once the view holds more than LOG_MAX_LINES lines, so a long
+// run never re-copies the log text.
+const LOG_MAX_LINES = 5000;
+let logPending = [];
+let logChunks = []; // { node, lines } oldest first
+let logLineCount = 0;
+let logFlushScheduled = false;
+
+function appendLog(line) {
+  logPending.push(line);
+  if (logPending.length > LOG_MAX_LINES) logPending.splice(0, logPending.length - LOG_MAX_LINES);
+  if (!logFlushScheduled) {
+    logFlushScheduled = true;
+    requestAnimationFrame(flushLog);
+  }
+}
+
+function flushLog() {
+  logFlushScheduled = false;
+  if (!logView || !logPending.length) return;
+  const stickToBottom = logView.scrollTop + logView.clientHeight >= logView.scrollHeight - 24;
+  const node = document.createTextNode(logPending.join('\n') + '\n');
+  logView.appendChild(node);
+  logChunks.push({ node, lines: logPending.length });
+  logLineCount += logPending.length;
+  logPending = [];
+  while (logLineCount > LOG_MAX_LINES && logChunks.length > 1) {
+    const oldest = logChunks.shift();
+    oldest.node.remove();
+    logLineCount -= oldest.lines;
+  }
+  if (stickToBottom) logView.scrollTop = logView.scrollHeight;
+}
+
+function clearLog() {
+  logPending = [];
+  logChunks = [];
+  logLineCount = 0;
+  if (logView) logView.textContent = '';
+}
+
 // Settings inputs
 const inLufs = $('#lufsTarget');
 const inPeakTarget = $('#peakTargetDb');
@@ -80,6 +125,7 @@ const chkPeakOnlyBoost = $('#peakOnlyBoost');
 const inTP = $('#tpMargin');
 const inLimiter = $('#limiterLimit');
 const inConc = $('#concurrency');
+const chkAutoTune = $('#autoTune');
 const chkAutoTrim = $('#autoTrim');
 const chkAutoTrimMain = $('#autoTrimMain');
 const inTrimPadMs = $('#trimPadMs');
@@ -98,7 +144,6 @@ let outputDir = '';
 let running = false;
 let paused = false;
 let stopping = false;
-let fileItems = new Map(); // id -> DOM refs
 let autoScrollFiles = true;
 // Resume/session state
 // No resume mode: each Start requires an empty output folder and resets UI
@@ -106,19 +151,18 @@ let autoScrollFiles = true;
 function setSettingsLocked(locked) {
   const ctrls = [
     bitDepthSelect, normModeSelect, inLufs, inPeakTarget, chkPeakOnlyBoost, inTP, inLimiter,
-    inConc, chkAutoTrim, inTrimPadMs, inTrimThresholdDb, inTrimMinDurMs, inTrimMinFileMs, chkTrimConservative,
+    inConc, chkAutoTune, chkAutoTrim, inTrimPadMs, inTrimThresholdDb, inTrimMinDurMs, inTrimMinFileMs, chkTrimConservative,
     chkTrimHPF, chkVerbose, chkFastNormalize, inFfmpegThreads, chkFastTrim
   ];
   ctrls.forEach((el) => { if (el) el.disabled = !!locked; });
 }
 
 function clearUI() {
-  fileList.innerHTML = '';
+  resetFileList();
   overallBar.style.width = '0%';
   overallPct.textContent = '0%';
   overallCount.textContent = '0/0';
-  fileItems.clear();
-  logView.textContent = '';
+  clearLog();
   if (typeof previewList !== 'undefined') previewList.innerHTML = '';
   if (typeof previewInfo !== 'undefined') previewInfo.textContent = '';
   phaseActive.detect = phaseActive.analyze = phaseActive.render = 0;
@@ -165,7 +209,8 @@ function loadSettings() {
     if (s.lufsTarget != null) inLufs.value = s.lufsTarget;
     if (s.tpMargin != null) inTP.value = s.tpMargin;
     if (s.limiterLimit != null) inLimiter.value = s.limiterLimit;
-    if (s.concurrency != null) inConc.value = s.concurrency;
+    if (s.concurrency === 'auto') { if (chkAutoTune) chkAutoTune.checked = true; }
+    else if (s.concurrency != null) inConc.value = s.concurrency;
     if (typeof s.autoTrim === 'boolean') {
       chkAutoTrim.checked = s.autoTrim;
       if (chkAutoTrimMain) chkAutoTrimMain.checked = s.autoTrim;
@@ -178,7 +223,7 @@ function loadSettings() {
     if (typeof s.trimHPF === 'boolean') chkTrimHPF.checked = s.trimHPF;
     if (typeof s.verboseLogs === 'boolean') chkVerbose.checked = s.verboseLogs;
     if (typeof s.fastNormalize === 'boolean') chkFastNormalize.checked = s.fastNormalize;
-    if (s.ffmpegThreads != null) inFfmpegThreads.value = String(s.ffmpegThreads);
+    if (s.ffmpegThreads != null && s.ffmpegThreads !== 'auto') inFfmpegThreads.value = String(s.ffmpegThreads);
     if (typeof s.fastTrim === 'boolean') chkFastTrim.checked = s.fastTrim; else chkFastTrim.checked = true;
     if (s.targetBitDepth != null) bitDepthSelect.value = String(s.targetBitDepth);
     if (s.normMode) normModeSelect.value = s.normMode;
@@ -206,7 +251,7 @@ function currentSettings() {
     peakTargetDb: Number(inPeakTarget.value),
     tpMargin: Number(inTP.value),
     limiterLimit: Number(inLimiter.value),
-    concurrency: Math.max(1, Number(inConc.value || 1)),
+    concurrency: chkAutoTune?.checked ? 'auto' : Math.max(1, Number(inConc.value || 1)),
     autoTrim: !!chkAutoTrim.checked,
     trimPadMs: Math.max(0, Number(inTrimPadMs.value || 0)),
     trimThresholdDb: Number(inTrimThresholdDb.value),
@@ -217,7 +262,7 @@ function currentSettings() {
     trimHPF: !!chkTrimHPF.checked,
     verboseLogs: !!chkVerbose.checked,
     fastNormalize: !!chkFastNormalize.checked,
-    ffmpegThreads: Math.max(0, Number(inFfmpegThreads.value || 0)) || 0,
+    ffmpegThreads: chkAutoTune?.checked ? 'auto' : (Math.max(0, Number(inFfmpegThreads.value || 0)) || 0),
     fastTrim: !!chkFastTrim.checked,
     peakOnlyBoost: !!chkPeakOnlyBoost.checked,
     targetBitDepth: (() => {
@@ -277,7 +322,7 @@ function setRunning(state) {
 }
 
 // Persist settings on change
-[inLufs, inPeakTarget, chkPeakOnlyBoost, inTP, inLimiter, inConc, chkAutoTrim, inTrimPadMs, inTrimThresholdDb, inTrimMinDurMs, inTrimMinFileMs, chkTrimConservative, chkTrimHPF, chkVerbose, chkFastNormalize, inFfmpegThreads, chkFastTrim, bitDepthSelect, normModeSelect].filter(el => el).forEach((el) => el.addEventListener('change', () => {
+[inLufs, inPeakTarget, chkPeakOnlyBoost, inTP, inLimiter, inConc, chkAutoTune, chkAutoTrim, inTrimPadMs, inTrimThresholdDb, inTrimMinDurMs, inTrimMinFileMs, chkTrimConservative, chkTrimHPF, chkVerbose, chkFastNormalize, inFfmpegThreads, chkFastTrim, bitDepthSelect, normModeSelect].filter(el => el).forEach((el) => el.addEventListener('change', () => {
   saveSettings();
   updateAdvancedVisibility();
 }));
@@ -343,6 +388,11 @@ function updateAdvancedVisibility() {
   enableDim('trimConservative', trimOn, 'Disabled because Auto-trim is OFF');
   enableDim('trimHPF', trimOn, 'Disabled because Auto-trim is OFF');
   enableDim('fastTrim', trimOn, 'Disabled because Auto-trim is OFF');
+
+  // Performance controls are chosen by the tuner in auto mode
+  const autoTune = !!(chkAutoTune && chkAutoTune.checked);
+  enableDim('concurrency', !autoTune, 'Chosen automatically (Auto-tune is ON)');
+  enableDim('ffmpegThreads', !autoTune, 'Chosen automatically (Auto-tune is ON)');
 }
 
 // Notice behavior (three levels: min <-> brief <-> full)
@@ -439,12 +489,11 @@ btnStart.addEventListener('click', async () => {
   
   // Clear UI for a fresh run
   console.log('Clearing UI...');
-  fileList.innerHTML = '';
+  resetFileList();
   overallBar.style.width = '0%';
   overallPct.textContent = '0%';
   overallCount.textContent = '0/0';
-  fileItems.clear();
-  logView.textContent = '';
+  clearLog();
   if (typeof previewList !== 'undefined') previewList.innerHTML = '';
   if (typeof previewInfo !== 'undefined') previewInfo.textContent = '';
   phaseActive.detect = phaseActive.analyze = phaseActive.render = 0;
@@ -519,13 +568,32 @@ btnCancel.addEventListener('click', async () => {
 
 // Stop button removed: stopping via app close only
 
-function ensureFileItem(id, name) {
-  if (fileItems.has(id)) return fileItems.get(id);
+// File status: every file's state lives in fileStore; only in-flight files and
+// the FILE_RECENT_DONE most recently finished ones have rows in #fileList
+// (or, while a search is active, the first FILE_SEARCH_LIMIT matches). Rows of
+// files that leave the window are recycled for the next ones.
+const FILE_RECENT_DONE = 50;
+const FILE_SEARCH_LIMIT = 200;
+const FILE_ROW_POOL_MAX = 64;
+const PHASES = ['detect', 'analyze', 'render'];
+const fileStore = new Map(); // id -> { id, name, done, failed, pct: {phase: %}, active: {phase: bool} }
+const fileRows = new Map(); // id -> row element currently in #fileList
+const doneOrder = []; // ids of finished files, oldest first
+const rowPool = [];
+let fileFilter = '';
+let fileTable = []; // fileId -> relative path, sent once per batch
+
+function fileName(id) {
+  return fileTable[id] ?? `File ${id}`;
+}
+
+function createFileRow() {
+  if (rowPool.length) return rowPool.pop();
   const el = document.createElement('div');
   el.className = 'file-item';
   el.innerHTML = `
     <div class="top">
-      <div class="name" title="${name}">${name}</div>
+      <div class="name"></div>
     </div>
     <div class="phase-bars">
       <div class="phase">
@@ -542,16 +610,118 @@ function ensureFileItem(id, name) {
       </div>
     </div>
   `;
-  fileList.appendChild(el);
-  fileItems.set(id, el);
+  el._name = el.querySelector('.name');
+  el._bars = {};
+  PHASES.forEach((phase) => { el._bars[phase] = el.querySelector(`[data-role="phase-${phase}"]`); });
+  return el;
+}
+
+function paintFileBar(row, rec, phase) {
+  const bar = row._bars[phase];
+  bar.style.width = `${rec.pct[phase].toFixed(1)}%`;
+  bar.classList.toggle('active', !!rec.active[phase]);
+}
+
+function paintFileRow(row, rec) {
+  row._name.textContent = rec.name;
+  row._name.title = rec.name;
+  row.classList.toggle('done', rec.done && !rec.failed);
+  row.classList.toggle('error', rec.failed);
+  PHASES.forEach((phase) => paintFileBar(row, rec, phase));
+}
+
+function showFileRow(rec) {
+  if (fileRows.has(rec.id)) return;
+  const row = createFileRow();
+  paintFileRow(row, rec);
+  fileList.appendChild(row);
+  fileRows.set(rec.id, row);
   if (autoScrollFiles) {
     fileList.scrollTop = fileList.scrollHeight;
   }
-  return el;
 }
 
+function hideFileRow(id) {
+  const row = fileRows.get(id);
+  if (!row) return;
+  row.remove();
+  fileRows.delete(id);
+  if (rowPool.length < FILE_ROW_POOL_MAX) rowPool.push(row);
+}
+
+function matchesFileFilter(rec) {
+  return !fileFilter || rec.name.toLowerCase().includes(fileFilter);
+}
+
+function updateFileListInfo() {
+  if (!fileListInfo) return;
+  fileListInfo.textContent = fileStore.size ? `Showing ${fileRows.size} of ${fileStore.size}` : '';
+}
+
+function ensureFileItem(id, name) {
+  let rec = fileStore.get(id);
+  if (rec) return rec;
+  rec = { id, name: String(name), done: false, failed: false, pct: {}, active: {} };
+  PHASES.forEach((phase) => { rec.pct[phase] = 0; rec.active[phase] = false; });
+  fileStore.set(id, rec);
+  if (fileFilter ? matchesFileFilter(rec) && fileRows.size < FILE_SEARCH_LIMIT : true) showFileRow(rec);
+  updateFileListInfo();
+  return rec;
+}
+
+function markFileDone(rec, failed = false) {
+  if (rec.done) return;
+  rec.done = true;
+  rec.failed = failed;
+  PHASES.forEach((phase) => { rec.pct[phase] = 100; rec.active[phase] = false; });
+  const row = fileRows.get(rec.id);
+  if (row) paintFileRow(row, rec);
+  doneOrder.push(rec.id);
+  // Without a search, the finished row that just fell out of the recent window leaves the DOM
+  if (!fileFilter && doneOrder.length > FILE_RECENT_DONE) {
+    hideFileRow(doneOrder[doneOrder.length - FILE_RECENT_DONE - 1]);
+  }
+  updateFileListInfo();
+}
+
+function renderFileList() {
+  Array.from(fileRows.keys()).forEach(hideFileRow);
+  if (fileFilter) {
+    for (const rec of fileStore.values()) {
+      if (fileRows.size >= FILE_SEARCH_LIMIT) break;
+      if (matchesFileFilter(rec)) showFileRow(rec);
+    }
+  } else {
+    const recent = new Set(doneOrder.slice(-FILE_RECENT_DONE));
+    for (const rec of fileStore.values()) {
+      if (!rec.done || recent.has(rec.id)) showFileRow(rec);
+    }
+  }
+  updateFileListInfo();
+}
+
+function resetFileList() {
+  Array.from(fileRows.keys()).forEach(hideFileRow);
+  fileList.innerHTML = '';
+  fileStore.clear();
+  doneOrder.length = 0;
+  fileTable = [];
+  updateFileListInfo();
+}
+
+if (fileSearch) {
+  fileSearch.addEventListener('input', () => {
+    fileFilter = fileSearch.value.trim().toLowerCase();
+    renderFileList();
+  });
+}
+
+window.api.onFileTable(({ files }) => {
+  fileTable = Array.isArray(files) ? files : [];
+});
+
 window.api.onFileStart(({ fileId, name }) => {
-  ensureFileItem(fileId, name);
+  ensureFileItem(fileId, name ?? fileName(fileId));
 });
 
 let batchStartTs = 0;
@@ -588,26 +758,25 @@ window.api.onProgress(({ fileId, filePct, overallPct: oPct, completed, total })
   }
 
   // Lazily create item on first progress signal if needed
-  let itemEl = fileItems.get(fileId);
-  if (!itemEl) itemEl = ensureFileItem(fileId, `File ${fileId}`);
+  ensureFileItem(fileId, fileName(fileId));
   // No per-file overall bar; only phase bars are shown now
 });
 
 window.api.onFileDone(({ fileId }) => {
-  const itemEl = fileItems.get(fileId);
-  if (itemEl) {
-    itemEl.classList.add('done');
-    // Mark all phases complete if not already
-    ['phase-detect','phase-analyze','phase-render'].forEach((role) => {
-      const b = itemEl.querySelector(`[data-role="${role}"]`);
-      if (b) b.style.width = '100%';
-    });
-  }
+  const rec = fileStore.get(fileId);
+  // Marks all phases complete if not already
+  if (rec) markFileDone(rec);
+});
+
+window.api.onFileFailed(({ fileId, failure, message }) => {
+  const rec = ensureFileItem(fileId, fileName(fileId));
+  markFileDone(rec, true);
+  appendLog(`[failed] ${fileName(fileId)}: ${failure}: ${message}`);
 });
 
-window.api.onAllDone(() => {
+window.api.onAllDone(({ failed } = {}) => {
   setRunning(false);
-  batchStatus.textContent = 'Completed';
+  batchStatus.textContent = failed ? `Completed • ${failed} failed (see Debug log)` : 'Completed';
   throttleInfo = '';
   // After a successful run, the output folder is not empty.
   // Keep Start disabled until the user clears the output (no resume allowed).
@@ -648,39 +817,34 @@ window.api.onError(({ message }) => {
 });
 
 window.api.onPhaseEvent(({ fileId, phase, status, pct }) => {
-  const itemEl = fileItems.get(fileId);
-  if (!itemEl) return;
-  const roleMap = { detect: 'phase-detect', analyze: 'phase-analyze', render: 'phase-render' };
-  const role = roleMap[phase];
-  if (!role) return;
-  const bar = itemEl.querySelector(`[data-role="${role}"]`);
-  if (!bar) return;
+  const rec = fileStore.get(fileId);
+  if (!rec || !(phase in rec.pct)) return;
   if (status === 'start') {
-    bar.style.width = '0%';
-    bar.classList.add('active');
+    rec.pct[phase] = 0;
+    rec.active[phase] = true;
     if (phase in phaseActive) phaseActive[phase] = Math.max(0, (phaseActive[phase] || 0) + 1);
     updateBatchStatus();
   } else if (status === 'progress' && Number.isFinite(pct)) {
-    bar.style.width = `${pct.toFixed(1)}%`;
+    rec.pct[phase] = pct;
   } else if (status === 'done') {
-    bar.style.width = '100%';
-    bar.classList.remove('active');
+    rec.pct[phase] = 100;
+    rec.active[phase] = false;
     if (phase in phaseActive) phaseActive[phase] = Math.max(0, (phaseActive[phase] || 0) - 1);
     updateBatchStatus();
+  } else {
+    return;
   }
+  const row = fileRows.get(fileId);
+  if (row) paintFileBar(row, rec, phase);
 });
 
 window.api.onLog(({ fileId, phase, line }) => {
-  // Throttle append by batching might be ideal; for simplicity append directly
   const trimmed = String(line).replace(/\u0000/g, '').trimEnd();
   if (!trimmed) return;
-  logView.textContent += `[${phase}] ${fileId}: ${trimmed}\n`;
-  logView.scrollTop = logView.scrollHeight;
+  appendLog(fileId == null ? `[${phase}] ${trimmed}` : `[${phase}] ${fileName(fileId)}: ${trimmed}`);
 });
 
-btnClearLog.addEventListener('click', () => {
-  logView.textContent = '';
-});
+btnClearLog.addEventListener('click', clearLog);
 
 // Adaptive throttling updates
 window.api.onThrottleEvent?.(({ allowed, base, loadPct, freeMemPct, reason }) => {
@@ -711,7 +875,7 @@ btnPreview.addEventListener('click', async () => {
     const count = Math.max(1, Math.min(50, Number(previewCount.value || 5)));
     
     console.log('Calling startPreview with:', { inputDir, sampleSize: count });
-    const res = await window.api.startPreview({ inputDir, settings: s, sampleSize: count, concurrency: Math.min(2, s.concurrency || 2) });
+    const res = await window.api.startPreview({ inputDir, settings: s, sampleSize: count, concurrency: Math.min(2, Number(s.concurrency) || 2) });
     console.log('startPreview result:', res);
     
     if (!res.ok) {
@@ -7,6 +7,7 @@ Uses pywebview's JS API bridge for direct Python<->JavaScript communication.
 """
 import os
 import sys
+import json
 import logging
 import threading
 import tempfile
@@ -20,8 +21,11 @@ from typing import Dict, List, Optional
 sys.path.insert(0, str(Path(__file__).parent))
 
 from backend.audio_processor import normalize_file, get_duration_seconds
+from backend.batch import scan_files, is_output_empty, run_batch
 from backend.process_manager import process_manager
 from backend.ffmpeg_paths import get_ffmpeg_path, get_ffprobe_path
+from backend.ffmpeg_caps import get_capabilities
+from backend.tuner import needs_tuning, resolve_auto
 
 # Setup logging
 logging.basicConfig(
@@ -65,6 +69,63 @@ def js_escape_path(path: str) -> str:
     return path
 
 
+def js_escape_message(message: str) -> str:
+    """Escape a free-form message for use in a single-quoted JavaScript string."""
+    return str(message).replace("'", "\\'").replace("\n", "\\n").replace('"', '\\"')
+
+
+def emit_to_main_window(event: str, data: Dict) -> None:
+    """
+    Forward a batch engine event to the main window.
+    
+    Maps backend.batch events onto the window.trigger* callbacks
+    defined in frontend/api_adapter.js.
+    """
+    if not main_window:
+        return
+        
+    if event == 'batchStart':
+        main_window.evaluate_js(f"window.triggerBatchStart({data['total']})")
+    elif event == 'fileTable':
+        # Sent once per batch; later events carry only the integer fileId
+        main_window.evaluate_js(f"window.triggerFileTable({json.dumps(data['files'])})")
+    elif event == 'fileStart':
+        main_window.evaluate_js(f"window.triggerFileStart({data['fileId']})")
+    elif event == 'phase':
+        main_window.evaluate_js(
+            f"window.triggerPhaseEvent({data['fileId']}, '{data['phase']}', '{data['status']}', {data['pct']})"
+        )
+    elif event == 'log':
+        message = js_escape_message(data['message'])
+        main_window.evaluate_js(
+            f"window.triggerLog({json.dumps(data['fileId'])}, '{data['phase']}', '{message}')"
+        )
+    elif event == 'fileDone':
+        main_window.evaluate_js(f"window.triggerFileDone({data['fileId']})")
+    elif event == 'progress':
+        main_window.evaluate_js(
+            f"window.triggerProgress({data['fileId']}, {data['filePct']}, {data['overallPct']:.2f}, {data['completed']}, {data['total']})"
+        )
+    elif event == 'requeued':
+        message = js_escape_message(f"{data['failure']} failure, retrying in {data['delaySec']}s: {data['message']}")
+        main_window.evaluate_js(f"window.triggerLog({data['fileId']}, 'retry', '{message}')")
+    elif event == 'fileFailed':
+        message = js_escape_message(data['message'])
+        main_window.evaluate_js(
+            f"window.triggerFileFailed({data['fileId']}, '{data['failure']}', '{message}')"
+        )
+    elif event == 'verifyMismatch':
+        message = js_escape_message(f"{data['verdict']}: {'; '.join(data['problems'])}")
+        main_window.evaluate_js(f"window.triggerLog({data['fileId']}, 'verify', '{message}')")
+    elif event == 'error':
+        error = js_escape_message(data['message'])
+        main_window.evaluate_js(f"window.triggerError('{error}')")
+    elif event == 'stopped':
+        main_window.evaluate_js("window.triggerStopped()")
+    elif event == 'allDone':
+        main_window.evaluate_js(f"window.triggerAllDone({data.get('failed', 0)})")
+
+
 class API:
     """
     API class exposed to JavaScript via pywebview.
@@ -88,9 +149,11 @@ class API:
         try:
             ffmpeg = get_ffmpeg_path()
             ffprobe = get_ffprobe_path()
+            caps = get_capabilities()
             return {
                 'ffmpegPath': ffmpeg,
                 'ffprobePath': ffprobe,
+                'ffmpegVersion': caps['version'] if caps else None,
                 'ffmpegExists': os.path.exists(ffmpeg),
                 'ffprobeExists': os.path.exists(ffprobe)
             }
@@ -106,34 +169,11 @@ class API:
     
     def scan_files(self, input_path):
         """Scan input directory for WAV files."""
-        if not input_path or not os.path.isdir(input_path):
-            return []
-            
-        wav_files = []
-        
-        def walk_dir(dirpath):
-            try:
-                for entry in os.scandir(dirpath):
-                    if entry.is_dir(follow_symlinks=False):
-                        walk_dir(entry.path)
-                    elif entry.is_file() and entry.name.lower().endswith(('.wav', '.wave')):
-                        wav_files.append(entry.path)
-            except PermissionError:
-                pass
-                
-        walk_dir(input_path)
-        return wav_files
+        return scan_files(input_path)
     
     def validate_output_empty(self, output_path):
         """Check if output directory is empty."""
-        if not output_path or not os.path.exists(output_path):
-            return True
-            
-        try:
-            items = [f for f in os.listdir(output_path) if not f.startswith('.')]
-            return len(items) == 0
-        except Exception:
-            return False
+        return is_output_empty(output_path)
     
     def clear_output_folder(self, output_path):
         """Delete all contents of output folder."""
@@ -207,6 +247,8 @@ class API:
     def resume_processing(self):
         """Resume paused batch processing."""
         logger.info("Resuming batch processing...")
+        # Pausing killed the files in flight; let them (and the rest) run again
+        process_manager.reset()
         processing_state['paused'] = False
         return {'ok': True}
     
@@ -296,212 +338,17 @@ class API:
     
     def _process_batch_worker(self, input_path: str, output_path: str, settings: Dict):
         """Worker thread for batch processing."""
-        global main_window
-        
-        try:
-            logger.info(f"Batch worker started: input_path={input_path}, output_path={output_path}")
-            
-            # Scan for files
-            wav_files = self.scan_files(input_path)
-            logger.info(f"Found {len(wav_files)} WAV files")
-            
-            # Filter out already processed files (for resume)
-            if processing_state['processed_files']:
-                unprocessed = [f for f in wav_files if f not in processing_state['processed_files']]
-                logger.info(f"Resuming: {len(unprocessed)} files remaining (already processed: {len(processing_state['processed_files'])})")
-                wav_files = unprocessed
-            
-            # Check if there are files to process
-            if not wav_files:
-                logger.warning("No files to process (all may have been processed already)")
-                if main_window:
-                    main_window.evaluate_js("window.triggerAllDone()")
-                return
-            
-            # Process each file
-            total = processing_state.get('total_files', 0)
-            if not total or total == 0:
-                total = len(wav_files)
-                processing_state['total_files'] = total
-            
-            completed = len(processing_state['processed_files'])
-            
-            # Trigger batch start event
-            if main_window:
-                logger.info(f"Triggering batch start event with {total} files (starting at {completed})")
-                main_window.evaluate_js(f"window.triggerBatchStart({total})")
-            
-            for file_path in wav_files:
-                # Check for stop
-                if not processing_state['running']:
-                    logger.info("Processing stopped by user")
-                    if main_window:
-                        main_window.evaluate_js("window.triggerStopped()")
-                    break
-                
-                # Check for pause
-                while processing_state['paused']:
-                    if not processing_state['running']:  # Stop requested during pause
-                        break
-                    import time
-                    time.sleep(0.5)
-                
-                if not processing_state['running']:
-                    break
-                    
-                try:
-                    # Generate output path
-                    rel_path = os.path.relpath(file_path, input_path)
-                    out_path = os.path.join(output_path, rel_path)
-                    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-                    
-                    file_id = os.path.basename(file_path)
-                    file_name = os.path.basename(file_path)
-                    
-                    logger.info(f"Processing file {completed + 1}/{total}: {file_name}")
-                    
-                    # Trigger file start event
-                    if main_window:
-                        file_name_escaped = file_name.replace("'", "\\'")
-                        file_id_escaped = file_id.replace("'", "\\'")
-                        main_window.evaluate_js(
-                            f"window.triggerFileStart('{file_id_escaped}', '{file_name_escaped}')"
-                        )
-                    
-                    def progress_cb(job_id, phase, status, pct):
-                        if main_window:
-                            main_window.evaluate_js(
-                                f"window.triggerPhaseEvent('{job_id}', '{phase}', '{status}', {pct})"
-                            )
-                            
-                    def log_cb(job_id, phase, message):
-                        if main_window:
-                            message = message.replace("'", "\\'").replace("\n", "\\n").replace('"', '\\"')
-                            main_window.evaluate_js(
-                                f"window.triggerLog('{job_id}', '{phase}', '{message}')"
-                            )
-                            
-                    normalize_file(file_path, out_path, settings, file_id, progress_cb, log_cb)
-                    
-                    # Mark file as processed
-                    processing_state['processed_files'].add(file_path)
-                    completed += 1
-                    
-                    logger.info(f"File complete: {file_name} ({completed}/{total})")
-                    
-                    # Send file done event
-                    if main_window:
-                        file_id_escaped = file_id.replace("'", "\\'")
-                        main_window.evaluate_js(f"window.triggerFileDone('{file_id_escaped}')")
-                    
-                    # Send progress update
-                    overall_pct = (completed / total) * 100  # Keep as float
-                    if main_window:
-                        file_id_escaped = file_id.replace("'", "\\'")
-                        main_window.evaluate_js(
-                            f"window.triggerProgress('{file_id_escaped}', 100, {overall_pct:.2f}, {completed}, {total})"
-                        )
-                        
-                except Exception as e:
-                    logger.error(f"Failed to process {file_path}: {e}")
-                    if main_window:
-                        error = str(e).replace("'", "\\'").replace("\n", "\\n").replace('"', '\\"')
-                        main_window.evaluate_js(
-                            f"window.triggerError('{error}')"
-                        )
-                    break
-            
-            # Processing complete - verify all files
-            if processing_state['running'] and not processing_state['paused']:
-                logger.info(f"Batch processing complete: {completed}/{total} files")
-                logger.info("Verifying output files...")
-                
-                # Verify all files were processed
-                verification_results = self._verify_batch_output(input_path, output_path)
-                
-                if verification_results['missing'] > 0:
-                    # Files are actually missing - this is an error
-                    logger.error(f"✗ Verification failed: {verification_results['missing']} files missing")
-                    if main_window:
-                        error_msg = f"Verification failed: {verification_results['missing']} files not processed"
-                        error_msg_escaped = error_msg.replace("'", "\\'")
-                        main_window.evaluate_js(f"window.triggerError('{error_msg_escaped}')")
-                else:
-                    # No missing files - success (even if there are property mismatches)
-                    logger.info(f"✓ Verification passed: {verification_results['matched']} files processed")
-                    if verification_results['mismatched']:
-                        logger.info(f"Note: {len(verification_results['mismatched'])} files had property differences (expected with trimming/normalization)")
-                    if main_window:
-                        main_window.evaluate_js("window.triggerAllDone()")
-                    
-        except Exception as e:
-            logger.error(f"Batch processing error: {e}")
-            if main_window:
-                error = str(e).replace("'", "\\'").replace("\n", "\\n").replace('"', '\\"')
-                main_window.evaluate_js(f"window.triggerError('{error}')")
-        finally:
-            if not processing_state['paused']:
-                processing_state['running'] = False
-                processing_state['processed_files'].clear()
-                processing_state['total_files'] = 0
-    
-    def _verify_batch_output(self, input_path: str, output_path: str) -> Dict:
-        """Verify that all input files have corresponding output files."""
-        try:
-            from backend.audio_processor import get_audio_info
-            
-            input_files = self.scan_files(input_path)
-            results = {
-                'success': True,
-                'matched': 0,
-                'missing': 0,
-                'mismatched': []
-            }
-            
-            for input_file in input_files:
-                rel_path = os.path.relpath(input_file, input_path)
-                output_file = os.path.join(output_path, rel_path)
-                
-                if not os.path.exists(output_file):
-                    logger.error(f"Missing output file: {rel_path}")
-                    results['success'] = False
-                    results['missing'] += 1
-                    results['mismatched'].append(rel_path)
-                    continue
-                
-                # Verify basic properties match
-                try:
-                    input_info = get_audio_info(input_file)
-                    output_info = get_audio_info(output_file)
-                    
-                    # Check duration matches (within 1%)
-                    duration_diff = abs(input_info['duration'] - output_info['duration'])
-                    if duration_diff > input_info['duration'] * 0.01:
-                        logger.warning(f"Duration mismatch for {rel_path}: {input_info['duration']:.2f}s vs {output_info['duration']:.2f}s")
-                        results['mismatched'].append(f"{rel_path} (duration)")
-                    
-                    # Check sample rate matches
-                    if input_info['sample_rate'] != output_info['sample_rate']:
-                        logger.warning(f"Sample rate mismatch for {rel_path}: {input_info['sample_rate']} vs {output_info['sample_rate']}")
-                        results['mismatched'].append(f"{rel_path} (sample rate)")
-                    
-                    results['matched'] += 1
-                    
-                except Exception as e:
-                    logger.warning(f"Could not verify {rel_path}: {e}")
-                    results['matched'] += 1  # File exists, count as matched
-            
-            return results
-            
-        except Exception as e:
-            logger.error(f"Verification error: {e}")
-            return {'success': False, 'matched': 0, 'missing': 0, 'mismatched': []}
+        run_batch(input_path, output_path, settings, processing_state, emit_to_main_window)
     
     def _preview_worker(self, files: List[str], tmp_base: str, input_base: str, settings: Dict):
         """Worker thread for preview processing."""
         global preview_window
         
         logger.info(f"Preview worker starting: {len(files)} files to process")
+        
+        # Previews are too small to calibrate on; use stored or default values for "auto"
+        if needs_tuning(settings):
+            settings, _ = resolve_auto(settings, files, input_base, calibrate_missing=False)
         logger.info(f"Preview temp directory: {tmp_base}")
         logger.info(f"Input base: {input_base}")
         
@@ -702,6 +549,8 @@ def main():
         ffprobe = get_ffprobe_path()
         logger.info(f"Using FFmpeg: {ffmpeg}")
         logger.info(f"Using FFprobe: {ffprobe}")
+        # One-time capability probe (cached on disk per binary build)
+        get_capabilities()
     except Exception as e:
         logger.error(f"FFmpeg not found: {e}")
         logger.error("Please install FFmpeg or run 'npm install' in the parent directory")
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 """
-Simple test script to verify FFmpeg path resolution.
+Simple test script to verify FFmpeg path resolution, module imports and
+the pure logic of the backend modules.
+
+Runs standalone (python test_setup.py) or under pytest.
 """
+import os
 import sys
+import struct
+import tempfile
 from pathlib import Path
 
 # Add backend to path
@@ -51,6 +57,24 @@ def test_imports():
         'backend.process_manager',
         'backend.audio_processor',
         'backend.ffmpeg_paths',
+        'backend.batch',
+        'backend.cli',
+        'backend.loudness',
+        'backend.wav_reader',
+        'backend.decode_once',
+        'backend.multi_file',
+        'backend.batch_peaks',
+        'backend.async_executor',
+        'backend.scheduler',
+        'backend.tuner',
+        'backend.failures',
+        'backend.watchdog',
+        'backend.verify',
+        'backend.checksums',
+        'backend.staging',
+        'backend.prefetch',
+        'backend.segments',
+        'backend.sync',
         'backend.api',
     ]
     
@@ -66,6 +90,1429 @@ def test_imports():
     return all_ok
 
 
+def _riff_chunk(chunk_id: bytes, body: bytes) -> bytes:
+    """One RIFF chunk, padded to an even size."""
+    return chunk_id + struct.pack('<I', len(body)) + body + (b'\0' if len(body) % 2 else b'')
+
+
+def _pcm_wav(path: str, seconds: float, sample_rate: int = 48000, channels: int = 1, bits: int = 16) -> str:
+    """Write a silent PCM WAV file."""
+    block_align = channels * bits // 8
+    fmt = struct.pack('<HHIIHH', 1, channels, sample_rate, sample_rate * block_align, block_align, bits)
+    body = b'WAVE' + _riff_chunk(b'fmt ', fmt) + \
+        _riff_chunk(b'data', b'\0' * (round(seconds * sample_rate) * block_align))
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+    return path
+
+
+def _passes(check) -> bool:
+    """Run an assert-based check for the standalone runner."""
+    try:
+        check()
+        return True
+    except Exception as e:
+        print(f"✗ {check.__name__}: {e!r}")
+        return False
+
+
+def test_cli():
+    """Test CLI settings parsing and usage-error exit codes (no FFmpeg needed)."""
+    print("\nTesting CLI...")
+
+    import json
+    from backend import cli
+
+    parser = cli.build_parser()
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_file = os.path.join(tmp, 'settings.json')
+        with open(settings_file, 'w') as f:
+            json.dump({'normMode': 'lufs', 'lufsTarget': -18, 'autoTrim': True}, f)
+
+        args = parser.parse_args(['run', 'in', 'out', '--settings', settings_file,
+                                  '--lufs-target', '-20', '--no-auto-trim', '--target-bit-depth', '24'])
+        settings = cli.load_settings(args)
+        assert settings == {'normMode': 'lufs', 'lufsTarget': -20.0, 'autoTrim': False, 'targetBitDepth': 24}
+        assert cli.load_settings(parser.parse_args(['run', 'in', 'out'])) == {}
+        args = parser.parse_args(['run', 'in', 'out', '--target-bit-depth', 'original', '--peak-only-boost'])
+        assert cli.load_settings(args) == {'targetBitDepth': 'original', 'peakOnlyBoost': True}
+        print("✓ Flags override the settings file; --no- flags store False")
+
+        with open(settings_file, 'w') as f:
+            json.dump([1, 2], f)
+        try:
+            cli.load_settings(parser.parse_args(['run', 'in', 'out', '--settings', settings_file]))
+            raise AssertionError("a non-object settings file was accepted")
+        except ValueError:
+            pass
+
+        input_dir, output_dir = os.path.join(tmp, 'in'), os.path.join(tmp, 'out')
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        quiet = ['--log-level', 'error']
+        assert cli.main(quiet + ['run', os.path.join(tmp, 'missing'), output_dir]) == cli.EXIT_USAGE
+        assert cli.main(quiet + ['run', input_dir, input_dir]) == cli.EXIT_USAGE
+        assert cli.main(quiet + ['run', input_dir, output_dir, '--settings', settings_file]) == cli.EXIT_USAGE
+        with open(os.path.join(output_dir, 'old.wav'), 'wb') as f:
+            f.write(b'x')
+        assert cli.main(quiet + ['run', input_dir, output_dir]) == cli.EXIT_USAGE
+        print("✓ Usage errors exit with code 2")
+
+
+def test_lazy_package():
+    """Test that importing the package defers loading the batch engine."""
+    print("\nTesting lazy package exports...")
+
+    import subprocess
+    code = ("import sys, backend; loaded = 'backend.batch' in sys.modules; "
+            "backend.FileResult; print(loaded, 'backend.batch' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', code], cwd=str(Path(__file__).parent),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.split() == ['False', 'True'], output
+    print("✓ backend.batch loads on first use of a re-export")
+
+
+def test_library_api():
+    """Test that process_batch/aprocess_batch report per-file failures as FileResults."""
+    print("\nTesting library API...")
+
+    import asyncio
+    from backend import FileResult, aprocess_batch, process_batch
+
+    result = FileResult('/in/a.wav', '/out/a.wav', 'a.wav')
+    assert result.ok and result.to_dict()['ok'] is True
+    assert not FileResult('/in/a.wav', '/out/a.wav', 'a.wav', canceled=True).ok
+    assert FileResult('/in/a.wav', '/out/a.wav', 'a.wav', error='boom').to_dict()['ok'] is False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_root, output_root = os.path.join(tmp, 'in'), os.path.join(tmp, 'out')
+        os.makedirs(os.path.join(input_root, 'sub'))
+        os.makedirs(output_root)
+        bad = os.path.join(input_root, 'sub', 'bad.wav')
+        with open(bad, 'wb') as f:
+            f.write(b'not a wav file')
+
+        results = list(process_batch(input_root, output_root, {}, files=[bad]))
+        assert len(results) == 1 and not results[0].ok and results[0].error
+        assert results[0].rel_path == os.path.join('sub', 'bad.wav')
+
+        async def collect():
+            return [r async for r in aprocess_batch(input_root, output_root, {}, files=[bad], concurrency=2)]
+        results = asyncio.run(collect())
+        assert len(results) == 1 and not results[0].ok
+        print("✓ A broken file yields a failed FileResult instead of raising")
+
+
+def test_sharding():
+    """Test shard specs, deterministic assignment and the journal merge check."""
+    print("\nTesting sharding...")
+
+    import json
+    from backend import sharding
+
+    assert sharding.parse_shard('2/4') == (2, 4)
+    for spec in ('0/4', '5/4', '1/0', '1-4', 'a/b', None):
+        try:
+            sharding.parse_shard(spec)
+            raise AssertionError(f"accepted {spec!r}")
+        except ValueError:
+            pass
+    print("✓ parse_shard validates i/N")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_root, output_root = os.path.join(tmp, 'in'), os.path.join(tmp, 'out')
+        os.makedirs(os.path.join(input_root, 'sub'))
+        os.makedirs(os.path.join(output_root, 'sub'))
+        seconds = {'a.wav': 8, 'b.wav': 5, 'sub/c.wav': 4, 'sub/d.wav': 3, 'e.wav': 1}
+        files = [_pcm_wav(os.path.join(input_root, *rel.split('/')), sec, sample_rate=8000)
+                 for rel, sec in seconds.items()]
+
+        by_hash = sharding.assign_by_hash(files, input_root, 3)
+        assert by_hash == sharding.assign_by_hash(list(reversed(files)), input_root, 3)
+        shards = [sharding.select_shard(files, input_root, i, 3) for i in (1, 2, 3)]
+        assert sorted(f for shard in shards for f in shard) == sorted(files)
+
+        # Longest first onto the least loaded shard: 8, 3 | 5, 4, 1
+        by_duration = sharding.assign_by_duration(files, input_root, 2)
+        loads = {1: 0, 2: 0}
+        for f, shard in by_duration.items():
+            loads[shard] += seconds[sharding.shard_key(f, input_root)]
+        assert sorted(loads.values()) == [10, 11], loads
+        assert sharding.select_shard(files, input_root, 1, 2, 'duration') == \
+            [f for f in files if by_duration[f] == 1]
+        try:
+            sharding.select_shard(files, input_root, 1, 2, 'size')
+            raise AssertionError("accepted an unknown strategy")
+        except ValueError:
+            pass
+        print("✓ Hash and duration assignments cover every file exactly once")
+
+        # Two shards journal their files; the merge confirms every input was produced once
+        events = []
+        for index in (1, 2):
+            journal = sharding.ShardJournal(sharding.journal_path(output_root, index, 2),
+                                            lambda event, data: events.append(event))
+            for f in sharding.select_shard(files, input_root, index, 2, 'duration'):
+                rel = os.path.relpath(f, input_root)
+                out = os.path.join(output_root, rel)
+                with open(out, 'wb') as fh:
+                    fh.write(b'x')
+                journal('fileDone', {'result': {'rel_path': rel, 'output_path': out, 'ok': True,
+                                                'elapsed_sec': 0.5}})
+            assert journal.pending(files, input_root) == \
+                [f for f in files if by_duration[f] != index]
+        assert events == ['fileDone'] * len(files)
+
+        report = sharding.merge_shard_journals(files, input_root, output_root, 2)
+        assert report['ok'] and report['produced'] == len(files), report
+        merged = sharding.read_journal(os.path.join(output_root, sharding.MERGED_JOURNAL_NAME))
+        assert [entry['rel'] for entry in merged] == sorted(seconds)
+        print("✓ merge_shard_journals accepts a complete run")
+
+        # A file journaled by both shards, a missing output and a missing input
+        with open(sharding.journal_path(output_root, 2, 2), 'a') as f:
+            f.write(json.dumps({'rel': 'a.wav', 'output': '', 'ok': True}) + '\n')
+            f.write('{"rel": "torn')
+        os.remove(os.path.join(output_root, 'e.wav'))
+        report = sharding.merge_shard_journals(files + [os.path.join(input_root, 'new.wav')],
+                                               input_root, output_root, 2)
+        assert not report['ok']
+        assert report['duplicates'] == ['a.wav'] and report['missing'] == ['new.wav']
+        assert report['missingOutputs'] == ['e.wav'] and report['missingJournals'] == []
+        assert sharding.merge_shard_journals(files, input_root, output_root, 3)['missingJournals'] == \
+            ['.ban-shard-1-of-3.jsonl', '.ban-shard-2-of-3.jsonl', '.ban-shard-3-of-3.jsonl']
+        print("✓ Duplicates, missing files and missing journals are reported")
+
+
+def test_sharding_header_durations():
+    """Test that duration sharding estimates files without a WAV header from their size."""
+    print("\nTesting duration sharding without ffprobe...")
+
+    from backend import sharding
+    from backend.scheduler import FALLBACK_BYTES_PER_SEC
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [_pcm_wav(os.path.join(tmp, 'a.wav'), 8, sample_rate=8000),
+                 _pcm_wav(os.path.join(tmp, 'b.wav'), 2, sample_rate=8000)]
+        junk = os.path.join(tmp, 'junk.wav')
+        with open(junk, 'wb') as f:
+            f.write(b'\x01' * FALLBACK_BYTES_PER_SEC * 7)
+        files.append(junk)
+
+        assignment = sharding.assign_by_duration(files, tmp, 2)
+        assert assignment == {files[0]: 1, junk: 2, files[1]: 2}, assignment
+        print("✓ A headerless file counts as size / 176400 seconds")
+
+
+def test_coordinator():
+    """Test coordinator leases: expiry, worker loss, retries and the final summary."""
+    print("\nTesting coordinator leases...")
+
+    import socket
+    import time
+    from backend.distributed import Coordinator, parse_address
+
+    assert parse_address('10.0.0.5:7070') == (socket.AF_INET, ('10.0.0.5', 7070))
+    assert parse_address(':7070') == (socket.AF_INET, ('127.0.0.1', 7070))
+    for address in ('host', 'host:port', 'unix:'):
+        try:
+            parse_address(address)
+            raise AssertionError(f"accepted {address!r}")
+        except ValueError:
+            pass
+
+    events = []
+    files = [os.path.join('/in', 'a.wav'), os.path.join('/in', 'b.wav')]
+    coordinator = Coordinator(files, '/in', '/out', {}, lambda event, data: events.append((event, data)),
+                              lease_timeout=0.3, max_attempts=2)
+    assert coordinator.next_item('w1') == {'type': 'work', 'id': 0, 'rel': 'a.wav'}
+    assert coordinator.next_item('w2') == {'type': 'work', 'id': 1, 'rel': 'b.wav'}
+    assert coordinator.next_item('w3')['type'] == 'wait'
+
+    # A lost worker's file goes back to the front of the queue; its late result is refused
+    coordinator.worker_left('w2')
+    assert events[-1] == ('workerLeft', {'worker': 'w2', 'requeued': [1]})
+    assert not coordinator.complete('w2', 1, {'ok': False, 'error': 'late'})
+
+    # A failed attempt is retried while attempts remain
+    assert coordinator.complete('w1', 0, {'ok': False, 'error': 'boom'})
+    assert events[-1][0] == 'requeued'
+    assert coordinator.next_item('w1')['id'] == 0
+    assert coordinator.next_item('w3')['id'] == 1
+
+    # Heartbeats keep a lease; silence lets it expire
+    time.sleep(0.2)
+    coordinator.heartbeat('w1', 0)
+    time.sleep(0.2)
+    coordinator.reap_expired()
+    assert ('leaseExpired', {'fileId': 1, 'worker': 'w3'}) in events
+    assert 0 in coordinator.leases and not coordinator.finished
+    time.sleep(0.4)
+    coordinator.reap_expired()
+    assert coordinator.finished and coordinator.next_item('w1') == {'type': 'done'}
+    summary = coordinator.summary()
+    assert summary['total'] == 2 and summary['completed'] == 0 and summary['failed'] == 2
+    assert summary['failures'] == {'a.wav': 'lease expired', 'b.wav': 'lease expired'}
+    print("✓ Expired and orphaned leases are re-dispatched until max_attempts")
+
+    assert Coordinator([], '/in', '/out', {}, lambda event, data: None).finished
+
+
+def test_coordinator_cancel():
+    """Test that canceled results count against max_attempts."""
+    print("\nTesting coordinator cancel retries...")
+
+    from backend.distributed import Coordinator
+
+    events = []
+    coordinator = Coordinator([os.path.join('/in', 'sub', 'a.wav')], '/in', '/out', {},
+                              lambda event, data: events.append(event), max_attempts=2)
+    for _ in range(2):
+        item = coordinator.next_item('w1')
+        assert item['rel'] == 'sub/a.wav'
+        assert coordinator.complete('w1', item['id'], {'ok': False, 'canceled': True})
+    assert events == ['fileStart', 'requeued', 'fileStart', 'fileFailed'] and coordinator.finished
+    print("✓ A file canceled on every attempt fails instead of looping")
+
+
+def test_coordinator_moves():
+    """Test that a file counts as done only once its worker reports the move."""
+    print("\nTesting coordinator result moves...")
+
+    from backend.distributed import Coordinator, _item_id
+
+    assert _item_id({'id': 3}) == 3
+    assert _item_id({}) is None and _item_id({'id': '3'}) is None and _item_id({'id': True}) is None
+
+    events = []
+    coordinator = Coordinator([os.path.join('/in', 'a.wav')], '/in', '/out', {},
+                              lambda event, data: events.append(event), max_attempts=2)
+    coordinator.next_item('w1')
+    assert coordinator.complete('w1', 0, {'ok': True})
+    assert 'fileDone' not in events and not coordinator.finished
+    assert not coordinator.moved('w2', 0)
+
+    # A failed move is retried like any other failure
+    assert coordinator.moved('w1', 0, 'disk full')
+    assert events[-1] == 'requeued' and not coordinator.moved('w1', 0)
+    coordinator.next_item('w1')
+    assert coordinator.complete('w1', 0, {'ok': True})
+    assert coordinator.moved('w1', 0)
+    assert events[-1] == 'fileDone' and coordinator.finished
+    assert coordinator.summary()['completed'] == 1
+    print("✓ fileDone waits for the move; failed moves are retried")
+
+
+def test_wav_header():
+    """Test header parsing: odd chunks, RF64/ds64, extensible."""
+    print("\nTesting WAV header parsing...")
+
+    from backend.wav_header import read_wav_header, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_EXTENSIBLE
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def write(name, data):
+            path = os.path.join(tmp, name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            return path
+
+        # 16-bit stereo PCM behind an odd-sized LIST chunk
+        fmt = struct.pack('<HHIIHH', WAVE_FORMAT_PCM, 2, 48000, 48000 * 4, 4, 16)
+        body = b'WAVE' + _riff_chunk(b'LIST', b'abc') + _riff_chunk(b'fmt ', fmt) + \
+            _riff_chunk(b'data', b'\0' * 4 * 4800)
+        header = read_wav_header(write('pcm.wav', b'RIFF' + struct.pack('<I', len(body)) + body))
+        assert header is not None and header.container == 'RIFF'
+        assert (header.channels, header.sample_rate, header.bits_per_sample) == (2, 48000, 16)
+        assert header.num_frames == 4800 and abs(header.duration - 0.1) < 1e-9
+        print("✓ RIFF with an odd-sized chunk")
+
+        # RF64: the real data size lives in ds64
+        data = b'\0' * 4 * 9600
+        ds64 = struct.pack('<QQQI', 0, len(data), 0, 0)
+        body = b'WAVE' + _riff_chunk(b'ds64', ds64) + _riff_chunk(b'fmt ', fmt) + \
+            b'data' + struct.pack('<I', 0xFFFFFFFF) + data
+        header = read_wav_header(write('rf64.wav', b'RF64' + struct.pack('<I', 0xFFFFFFFF) + body))
+        assert header is not None and header.container == 'RF64'
+        assert header.data_size == len(data) and header.num_frames == 9600
+        print("✓ RF64 data size from ds64")
+
+        # WAVE_FORMAT_EXTENSIBLE with the IEEE float sub-format, 24 valid bits in 32
+        guid = struct.pack('<H', WAVE_FORMAT_IEEE_FLOAT) + bytes.fromhex('00000000001000800000aa00389b71')
+        fmt_ext = struct.pack('<HHIIHH', WAVE_FORMAT_EXTENSIBLE, 1, 44100, 44100 * 4, 4, 32) + \
+            struct.pack('<HHI', 22, 24, 4) + guid
+        body = b'WAVE' + _riff_chunk(b'fmt ', fmt_ext) + _riff_chunk(b'data', b'\0' * 4 * 441)
+        header = read_wav_header(write('ext.wav', b'RIFF' + struct.pack('<I', len(body)) + body))
+        assert header is not None and header.format_tag == WAVE_FORMAT_EXTENSIBLE
+        assert header.audio_format == WAVE_FORMAT_IEEE_FLOAT and header.is_float
+        assert header.valid_bits == 24 and header.num_frames == 441
+        print("✓ Extensible sub-format resolved")
+
+        assert read_wav_header(write('junk.wav', b'not a wav file at all')) is None
+        assert read_wav_header(os.path.join(tmp, 'missing.wav')) is None
+        print("✓ Non-WAV and missing files rejected")
+
+
+def test_ffmpeg_caps():
+    """Test parsing of the FFmpeg capability tables and lookups against a known probe."""
+    print("\nTesting FFmpeg capabilities...")
+
+    from backend import ffmpeg_caps
+
+    filters = """Filters:
+  T.. = Timeline support
+  .S. = Slice threading
+  ... = Source or sink filter
+ TSC acompressor       A->A       Audio compressor.
+ ... aresample         A->A       Resample audio data.
+ T.. loudnorm          A->A       EBU R128 loudness normalization
+"""
+    encoders = """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ A....D pcm_s16le            PCM signed 16-bit little-endian
+ A....D flac                 FLAC (Free Lossless Audio Codec)
+ V....D rawvideo             raw video
+"""
+    assert ffmpeg_caps._parse_table(filters, 3) == {'acompressor': 'TSC', 'aresample': '...', 'loudnorm': 'T..'}
+    assert ffmpeg_caps._parse_table(encoders, 6) == {'pcm_s16le': 'A....D', 'flac': 'A....D',
+                                                     'rawvideo': 'V....D'}
+    print("✓ -filters/-encoders tables parse without legend lines")
+
+    assert ffmpeg_caps._cache_key(os.path.join(tempfile.gettempdir(), 'no-such-ffmpeg')) is None
+    saved = ffmpeg_caps._capabilities, ffmpeg_caps._probed
+    try:
+        ffmpeg_caps._capabilities = {'path': 'ffmpeg', 'version': '6.1', 'filters': ['loudnorm'],
+                                     'encoders': ['pcm_s16le']}
+        ffmpeg_caps._probed = True
+        assert ffmpeg_caps.has_filter('loudnorm') and not ffmpeg_caps.has_filter('silencedetect')
+        assert ffmpeg_caps.has_encoder('pcm_s16le') and not ffmpeg_caps.has_encoder('flac')
+        ffmpeg_caps._capabilities = None
+        assert ffmpeg_caps.has_filter('anything') and ffmpeg_caps.has_encoder('anything')
+    finally:
+        ffmpeg_caps._capabilities, ffmpeg_caps._probed = saved
+    print("✓ Lookups use the probe; unknown capabilities count as available")
+
+
+def test_ffmpeg_caps_retry():
+    """Test that a failed probe is not cached and that resetting the toolchain resets capabilities."""
+    print("\nTesting FFmpeg capability probe failures...")
+
+    from backend import ffmpeg_caps, ffmpeg_paths
+
+    probes = []
+
+    def failing_probe(ffmpeg):
+        probes.append(ffmpeg)
+        raise OSError("cannot execute")
+
+    saved = ffmpeg_caps.get_ffmpeg_path, ffmpeg_caps.probe_capabilities
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = os.path.join(tmp, 'ffmpeg')
+        with open(fake, 'wb') as f:
+            f.write(b'not a binary')
+        ffmpeg_caps.reset_capabilities()
+        try:
+            ffmpeg_caps.get_ffmpeg_path = lambda: fake
+            ffmpeg_caps.probe_capabilities = failing_probe
+            assert ffmpeg_caps.get_capabilities() is None and ffmpeg_caps.get_capabilities() is None
+            assert len(probes) == 1 and not ffmpeg_caps._probed
+            # A replaced binary is probed again
+            os.utime(fake, ns=(10 ** 18, 10 ** 18))
+            assert ffmpeg_caps.get_capabilities() is None and len(probes) == 2
+
+            ffmpeg_caps._probed = True
+            ffmpeg_paths.reset_toolchain_cache()
+            assert not ffmpeg_caps._probed and ffmpeg_caps._failed_key is None
+        finally:
+            ffmpeg_caps.get_ffmpeg_path, ffmpeg_caps.probe_capabilities = saved
+            ffmpeg_caps.reset_capabilities()
+    print("✓ Failed probes are retried for a new binary; reset_toolchain_cache clears them")
+
+
+def test_lufs_render():
+    """Test the linear-vs-loudnorm decision for LUFS rendering."""
+    print("\nTesting LUFS render choice...")
+
+    from backend.audio_processor import LOUDNORM_LRA, choose_lufs_render
+
+    # loudnorm reports its measurements as strings
+    params = {'measured_I': '-20.0', 'measured_TP': '-6.0', 'measured_LRA': '5.0'}
+    assert choose_lufs_render(params, -16, -1.0) == ('linear', 4.0)
+    # The gained true peak lands exactly on the ceiling, then just over it
+    assert choose_lufs_render(params, -15, -1.0) == ('linear', 5.0)
+    assert choose_lufs_render(params, -14.9, -1.0)[0] == 'dynamic'
+    # A loudness range wider than the target needs the dynamic path
+    wide = dict(params, measured_LRA=str(LOUDNORM_LRA + 0.1))
+    assert choose_lufs_render(wide, -16, -1.0) == ('dynamic', 4.0)
+    assert choose_lufs_render(wide, -16, -1.0, target_lra=12) == ('linear', 4.0)
+    print("✓ Linear gain only when LRA and the gained true peak fit the targets")
+
+    assert choose_lufs_render(None, -16, -1.0) == ('dynamic', None)
+    assert choose_lufs_render(dict(params, measured_TP='-inf'), -16, -1.0) == ('linear', 4.0)
+    assert choose_lufs_render(dict(params, measured_I='nan?'), -16, -1.0) == ('dynamic', None)
+    assert choose_lufs_render(dict(params, measured_I='-70.0'), -16, -1.0) == ('dynamic', None)
+    print("✓ Missing, unparsable and silent measurements fall back to loudnorm")
+
+
+def test_loudness():
+    """Test the NumPy LUFS meter and true-peak limiter."""
+    print("\nTesting in-process loudness...")
+
+    from backend import loudness
+    if not loudness.HAVE_NUMPY:
+        print("- NumPy not installed, skipped")
+        return
+    import numpy as np
+
+    sr = 48000
+    t = np.arange(sr * 10) / sr
+    # BS.1770 calibration: a 1 kHz sine at -20 dBFS in one channel reads -23.0 LUFS
+    sine = (0.1 * np.sin(2 * np.pi * 1000 * t))[:, np.newaxis]
+    measured = loudness.measure(sine, sr)
+    assert abs(measured['measured_I'] - (-23.0)) < 0.05, measured
+    assert measured['measured_LRA'] < 0.1
+    assert abs(measured['measured_TP'] - (-20.0)) < 0.1
+    print(f"✓ 1 kHz at -20 dBFS: {measured['measured_I']:.2f} LUFS")
+
+    assert loudness.measure(np.zeros((sr, 1)), sr)['measured_I'] is None
+    print("✓ Silence is below the gates")
+
+    # The limiter keeps the gained true peak under the ceiling
+    amp, ceiling = 20.0, 0.5
+    envelope = loudness.true_peak_envelope(sine * amp)
+    gain = loudness.limiter_gain(envelope, ceiling, sr)
+    assert (envelope * gain).max() <= ceiling + 1e-9
+    assert gain.min() > 0 and gain.max() <= 1.0
+    print("✓ Limiter holds the ceiling")
+
+
+def test_loudness_blocks():
+    """Test block-wise loudness measurement and limiting against the whole-array versions."""
+    print("\nTesting block-wise loudness...")
+
+    from backend import loudness
+    if not loudness.HAVE_NUMPY:
+        print("- NumPy not installed, skipped")
+        return
+    import numpy as np
+
+    sr = 48000
+    t = np.arange(sr * 10) / sr
+    sine = (0.1 * np.sin(2 * np.pi * 1000 * t))[:, np.newaxis]
+
+    # A level step widens the loudness range; block-wise measurement agrees
+    stepped = np.concatenate([sine[:sr * 5] * 0.1, sine[sr * 5:]])
+    whole = loudness.measure(stepped, sr)
+    blocks = loudness.measure_blocks(stepped.astype(np.float32), sr, block_frames=50000)
+    assert whole['measured_LRA'] > 15
+    for key in ('measured_I', 'measured_LRA', 'measured_TP'):
+        assert abs(whole[key] - blocks[key]) < 0.01, (key, whole[key], blocks[key])
+    print("✓ measure_blocks matches measure")
+
+    amp, ceiling = 20.0, 0.5
+    gain = loudness.limiter_gain(loudness.true_peak_envelope(sine * amp), ceiling, sr)
+    parts = np.concatenate([loudness.limiter_gain_block(sine, amp, ceiling, sr, start, min(len(t), start + 65536))
+                            for start in range(0, len(t), 65536)])
+    assert np.allclose(parts, amp * gain, atol=1e-9)
+    print("✓ limiter_gain_block matches limiter_gain")
+
+
+def test_highpass():
+    """Test the shared 80 Hz high-pass design."""
+    print("\nTesting high-pass filter...")
+
+    from backend import loudness
+    if not loudness.HAVE_NUMPY:
+        print("- NumPy not installed, skipped")
+        return
+    import numpy as np
+
+    sr = 48000
+    b, a = loudness.highpass_biquad(sr)
+
+    def gain_db(freq):
+        z = np.exp(-1j * 2 * np.pi * freq / sr * np.arange(3))
+        return 20 * np.log10(abs(np.dot(b, z) / np.dot(a, z)))
+
+    assert gain_db(1e-3) < -100 and abs(gain_db(80.0) + 3.0) < 0.1 and abs(gain_db(sr / 2)) < 1e-6
+    assert abs(gain_db(40.0) + 12.3) < 0.5
+    b2, _ = loudness.highpass_biquad(sr, cutoff_hz=160.0)
+    assert b2[0] < b[0]
+    print("✓ -3 dB at the cutoff, 12 dB/octave below it, flat at Nyquist")
+
+
+def test_wav_reader():
+    """Test memory-mapped sample access: 24-bit unpacking, sample formats and blocks."""
+    print("\nTesting WAV reader...")
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("- NumPy not installed, skipped")
+        return
+    from backend.wav_reader import WavReader, unpack_24
+
+    packed = np.array([[0xff, 0xff, 0x7f], [0x00, 0x00, 0x80], [0xff, 0xff, 0xff], [0x01, 0x00, 0x00]],
+                      dtype=np.uint8)
+    assert unpack_24(packed).tolist() == [8388607, -8388608, -1, 1]
+    print("✓ unpack_24 sign-extends")
+
+    def write_wav(path, audio_format, bits, channels, data):
+        block_align = channels * bits // 8
+        fmt = struct.pack('<HHIIHH', audio_format, channels, 8000, 8000 * block_align, block_align, bits)
+        body = b'WAVE' + _riff_chunk(b'fmt ', fmt) + _riff_chunk(b'LIST', b'junk!') + _riff_chunk(b'data', data)
+        with open(path, 'wb') as f:
+            f.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+        return path
+
+    # Stereo frames: (full-scale negative, half scale), (zero, smallest step)
+    cases = [
+        (1, 8, bytes([0, 192, 128, 129]), 1 / 128),
+        (1, 16, struct.pack('<4h', -32768, 16384, 0, 1), 1 / 32768),
+        (1, 24, b'\x00\x00\x80' + b'\x00\x00\x40' + b'\x00\x00\x00' + b'\x01\x00\x00', 1 / 8388608),
+        (1, 32, struct.pack('<4i', -2 ** 31, 2 ** 30, 0, 1), 1 / 2 ** 31),
+        (3, 32, struct.pack('<4f', -1.0, 0.5, 0.0, 2 ** -10), 2 ** -10),
+        (3, 64, struct.pack('<4d', -1.0, 0.5, 0.0, 2 ** -10), 2 ** -10),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for audio_format, bits, data, step in cases:
+            path = write_wav(os.path.join(tmp, f'{audio_format}-{bits}.wav'), audio_format, bits, 2, data)
+            with WavReader(path) as reader:
+                assert (reader.num_frames, reader.channels, reader.sample_width) == (2, 2, bits // 8)
+                samples = reader.read(dtype=np.float64)
+                assert samples.shape == (2, 2) and samples.dtype == np.float64
+                assert np.allclose(samples, [[-1.0, 0.5], [0.0, step]]), (bits, samples)
+                assert reader.read().dtype == np.float32
+                assert reader.raw_frames(1).shape[0] == 1
+        print("✓ 8/16/24/32-bit PCM and 32/64-bit float scale to -1..1")
+
+        ramp = np.arange(-500, 500, dtype='<i2')
+        path = write_wav(os.path.join(tmp, 'ramp.wav'), 1, 16, 1, ramp.tobytes())
+        with WavReader(path) as reader:
+            blocks = list(reader.blocks(300, start=100, stop=950))
+            assert [start for start, _ in blocks] == [100, 400, 700]
+            assert [len(block) for _, block in blocks] == [300, 300, 250]
+            joined = np.concatenate([block for _, block in blocks])[:, 0]
+            assert np.allclose(joined, ramp[100:950] / 32768.0)
+            raw = list(reader.blocks(600, raw=True))
+            assert raw[1][1].dtype == np.dtype('<i2') and raw[1][1][0, 0] == 100
+            assert reader.frame_at(-1) == 0 and reader.frame_at(10) == 1000
+            assert np.allclose(reader.read_time(0.01, 0.02)[:, 0], ramp[80:160] / 32768.0)
+        print("✓ Blocks and time spans cover the requested frames")
+
+        for audio_format, bits in ((2, 16), (7, 8)):
+            path = write_wav(os.path.join(tmp, 'bad.wav'), audio_format, bits, 1, b'\0' * 8)
+            try:
+                WavReader(path)
+                raise AssertionError(f"accepted format {audio_format}/{bits}")
+            except ValueError:
+                pass
+        print("✓ Unsupported sample formats raise ValueError")
+
+
+def test_decode_once():
+    """Test the decode-once path's format check and in-process silence detection."""
+    print("\nTesting decode-once analysis...")
+
+    from backend import decode_once
+    from backend.wav_header import read_wav_header
+    if not decode_once.HAVE_NUMPY:
+        print("- NumPy not installed, skipped")
+        return
+    import numpy as np
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assert not decode_once.needs_decoding(read_wav_header(_pcm_wav(os.path.join(tmp, 'a.wav'), 0.1)))
+        assert not decode_once.needs_decoding(
+            read_wav_header(_pcm_wav(os.path.join(tmp, 'b.wav'), 0.1, channels=2, bits=24)))
+        adpcm = os.path.join(tmp, 'adpcm.wav')
+        body = b'WAVE' + _riff_chunk(b'fmt ', struct.pack('<HHIIHH', 2, 1, 8000, 4000, 256, 4)) + \
+            _riff_chunk(b'data', b'\0' * 512)
+        with open(adpcm, 'wb') as f:
+            f.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+        assert decode_once.needs_decoding(read_wav_header(adpcm))
+    assert decode_once.needs_decoding(None)
+    print("✓ Only mappable PCM/float layouts skip the decoder")
+
+    sr = 8000
+    t = np.arange(sr) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 1000 * t + np.pi / 8)
+    quiet = np.zeros(sr)
+    # 0.5 s silence, 0.5 s tone, 0.3 s silence, 0.2 s tone; the second channel only carries the tone once
+    left = np.concatenate([quiet[:4000], tone[:4000], quiet[:2400], tone[:1600]])
+    right = np.concatenate([quiet[:4000], tone[:4000], quiet[:2400], quiet[:1600]])
+    stereo = np.stack([left, right], axis=1)
+    assert decode_once.detect_silences(stereo, sr, -40, 0.25) == [[0.0, 0.5], [1.0, 1.3]]
+    assert decode_once.detect_silences(stereo, sr, -40, 0.4) == [[0.0, 0.5]]
+    assert decode_once.detect_silences(stereo[:, 1:], sr, -40, 0.25) == [[0.0, 0.5], [1.0, 1.5]]
+
+    # A DC offset hides the silence unless the 80 Hz high-pass removes it
+    offset = stereo + 0.2
+    assert decode_once.detect_silences(offset, sr, -40, 0.25) == []
+    silences = decode_once.detect_silences(offset, sr, -40, 0.25, use_hpf=True)
+    assert len(silences) == 2 and silences[0][0] < 0.05 and silences[0][1] == 0.5, silences
+    print("✓ detect_silences finds runs silent on every channel, with optional high-pass")
+
+
+def test_multi_file():
+    """Test grouping of tiny files and parsing of the grouped FFmpeg output."""
+    print("\nTesting multi-file grouping...")
+
+    from backend import multi_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = [_pcm_wav(os.path.join(tmp, f'c{i:02}.wav'), 1, sample_rate=8000) for i in range(34)]
+        long_file = _pcm_wav(os.path.join(tmp, 'long.wav'), multi_file.TINY_FILE_SEC + 1, sample_rate=8000)
+        files = clips[:33] + [long_file] + clips[33:]
+
+        units = multi_file.plan_groups(files, {'normMode': 'peak'})
+        assert units == [clips[:multi_file.MAX_GROUP_FILES], [long_file], clips[32:]], \
+            [len(unit) for unit in units]
+        assert multi_file.plan_groups(files, {'normMode': 'lufs'}) == [[f] for f in files]
+        print("✓ Tiny files are grouped up to MAX_GROUP_FILES; longer files stay single")
+
+        clips = [_pcm_wav(os.path.join(tmp, f'm{i:02}.wav'), 3, sample_rate=8000) for i in range(21)]
+        units = multi_file.plan_groups(clips, {})
+        assert [len(unit) for unit in units] == [20, 1]
+        print("✓ A group closes once it holds GROUP_TARGET_SEC of audio")
+
+    assert multi_file._trim_filter((0.0, 2.0), 2.0) == ''
+    assert multi_file._trim_filter((0.25, 1.5), 2.0) == 'atrim=start=0.250:end=1.500,asetpts=PTS-STARTPTS,'
+    stderr = ("[ametadata@s1 @ 0x55d] lavfi.silence_start=0.5\n"
+              "[ametadata@s1 @ 0x55d] lavfi.silence_end=1.25\n"
+              "[volumedetect@v0 @ 0x55e] max_volume: -6.5 dB\n"
+              "[volumedetect@v1 @ 0x55f] max_volume: -inf dB\n")
+    assert [m.groups() for m in multi_file._METADATA_LINE.finditer(stderr)] == \
+        [('1', 'start', '0.5'), ('1', 'end', '1.25')]
+    assert [m.groups() for m in multi_file._MAX_VOLUME_LINE.finditer(stderr)] == [('0', '-6.5'), ('1', '-inf')]
+    print("✓ Per-input filter output is told apart by instance name")
+
+
+def test_batch_peaks():
+    """Test vectorized trim and peak analysis of a padded group of clips."""
+    print("\nTesting batch peak analysis...")
+
+    from backend import batch_peaks
+    from backend.wav_header import read_wav_header
+    if not batch_peaks.HAVE_NUMPY:
+        print("- NumPy not installed, skipped")
+        return
+    import numpy as np
+    from backend.wav_reader import WavReader
+
+    sr = 8000
+    tone = np.sin(2 * np.pi * 440 * np.arange(2 * sr) / sr + np.pi / 8)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [_pcm_wav(os.path.join(tmp, 'a.wav'), 2, sample_rate=sr),
+                 _pcm_wav(os.path.join(tmp, 'b.wav'), 1, sample_rate=sr, channels=2),
+                 _pcm_wav(os.path.join(tmp, 'c.wav'), 1, sample_rate=sr)]
+        headers = [read_wav_header(path) for path in paths]
+        assert batch_peaks.can_analyze(headers, ['pcm_s16le'] * 3)
+        assert not batch_peaks.can_analyze(headers + [None], ['pcm_s16le'] * 4)
+
+        samples, lengths = batch_peaks.load_clips(paths, headers)
+        assert samples.shape == (3, 2 * sr, 2) and lengths.tolist() == [2 * sr, sr, sr]
+        # a: 0.5 s silence, 1 s tone at -6 dBFS, 0.5 s silence; b: stereo tone at -12 dBFS; c: silent
+        samples[0, sr // 2:3 * sr // 2, 0] = 0.5 * tone[:sr]
+        samples[1, :sr, :] = 0.25 * tone[:sr, np.newaxis]
+
+        spans, peaks, found = batch_peaks.analyze_clips(samples, lengths, headers, {})
+        assert spans == [(0.0, 2.0), (0.0, 1.0), (0.0, 1.0)] and found == [False, False, False]
+        assert abs(peaks[0] + 6.02) < 0.01 and abs(peaks[1] + 12.04) < 0.01 and peaks[2] is None
+
+        settings = {'autoTrim': True, 'trimThresholdDb': -50, 'trimMinDurationMs': 200,
+                    'trimPadMs': 100, 'trimMinFileMs': 800}
+        spans, peaks, found = batch_peaks.analyze_clips(samples, lengths, headers, settings)
+        assert spans == [(0.4, 1.6), (0.0, 1.0), (0.0, 1.0)], spans
+        assert found == [True, True, False] and peaks[2] is None
+        # The peak only covers the trimmed span
+        samples[0, 100, 0] = 0.9
+        spans, peaks, _ = batch_peaks.analyze_clips(samples, lengths, headers, settings)
+        assert spans[0] == (0.0, 1.6) and abs(peaks[0] - 20 * np.log10(0.9)) < 0.01
+        print("✓ Trim spans and peaks match silencedetect's rules per clip")
+
+        out = os.path.join(tmp, 'out.wav')
+        with open(paths[0], 'r+b') as f:
+            f.seek(headers[0].data_offset)
+            f.write((samples[0, :, 0] * 32767).astype('<i2').tobytes())
+        batch_peaks.render_clip(paths[0], headers[0], (0.5, 1.5), 6.0, out, 'pcm_s16le')
+        with WavReader(out) as reader:
+            rendered = reader.read()
+            assert reader.num_frames == sr and abs(np.abs(rendered).max() - 0.5 * 10 ** 0.3) < 1e-3
+        print("✓ render_clip writes the span with the gain applied")
+
+
+def test_async_executor():
+    """Test the asyncio pipeline driver, bounded concurrency and the event bridge."""
+    print("\nTesting asyncio executor...")
+
+    import asyncio
+    import threading
+    from backend.async_executor import EventBridge, drive, run_limited
+    from backend.audio_processor import BlockingCall, FFmpegRun
+    from backend.process_manager import process_manager
+
+    in_flight, peak = [0], [0]
+
+    def job(value):
+        async def run():
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01 * (5 - value))
+            in_flight[0] -= 1
+            return value
+        return run
+
+    assert asyncio.run(run_limited([job(i) for i in range(5)], 2)) == [0, 1, 2, 3, 4]
+    assert peak[0] == 2
+    print("✓ run_limited bounds concurrency and keeps job order")
+
+    # Any command runs as a step; a python child stands in for FFmpeg
+    lines = []
+
+    def pipeline():
+        code, text = yield FFmpegRun([sys.executable, '-c', 'import sys; sys.stderr.write("a\\rb\\nc")'])
+        assert code == 0 and text == 'a\rb\nc'
+        worker_thread = yield BlockingCall(lambda: threading.current_thread().name)
+        try:
+            yield BlockingCall(lambda: 1 / 0)
+        except ZeroDivisionError:
+            pass
+        try:
+            yield FFmpegRun([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5)
+        except Exception as e:
+            return worker_thread, type(e).__name__
+        return worker_thread, None
+
+    thread_name, timeout_error = asyncio.run(drive(pipeline(), 'async-test', lines.append))
+    assert lines == ['a', 'b', 'c'] and thread_name != threading.current_thread().name
+    assert timeout_error is not None and 'async-test' not in process_manager.active_processes
+    print("✓ drive sends replies and throws step errors (incl. timeouts) into the pipeline")
+
+    received = []
+    with EventBridge(lambda event, data: received.append((event, data, threading.current_thread().name))) as emit:
+        for i in range(50):
+            emit('tick', {'n': i})
+    assert [data['n'] for _, data, _ in received] == list(range(50))
+    assert {name for _, _, name in received} == {'event-bridge'}
+    print("✓ EventBridge delivers every event in order on its dispatcher thread")
+
+
+def test_scheduler():
+    """Test longest-first scheduling and the makespan prediction."""
+    print("\nTesting scheduler...")
+
+    from backend.scheduler import predict_makespan, schedule_units
+
+    assert predict_makespan([1, 1, 1, 3], 2) == 4
+    assert predict_makespan([3, 1, 1, 1], 2) == 3
+    assert predict_makespan([2, 2], 0) == 4
+    print("✓ predict_makespan")
+
+    durations = {'a.wav': 1.0, 'b.wav': 1.0, 'c.wav': 0.5, 'd.wav': 0.5, 'e.wav': 3.0}
+    units = [['a.wav'], ['b.wav'], ['c.wav', 'd.wav'], ['e.wav']]
+    ordered, report = schedule_units(units, durations, 2, 'lpt')
+    assert ordered == [['e.wav'], ['a.wav'], ['b.wav'], ['c.wav', 'd.wav']]
+    assert report['makespanSec'] == 3.0 and report['fifoMakespanSec'] == 4.0
+    assert report['lowerBoundSec'] == 3.0 and report['totalSec'] == 6.0
+    print("✓ LPT puts the longest unit first and reaches the lower bound")
+
+    ordered, report = schedule_units(units, durations, 2, 'fifo')
+    assert ordered == units and report['makespanSec'] == report['fifoMakespanSec']
+    try:
+        schedule_units(units, durations, 2, 'random')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown strategy accepted")
+    print("✓ fifo keeps the order; unknown strategies are rejected")
+
+
+def test_tuner():
+    """Test the calibration grid, sampling, trial ranking and stored-result lookup."""
+    print("\nTesting tuner...")
+
+    from backend import tuner
+
+    assert tuner.needs_tuning({'concurrency': 'auto'}) and tuner.needs_tuning({'ffmpegThreads': 'auto'})
+    assert not tuner.needs_tuning({'concurrency': 4})
+    assert tuner.candidate_grid(1) == [(1, 1), (1, 2), (1, 0), (2, 1), (2, 0)]
+    grid = tuner.candidate_grid(4)
+    assert {c for c, _ in grid} == {1, 2, 3, 4, 8} and (8, 0) in grid and (8, 2) not in grid
+    assert all(c * t <= 8 for c, t in grid)
+    print("✓ candidate_grid caps threads at two per core")
+
+    files = [f'/in/{i}.wav' for i in range(20)]
+    durations = {f: 10.0 for f in files}
+    durations[files[3]] = 0.0
+    sample = tuner.pick_sample(files, durations, 45.0, 2)
+    assert len(sample) == 4 and len(set(sample)) == 4 and files[3] not in sample
+    assert sample[:2] == [files[0], files[2]]
+    assert tuner.pick_sample(files, durations, 15.0, 2) == []
+    print("✓ pick_sample spreads across the set within the audio budget")
+
+    def trial(c, t, speed, memory, failed=False):
+        return {'concurrency': c, 'ffmpegThreads': t, 'audioSecPerSec': speed,
+                'peakMemoryMb': memory, 'failed': failed}
+    trials = [trial(1, 1, 50.0, 100), trial(4, 1, 100.0, 400), trial(2, 2, 98.0, 300),
+              trial(8, 0, 150.0, 900, failed=True)]
+    assert tuner._best(trials, None)['concurrency'] == 2
+    assert tuner._best(trials, 200)['concurrency'] == 1
+    assert tuner._best(trials, 50) is None
+    print("✓ Near-ties go to the configuration using less memory")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wavs = [_pcm_wav(os.path.join(tmp, f'{i}.wav'), 1, sample_rate=8000) for i in range(3)]
+        durations = {f: 1.0 for f in wavs}
+        settings = {'concurrency': 'auto', 'ffmpegThreads': 'auto', 'autoTrim': True}
+        profile = tuner.profile_key(wavs, durations, settings)
+        assert profile == 'peak+trim-pcm16-tiny', profile
+
+        saved = tuner.load_tuning, tuner.machine_key
+        try:
+            tuner.machine_key = lambda: 'test-machine'
+            tuner.load_tuning = lambda: {'test-machine': {profile: {'concurrency': 6, 'ffmpegThreads': 2}}}
+            resolved, source = tuner.resolve_auto(settings, wavs, tmp, durations)
+            assert source == 'stored' and resolved['concurrency'] == 6 and resolved['ffmpegThreads'] == 2
+            tuner.load_tuning = lambda: {}
+            resolved, source = tuner.resolve_auto(settings, wavs, tmp, durations, calibrate_missing=False)
+            assert source == 'default' and resolved['concurrency'] == tuner.default_config()['concurrency']
+        finally:
+            tuner.load_tuning, tuner.machine_key = saved
+    print("✓ resolve_auto uses the stored result for the machine and input profile")
+
+
+def test_tuner_held():
+    """Test that calibration holds the setting that is not "auto"."""
+    print("\nTesting tuner held settings...")
+
+    from backend import tuner
+
+    assert tuner.held_settings({'concurrency': 'auto'}) == {'ffmpegThreads': 0}
+    assert tuner.held_settings({'concurrency': 'auto'}, use_defaults=False) == {}
+    assert tuner.held_settings({'concurrency': '3', 'ffmpegThreads': 'auto'}) == {'concurrency': 3}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wavs = [_pcm_wav(os.path.join(tmp, f'{i}.wav'), 1, sample_rate=8000) for i in range(3)]
+        durations = {f: 1.0 for f in wavs}
+        assert tuner.profile_key(wavs, durations, {}, {'concurrency': 3, 'ffmpegThreads': 0}) == \
+            'peak-pcm16-tiny-c3-t0'
+
+        settings = {'concurrency': 'auto', 'ffmpegThreads': 2}
+        saved = tuner.load_tuning, tuner.machine_key
+        try:
+            tuner.machine_key = lambda: 'test-machine'
+            tuner.load_tuning = lambda: {'test-machine': {'peak-pcm16-tiny': {'concurrency': 6, 'ffmpegThreads': 0},
+                                                          'peak-pcm16-tiny-t2': {'concurrency': 4, 'ffmpegThreads': 2}}}
+            resolved, source = tuner.resolve_auto(settings, wavs, tmp, durations)
+            assert source == 'stored' and (resolved['concurrency'], resolved['ffmpegThreads']) == (4, 2)
+        finally:
+            tuner.load_tuning, tuner.machine_key = saved
+    print("✓ Held values are kept and are part of the profile key")
+
+
+def test_file_ids():
+    """Test that batch events identify files by index, not by basename."""
+    print("\nTesting file IDs...")
+
+    from backend.batch import file_table, new_batch_state, run_batch
+
+    files = [os.path.join('/in', 's1', 'take1.wav'), os.path.join('/in', 's2', 'take1.wav')]
+    ids, rel_paths = file_table(files, '/in')
+    assert ids == {files[0]: 0, files[1]: 1}
+    assert rel_paths == [os.path.join('s1', 'take1.wav'), os.path.join('s2', 'take1.wav')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_root, output_root = os.path.join(tmp, 'in'), os.path.join(tmp, 'out')
+        for session in ('s1', 's2'):
+            os.makedirs(os.path.join(input_root, session))
+            with open(os.path.join(input_root, session, 'take1.wav'), 'wb') as f:
+                f.write(b'not a wav file')
+        os.makedirs(output_root)
+
+        events = []
+        state = new_batch_state()
+        state['running'] = True
+        summary = run_batch(input_root, output_root, {}, state, lambda event, data: events.append((event, data)))
+        assert summary['total'] == 2 and summary['completed'] == 0
+
+    tables = [data['files'] for event, data in events if event == 'fileTable']
+    assert len(tables) == 1
+    assert sorted(tables[0]) == [os.path.join('s1', 'take1.wav'), os.path.join('s2', 'take1.wav')]
+    started = [data['fileId'] for event, data in events if event == 'fileStart']
+    assert started and started == sorted(set(started))
+    assert all(data['fileId'] in (0, 1) for event, data in events if 'fileId' in data)
+    print("✓ Same-named files in two folders get separate integer IDs")
+
+
+def test_failures():
+    """Test failure classification and the retry backoff."""
+    print("\nTesting failure handling...")
+
+    import errno
+    from backend.failures import (FFmpegError, RetryQueue, classify_failure, failure_report,
+                                  MAX_RETRY_BACKOFF_SEC)
+
+    cases = [
+        (FFmpegError('Analysis', 1, 'x.wav: Invalid data found when processing input'), 'corrupt'),
+        (FFmpegError('Processing', 1, 'av_interleaved_write_frame(): Input/output error'), 'transient'),
+        (FFmpegError('Processing', -9), 'killed'),
+        (FFmpegError('Processing', 1, 'Unrecognized option'), 'error'),
+        (TimeoutError(), 'killed'),
+        (OSError(errno.EIO, 'I/O error'), 'transient'),
+        (OSError(errno.ENOENT, 'No such file'), 'error'),
+        (ValueError('bad'), 'error'),
+    ]
+    for error, expected in cases:
+        assert classify_failure(error) == expected, (error, expected)
+    print("✓ classify_failure")
+
+    queue = RetryQueue(max_retries=3, backoff_sec=2.0)
+    assert queue.offer('a.wav', 'corrupt') is None
+    assert [queue.offer('a.wav', 'transient') for _ in range(4)] == [2.0, 4.0, 8.0, None]
+    assert queue.attempts('a.wav') == 4 and queue.attempts('b.wav') == 1
+    assert len(queue) == 3 and queue.pop_due() is None
+    assert 1.9 < queue.wait_sec(limit=5.0) <= 2.0
+    assert RetryQueue(10, 30.0).offer('a.wav', 'killed') == 30.0
+    capped = RetryQueue(10, 30.0)
+    assert [capped.offer('a.wav', 'killed') for _ in range(3)][-1] == MAX_RETRY_BACKOFF_SEC
+    print("✓ RetryQueue backs off exponentially up to max_retries")
+
+    immediate = RetryQueue(1, 0.0, limit=1)
+    assert immediate.offer('a.wav', 'transient') == 0.0
+    assert immediate.offer('b.wav', 'transient') is None
+    assert immediate.pop_due() == 'a.wav' and immediate.pop_due() is None
+    print("✓ Due items pop; the queue limit makes failures final")
+
+    report = failure_report([{'file': 'a.wav', 'failure': 'corrupt'},
+                             {'file': 'b.wav', 'failure': 'transient'},
+                             {'file': 'c.wav', 'failure': 'corrupt'}])
+    assert report['count'] == 3 and report['byClass'] == {'corrupt': 2, 'transient': 1}
+    print("✓ failure_report")
+
+
+def test_watchdog():
+    """Test watchdog deadlines, rate observation and killing a stalled process."""
+    print("\nTesting watchdog...")
+
+    from backend import watchdog as watchdog_module
+    from backend.audio_processor import FFmpegRun
+    from backend.failures import FFmpegStalled, RetryQueue, classify_failure
+    from backend.process_manager import process_manager
+
+    dog = watchdog_module.Watchdog()
+    grace = watchdog_module.STARTUP_GRACE_SEC
+    assert dog.deadline('render', 100.0) == grace + 100.0
+    dog.observe('render', 0.5, 60.0)  # too short to count
+    assert dog.deadline('render', 100.0) == grace + 100.0
+    dog.observe('render', 100.0, 20.0)
+    assert abs(dog.deadline('render', 100.0) - (grace + 100.0 * 0.2 * watchdog_module.OBSERVED_SLACK)) < 1e-9
+    dog.observe('render', 100.0, 70.0)  # EWMA: 0.2 + 0.2 * (0.7 - 0.2)
+    assert abs(dog.metrics()['secPerAudioSec']['render'] - 0.3) < 1e-9
+    dog.observe('analyze', 1000.0, 0.1)
+    assert dog.deadline('analyze', 100.0) == grace + 100.0 * watchdog_module.MIN_SEC_PER_AUDIO_SEC
+    print("✓ Deadlines follow observed throughput with slack and a floor")
+
+    assert dog.timeout_for(FFmpegRun(['ffmpeg'], timeout=5.0, stage='render', audio_sec=10.0)) == 5.0
+    assert dog.timeout_for(FFmpegRun(['ffmpeg'])) is None
+    assert dog.timeout_for(FFmpegRun(['ffmpeg'], stage='detect', audio_sec=10.0)) == grace + 10.0
+
+    watchdog_module.STARTUP_GRACE_SEC = 0.3
+    try:
+        proc = process_manager.spawn([sys.executable, '-c', 'import time; time.sleep(30)'], job_id='dog-test')
+        try:
+            with dog.guard(proc, 'detect', 0.0, 'dog-test'):
+                proc.communicate()
+            raise AssertionError("the guard did not fire")
+        except FFmpegStalled as e:
+            assert e.stage == 'detect' and proc.poll() is not None
+        finally:
+            process_manager.untrack(proc, 'dog-test')
+
+        proc = process_manager.spawn([sys.executable, '-c', 'pass'], job_id='dog-test')
+        with dog.guard(proc, 'detect', 0.0, 'dog-test'):
+            proc.communicate()
+        process_manager.untrack(proc, 'dog-test')
+    finally:
+        watchdog_module.STARTUP_GRACE_SEC = grace
+    assert dog.metrics()['stallsByStage'] == {'detect': 1}
+    assert classify_failure(FFmpegStalled('detect', 30)) == 'stalled'
+    assert RetryQueue(2, 1.0).offer('a.wav', 'stalled') == 1.0
+    dog.reset_stalls()
+    assert dog.metrics()['stalls'] == 0 and 'render' in dog.metrics()['secPerAudioSec']
+    print("✓ guard kills a process that outlives its deadline and raises FFmpegStalled")
+
+
+def test_verify():
+    """Test output verification tolerances."""
+    print("\nTesting output verification...")
+
+    from backend.verify import check_output, verify_outputs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = _pcm_wav(os.path.join(tmp, 'in.wav'), 10.0, bits=24)
+        settings = {'targetBitDepth': 24}
+
+        def check(seconds, **kwargs):
+            output = _pcm_wav(os.path.join(tmp, 'out.wav'), seconds, **dict({'bits': 24}, **kwargs))
+            return check_output(source, output, settings)
+
+        assert check(10.0) == ('ok', [])
+        # Tolerance is 1% of 10 s, i.e. 0.1 s
+        assert check(10.08)[0] == 'ok' and check(9.92)[0] == 'ok'
+        verdict, problems = check(10.2)
+        assert verdict == 'mismatch' and problems[0].startswith('duration')
+        assert check(9.5)[0] == 'mismatch'
+        settings['autoTrim'] = True
+        assert check(9.5)[0] == 'ok' and check(10.2)[0] == 'mismatch'
+        print("✓ Duration tolerance; autoTrim allows shorter outputs")
+
+        verdict, problems = check(10.0, sample_rate=44100, channels=2, bits=16)
+        assert verdict == 'mismatch' and len(problems) == 3
+        assert any('codec pcm_s24le expected, got pcm_s16le' in p for p in problems)
+        # A 16-bit input is not up-converted to 24-bit
+        short_source = _pcm_wav(os.path.join(tmp, 'in16.wav'), 1.0)
+        assert check_output(short_source, _pcm_wav(os.path.join(tmp, 'out16.wav'), 1.0), settings)[0] == 'ok'
+        print("✓ Sample rate, channel and codec mismatches")
+
+        missing = os.path.join(tmp, 'missing.wav')
+        assert check_output(source, missing, settings) == ('missing', ['missing'])
+        with open(os.path.join(tmp, 'junk.wav'), 'wb') as f:
+            f.write(b'not a wav file')
+        assert check_output(source, os.path.join(tmp, 'junk.wav'), settings)[0] == 'mismatch'
+        counts = verify_outputs([(source, missing), (short_source, os.path.join(tmp, 'out16.wav'))],
+                                settings, workers=2)
+        assert counts == {'ok': 1, 'missing': 1, 'mismatch': 0}
+        print("✓ Missing and unreadable outputs")
+
+
+def test_checksums():
+    """Test algorithm selection, single-read hashing and manifest lines."""
+    print("\nTesting checksums...")
+
+    import hashlib
+    from backend import checksums
+
+    fast = checksums.fast_algorithm()
+    assert checksums.resolve_algorithms('fast, MD5,md5,') == [fast, 'md5']
+    assert checksums.resolve_algorithms(['sha256']) == ['sha256']
+    try:
+        checksums.resolve_algorithms('crc32')
+        raise AssertionError("accepted an unknown algorithm")
+    except ValueError:
+        pass
+    print(f"✓ resolve_algorithms: fast = {fast}")
+
+    assert checksums.manifest_path_entry(os.path.join('s1', 'take 1%.wav')) == 's1/take 1%25.wav'
+    assert checksums.manifest_path_entry('a\nb\r.wav') == 'a%0Ab%0D.wav'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_root, output_root = os.path.join(tmp, 'in'), os.path.join(tmp, 'out')
+        os.makedirs(os.path.join(input_root, 's1'))
+        os.makedirs(os.path.join(output_root, 's1'))
+        data = os.urandom(checksums.READ_CHUNK * 2 + 123)
+        pairs = []
+        for rel in ('a.wav', os.path.join('s1', 'b.wav')):
+            pair = os.path.join(input_root, rel), os.path.join(output_root, rel)
+            for path, payload in zip(pair, (data, data[::-1])):
+                with open(path, 'wb') as f:
+                    f.write(payload)
+            pairs.append(pair)
+
+        digests = checksums.hash_file(pairs[0][0], ['md5', 'sha256'])
+        assert digests == {'md5': hashlib.md5(data).hexdigest(), 'sha256': hashlib.sha256(data).hexdigest()}
+        print("✓ hash_file computes every algorithm from one read")
+
+        writer = checksums.ManifestWriter(input_root, output_root, ['md5'])
+        for input_file, output_file in pairs:
+            writer.add(input_file, output_file)
+        report = writer.close()
+        assert report['files'] == 2 and report['errors'] == 0 and report['bytesHashed'] == 4 * len(data)
+        with open(os.path.join(output_root, 'manifest-md5.txt')) as f:
+            outputs = sorted(f.read().splitlines())
+        with open(os.path.join(output_root, 'input-manifest-md5.txt')) as f:
+            inputs = sorted(f.read().splitlines())
+        reversed_md5 = hashlib.md5(data[::-1]).hexdigest()
+        assert outputs == [f'{reversed_md5}  a.wav', f'{reversed_md5}  s1/b.wav']
+        assert inputs == [f'{digests["md5"]}  a.wav', f'{digests["md5"]}  s1/b.wav']
+
+        writer = checksums.ManifestWriter(input_root, output_root, ['md5'], hash_inputs=False, append=True)
+        writer.add(pairs[0][0], os.path.join(output_root, 'missing.wav'))
+        assert writer.close()['errors'] == 1
+        with open(os.path.join(output_root, 'manifest-md5.txt')) as f:
+            assert len(f.read().splitlines()) == 2
+        print("✓ ManifestWriter writes BagIt lines for outputs and inputs")
+
+
+def test_manifest_sync():
+    """Test removing re-rendered and pruned files from existing manifests."""
+    print("\nTesting manifest updates for sync runs...")
+
+    from backend.checksums import drop_manifest_entries
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifests = {'manifest-md5.txt': ['1  a.wav', '2  s1/b.wav', '3  s1/c%25.wav'],
+                     'input-manifest-md5.txt': ['4  a.wav', '5  s1/b.wav'],
+                     'notes.txt': ['6  a.wav']}
+        for name, lines in manifests.items():
+            with open(os.path.join(tmp, name), 'w') as f:
+                f.write(''.join(line + '\n' for line in lines))
+
+        assert drop_manifest_entries(tmp, ['a.wav', 's1/c%.wav']) == 3
+        assert drop_manifest_entries(tmp, ['zzz.wav']) == 0 and drop_manifest_entries(tmp, []) == 0
+        for name, expected in (('manifest-md5.txt', '2  s1/b.wav\n'), ('input-manifest-md5.txt', '5  s1/b.wav\n'),
+                               ('notes.txt', '6  a.wav\n')):
+            with open(os.path.join(tmp, name)) as f:
+                assert f.read() == expected, name
+        assert sorted(os.listdir(tmp)) == ['input-manifest-md5.txt', 'manifest-md5.txt', 'notes.txt']
+    assert drop_manifest_entries(os.path.join(tempfile.gettempdir(), 'no-such-output'), ['a.wav']) == 0
+    print("✓ drop_manifest_entries rewrites only the manifests that list the files")
+
+
+def test_staging():
+    """Test scratch staging: whole-file renames into place and the scratch budget."""
+    print("\nTesting output staging...")
+
+    import threading
+    from backend.staging import PARTIAL_PREFIX, OutputStager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_root = os.path.join(tmp, 'out')
+        stager = OutputStager(os.path.join(tmp, 'scratch'), output_root, limit_mb=1, copy_threads=1)
+        release = threading.Event()
+        payloads = [os.urandom(600 * 1024), os.urandom(600 * 1024), b'small']
+        dests = [os.path.join(output_root, 's1', 'a.wav'), os.path.join(output_root, 's1', 'b.wav'),
+                 os.path.join(output_root, 's2', 'c.wav')]
+        scratch_files = []
+        for index, payload in enumerate(payloads):
+            path = os.path.join(stager.scratch_root, f'{index}.wav')
+            with open(path, 'wb') as f:
+                f.write(payload)
+            scratch_files.append(path)
+
+        # The copier is held on the first file, so the second one pushes pending bytes over the budget
+        stager.submit(scratch_files[0], dests[0], lambda: release.wait(10))
+        stager.submit(scratch_files[1], dests[1])
+        assert not stager.has_space() and not stager.wait_for_space(0.05)
+        release.set()
+        assert stager.wait_for_space(10)
+        stager.submit(scratch_files[2], dests[2])
+
+        stats = stager.close()
+        assert stats['files'] == 3 and stats['errors'] == 0
+        assert stats['bytes'] == sum(len(p) for p in payloads) and stats['peakPendingBytes'] >= 1200 * 1024
+        for dest, payload in zip(dests, payloads):
+            with open(dest, 'rb') as f:
+                assert f.read() == payload
+        leftovers = [name for _, _, names in os.walk(output_root) for name in names
+                     if name.startswith(PARTIAL_PREFIX)]
+        assert leftovers == [] and not os.path.exists(stager.scratch_root)
+        print("✓ Files are renamed into place; new renders wait while the scratch budget is full")
+
+
+def test_staging_results():
+    """Test that staged moves report their outcome once the file is (or is not) in place."""
+    print("\nTesting staged move results...")
+
+    from backend.staging import OutputStager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_root = os.path.join(tmp, 'out')
+        stager = OutputStager(os.path.join(tmp, 'scratch'), output_root, copy_threads=1)
+        good, bad = os.path.join(output_root, 'a.wav'), os.path.join(output_root, 'b.wav')
+        os.makedirs(bad)  # a directory where the file should go
+        seen = []
+        for name in ('a.wav', 'b.wav'):
+            with open(os.path.join(stager.scratch_root, name), 'wb') as f:
+                f.write(b'audio')
+        stager.submit(os.path.join(stager.scratch_root, 'a.wav'), good,
+                      lambda: seen.append(os.path.exists(good)), tag='a')
+        stager.submit(os.path.join(stager.scratch_root, 'b.wav'), bad)
+
+        stats = stager.close()
+        results = dict(stager.finished())
+        assert seen == [True] and stats['files'] == 1 and stats['errors'] == 1
+        assert results['a'] is None and isinstance(results[bad], OSError)
+        assert stager.finished() == []
+        print("✓ finished() reports each move once; after_move runs with the file in place")
+
+
+def test_prefetch():
+    """Test prefetch budget accounting for page-cache warming and local copies."""
+    print("\nTesting prefetch...")
+
+    import time
+    from backend.prefetch import Prefetcher
+
+    def settle(prefetcher, key, value, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while prefetcher._stats[key] < value and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)  # anything past the expected count would show up now
+        return prefetcher._stats[key]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for index, kb in enumerate((400, 400, 400, 400, 2048)):
+            path = os.path.join(tmp, f'{index}.wav')
+            with open(path, 'wb') as f:
+                f.write(b'\0' * kb * 1024)
+            files.append(path)
+
+        # Warming stops once the held bytes reach the 1 MB budget, and resumes when a file starts
+        prefetcher = Prefetcher(budget_mb=1)
+        prefetcher.ahead(files[:4])
+        assert settle(prefetcher, 'warmed', 3) == 3 and prefetcher._held_bytes == 1200 * 1024
+        assert prefetcher.source(files[0]) == files[0]
+        assert settle(prefetcher, 'warmed', 4) == 4
+        prefetcher.ahead([files[4]])  # larger than the whole budget
+        for path in files[1:4]:
+            prefetcher.source(path)
+        time.sleep(0.1)
+        stats = prefetcher.close()
+        assert stats['warmed'] == 4 and stats['bytes'] == 1600 * 1024 and prefetcher._held_bytes == 0
+        print("✓ Page-cache prefetches count against the budget until their file starts")
+
+        # Local copies are held until their file is released
+        copy_dir = os.path.join(tmp, 'shm')
+        prefetcher = Prefetcher(budget_mb=1, copy_dir=copy_dir, copy_max_mb=1)
+        prefetcher.ahead(files[:4])
+        assert settle(prefetcher, 'copied', 3) == 3
+        local = prefetcher.source(files[0])
+        assert local != files[0] and local.startswith(prefetcher.copy_root) and os.path.exists(local)
+        assert prefetcher._held_bytes == 1200 * 1024 and settle(prefetcher, 'copied', 4, timeout=0.2) == 3
+        prefetcher.release(files[0])
+        assert not os.path.exists(local) and settle(prefetcher, 'copied', 4) == 4
+        stats = prefetcher.close()
+        assert stats['hits'] == 1 and stats['copied'] == 4 and not os.path.exists(prefetcher.copy_root)
+        print("✓ Local copies are read instead of the input and freed on release")
+
+
+def _ebur128_log(read_start: float, read_end: float, level, peak: float) -> str:
+    """Synthetic ebur128 stderr; level(t) gives the loudness at file time t."""
+    lines = []
+    for i in range(1, round((read_end - read_start) / 0.1) + 1):
+        t = i * 0.1
+        m = level(read_start + t)
+        lines.append(f"[Parsed_ebur128_0 @ 0x1] t: {t:<8.1f} TARGET:-23 LUFS    M: {m:5.1f} S: {m:5.1f}     "
+                     f"I: -70.0 LUFS       LRA:   0.0 LU")
+    lines.append(f"  True peak:\n    Peak:       {peak:.1f} dBFS")
+    return '\n'.join(lines)
+
+
+def test_segments():
+    """Test planning and merging segment-parallel analysis."""
+    print("\nTesting segment analysis merging...")
+
+    from backend.segments import (plan_segments, merge_silences, merge_max_volume, merge_loudness,
+                                  lookback_start)
+
+    assert plan_segments(0.0, 1000.0, {}) is None
+    settings = {'segmentAnalysis': True, 'segmentSec': 10, 'segmentWorkers': 4}
+    assert plan_segments(0.0, 59.0, settings) is None  # segmentSec is at least 30 s
+    segments = plan_segments(1.0, 100.0, settings)
+    assert len(segments) == 4 and segments[0][0] == 1.0 and segments[-1][1] == 100.0
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start and abs((start - 1.0) / 0.1 - round((start - 1.0) / 0.1)) < 1e-6
+    print("✓ plan_segments splits on the 100 ms grid")
+
+    segments = [(0.0, 10.0), (10.0, 20.0)]
+    silences = merge_silences([
+        "silence_start: 2\nsilence_end: 3.5 | silence_duration: 1.5\nsilence_start: 9",
+        "silence_start: 0\nsilence_end: 0.5 | silence_duration: 0.5\nsilence_start: 8"
+    ], segments)
+    assert silences == [[2.0, 3.5], [9.0, 10.0], [10.0, 10.5], [18.0, 20.0]]
+    print("✓ merge_silences shifts to file time and closes open silences at boundaries")
+
+    assert merge_max_volume(["max_volume: -3.5 dB", "max_volume: -1.2 dB"]) == -1.2
+    assert merge_max_volume(["max_volume: -3.5 dB", "no output"]) is None
+    print("✓ merge_max_volume")
+
+    # Segments must merge to what one pass over the whole span reports
+    def level(t):
+        return -20.0 if t < 12.0 else -32.0
+    single = merge_loudness([_ebur128_log(0.0, 20.0, level, -4.0)], [(0.0, 20.0)], [0.0], 0.0)
+    read_starts = [lookback_start(segment, 0.0) for segment in segments]
+    texts = [_ebur128_log(read_starts[0], 10.0, level, -5.0), _ebur128_log(read_starts[1], 20.0, level, -4.0)]
+    merged = merge_loudness(texts, segments, read_starts, 0.0)
+    assert read_starts == [0.0, 7.0]
+    assert merged == single, (merged, single)
+    assert float(merged['measured_I']) < -20.0 and float(merged['measured_LRA']) > 10.0
+    assert merged['measured_TP'] == '-4.00'
+    assert merge_loudness(["nothing parsed"], [(0.0, 20.0)], [0.0], 0.0) is None
+    print(f"✓ merge_loudness matches a single pass (I {merged['measured_I']}, LRA {merged['measured_LRA']})")
+
+
+def test_sync():
+    """Test the sync plan, orphan pruning and the sync index."""
+    print("\nTesting incremental sync...")
+
+    from backend.sync import SyncIndex, plan_sync, prune_orphans, read_index, settings_hash
+
+    settings = {'normalizationType': 'peak', 'peakDb': -1.0}
+    assert settings_hash(settings) == settings_hash(dict(settings, concurrency=8, syncPrune=True))
+    assert settings_hash(settings) != settings_hash(dict(settings, peakDb=-2.0))
+    print("✓ settings_hash ignores runtime settings")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_root, output_root = os.path.join(tmp, 'in'), os.path.join(tmp, 'out')
+        rels = ['s1/a.wav', 's1/b.wav', 's2/c.wav', 'd.wav']
+        files = []
+        for rel in rels:
+            for root in (input_root, output_root):
+                path = os.path.join(root, *rel.split('/'))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(b'audio')
+                os.utime(path, ns=(10 ** 18, 10 ** 18))
+            files.append(os.path.join(input_root, *rel.split('/')))
+
+        plan = plan_sync(files, input_root, output_root, settings)
+        assert plan.todo == files and plan.reasons == {'new': 4} and plan.orphans == []
+
+        index = SyncIndex(output_root, dict(settings, syncHash=True), {})
+        for rel, path in zip(rels, files):
+            index.record(rel, plan.stats[path], path)
+        assert index.close() == 4
+        plan = plan_sync(files, input_root, output_root, dict(settings, concurrency=4))
+        assert plan.todo == [] and plan.up_to_date == 4
+        print("✓ Recorded files are up to date")
+
+        # Changed content, a touched but identical file, a deleted output
+        with open(files[1], 'ab') as f:
+            f.write(b'more')
+        os.utime(files[2], ns=(2 * 10 ** 18, 2 * 10 ** 18))
+        os.remove(os.path.join(output_root, 'd.wav'))
+        plan = plan_sync(files, input_root, output_root, settings)
+        assert plan.todo == [files[1], files[2], files[3]]
+        assert plan.reasons == {'changed': 2, 'missingOutput': 1}
+        plan = plan_sync(files, input_root, output_root, dict(settings, syncHash=True))
+        assert plan.todo == [files[1], files[3]] and plan.up_to_date == 2
+        plan = plan_sync(files, input_root, output_root, dict(settings, peakDb=-3.0))
+        assert plan.reasons == {'settings': 3, 'missingOutput': 1}
+        print("✓ Reasons: changed, missingOutput, settings; syncHash skips touched files")
+
+        # Orphans: index entries whose input is gone
+        os.remove(files[2])
+        entries = read_index(output_root)
+        plan = plan_sync(files[:2] + files[3:], input_root, output_root, settings, index=entries)
+        assert plan.orphans == ['s2/c.wav']
+        assert prune_orphans(output_root, plan.orphans, entries) == 1
+        assert 's2/c.wav' not in entries and not os.path.exists(os.path.join(output_root, 's2'))
+        assert os.path.exists(os.path.join(output_root, 's1', 'a.wav'))
+        print("✓ prune_orphans removes the output and its empty folder")
+
+        # Reopening compacts the index to the kept entries
+        with open(os.path.join(output_root, '.ban-sync.jsonl'), 'a') as f:
+            f.write('{"rel": "s1/a.wav", "size": 0}\n')
+        SyncIndex(output_root, settings, entries).close()
+        with open(os.path.join(output_root, '.ban-sync.jsonl')) as f:
+            assert len(f.read().splitlines()) == 3
+        assert read_index(output_root) == entries
+        print("✓ SyncIndex rewrites a compacted index")
+
+
 def test_process_manager():
     """Test process manager."""
     print("\nTesting process manager...")
@@ -95,6 +1542,40 @@ if __name__ == '__main__':
     results.append(("Module imports", test_imports()))
     results.append(("Process manager", test_process_manager()))
     results.append(("FFmpeg paths", test_ffmpeg_paths()))
+    results.append(("CLI", _passes(test_cli)))
+    results.append(("Lazy package exports", _passes(test_lazy_package)))
+    results.append(("Library API", _passes(test_library_api)))
+    results.append(("Sharding", _passes(test_sharding)))
+    results.append(("Shard durations", _passes(test_sharding_header_durations)))
+    results.append(("Coordinator leases", _passes(test_coordinator)))
+    results.append(("Coordinator cancels", _passes(test_coordinator_cancel)))
+    results.append(("Coordinator moves", _passes(test_coordinator_moves)))
+    results.append(("WAV headers", _passes(test_wav_header)))
+    results.append(("FFmpeg capabilities", _passes(test_ffmpeg_caps)))
+    results.append(("Capability probe failures", _passes(test_ffmpeg_caps_retry)))
+    results.append(("LUFS render choice", _passes(test_lufs_render)))
+    results.append(("Loudness", _passes(test_loudness)))
+    results.append(("Block-wise loudness", _passes(test_loudness_blocks)))
+    results.append(("High-pass filter", _passes(test_highpass)))
+    results.append(("WAV reader", _passes(test_wav_reader)))
+    results.append(("Decode-once analysis", _passes(test_decode_once)))
+    results.append(("Multi-file grouping", _passes(test_multi_file)))
+    results.append(("Batch peak analysis", _passes(test_batch_peaks)))
+    results.append(("asyncio executor", _passes(test_async_executor)))
+    results.append(("Scheduler", _passes(test_scheduler)))
+    results.append(("Tuner", _passes(test_tuner)))
+    results.append(("Tuner held settings", _passes(test_tuner_held)))
+    results.append(("File IDs", _passes(test_file_ids)))
+    results.append(("Failure handling", _passes(test_failures)))
+    results.append(("Watchdog", _passes(test_watchdog)))
+    results.append(("Output verification", _passes(test_verify)))
+    results.append(("Checksums", _passes(test_checksums)))
+    results.append(("Manifest sync updates", _passes(test_manifest_sync)))
+    results.append(("Output staging", _passes(test_staging)))
+    results.append(("Staged move results", _passes(test_staging_results)))
+    results.append(("Prefetch", _passes(test_prefetch)))
+    results.append(("Segment analysis", _passes(test_segments)))
+    results.append(("Incremental sync", _passes(test_sync)))
     
     print()
     print("=" * 50)